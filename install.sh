@@ -22,6 +22,7 @@ mkdir -p "$INSTALL_DIR"
 mkdir -p "$INSTALL_DIR/vod"
 mkdir -p "$INSTALL_DIR/logs"
 mkdir -p "$INSTALL_DIR/youtube_auth"
+mkdir -p "$INSTALL_DIR/run"
 cd "$INSTALL_DIR"
 
 echo "[2/6] 安裝系統依賴..."
@@ -38,6 +39,13 @@ echo "[3/6] 下載核心武器..."
 curl -fsSL "$RAW_BASE/magic_stream.sh?t=$TS" -o magic_stream.sh
 curl -fsSL "$RAW_BASE/magic_autostream.py?t=$TS" -o magic_autostream.py
 
+# 明文核心組件 (常駐調度等)；文件清單 magic_core/FILES 與菜單更新共用
+mkdir -p magic_core
+curl -fsSL "$RAW_BASE/magic_core/FILES?t=$TS" -o magic_core/FILES
+for f in $(cat magic_core/FILES); do
+    curl -fsSL "$RAW_BASE/magic_core/$f?t=$TS" -o "magic_core/$f"
+done
+
 echo "正在部署全平台運行庫..."
 # === v1.6 核心修復：防止目錄嵌套 ===
 # 先清理舊的運行庫文件夾 (防止衝突)
@@ -0,0 +1,7 @@
+"""Magic Stream 明文核心組件。
+
+magic_autostream.py 為加密內核 (單任務)；本套件提供常駐調度等擴展功能，
+由 magic_stream.sh 以 ``python -m magic_core <子命令>`` 調用。
+"""
+
+__version__ = "0.9.0"
@@ -0,0 +1,551 @@
+"""命令行入口：``python -m magic_core <子命令>``。"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import signal
+import sys
+from pathlib import Path
+
+from . import startup
+from .modes import MODES as CODEC_MODES
+from .paths import AUTH_DIR as DEFAULT_AUTH_DIR
+from .paths import RUN_DIR as DEFAULT_RUN_DIR
+from .paths import VOD_DIR as DEFAULT_VOD_DIR
+from .youtube import PRIVACY_CHOICES, check_auth
+
+DEFAULT_SOCKET = DEFAULT_RUN_DIR / "ms_daemon.sock"
+CODEC_HELP = "auto: 源可流複製則複製，否則 libx264 轉碼 (經 CPU 調度排隊)"
+
+
+def _license_ok() -> bool:
+    """授權校驗沿用加密內核 (退出碼 0 = 已授權)，結果經本地緩存。"""
+    from . import licensing
+
+    state = licensing.get()
+    if state.source == "offline":
+        print("[警告] 無法連接授權服務器 (GitHub Gist)。", file=sys.stderr)
+    return state.ok
+
+
+def cmd_daemon(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from . import licensing
+    from .supervisor import Supervisor
+
+    startup.mark("導入調度模塊")
+    err = check_auth(args.auth_dir)
+    if err:
+        print(f"[錯誤] {err}", file=sys.stderr)
+        return 1
+    if not _license_ok():
+        print("[錯誤] 腳本未激活，無法使用自動轉播功能。", file=sys.stderr)
+        return 1
+    startup.mark("授權校驗")
+
+    async def main() -> None:
+        sup = Supervisor(args.auth_dir, args.socket, args.state_file,
+                         ffmpeg_bin=args.ffmpeg, ffprobe_bin=args.ffprobe,
+                         probe_max_interval=args.probe_max_interval,
+                         slate_image=args.slate_image)
+        startup.mark("初始化調度器")
+        refresher = asyncio.get_running_loop().create_task(licensing.keep_fresh())
+        try:
+            await sup.serve()
+        finally:
+            refresher.cancel()
+
+    asyncio.run(main())
+    return 0
+
+
+def cmd_ctl(args: argparse.Namespace) -> int:
+    from .control import send_command
+
+    if args.action == "add":
+        msg = {"cmd": "add", "job": {
+            "source_url": args.source_url,
+            "title": args.title,
+            "privacy": args.privacy,
+            "reconnect_seconds": args.reconnect_seconds,
+            "gapless": args.gapless,
+            "codec": args.codec,
+        }}
+    elif args.action == "remove":
+        msg = {"cmd": "remove", "id": args.id}
+    else:
+        msg = {"cmd": args.action}
+    try:
+        reply = send_command(args.socket, msg)
+    except OSError as exc:
+        print(f"[錯誤] 無法連接常駐調度進程 ({args.socket}): {exc}", file=sys.stderr)
+        return 2
+    if args.action == "list" and reply.get("ok") and not args.json:
+        jobs = reply.get("jobs", [])
+        if not jobs:
+            print("無常駐任務")
+        for j in jobs:
+            print(f"{j['id']:<8} {j['state']:<13} {j.get('mode') or '-':<10} {j['privacy']:<9} "
+                  f"{j['title']}  <- {j['source_url']}")
+        print(f"YouTube API 今日配額已用: {reply.get('quota_used', 0)}")
+        if reply.get("cpu"):
+            from .scheduler import format_status
+
+            print(format_status(reply["cpu"]))
+    else:
+        print(json.dumps(reply, ensure_ascii=False))
+    return 0 if reply.get("ok") else 1
+
+
+def cmd_probe(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from .probe import LIVE, ProbeEngine
+
+    async def main() -> bool:
+        engine = ProbeEngine(concurrency=args.concurrency, backoff_cap=args.max_interval,
+                             ffprobe=args.ffprobe)
+        try:
+            if args.wait:
+                timeout = args.timeout if args.timeout > 0 else None
+                results = await asyncio.gather(*(engine.wait_live(u, timeout=timeout) for u in args.urls))
+                return all(results)
+            results = await engine.probe_many(args.urls)
+            for url, r in results.items():
+                print(f"{r.state:<8} {r.status or '-':<4} {r.latency * 1000:7.1f}ms  {url}"
+                      + (f"  ({r.detail})" if r.detail else ""))
+            return all(r.state == LIVE for r in results.values())
+        finally:
+            engine.close()
+
+    return 0 if asyncio.run(main()) else 1
+
+
+def cmd_gapless(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from .gapless import GaplessRelay, ensure_slate
+    from .probe import ProbeEngine
+    from .scheduler import Scheduler
+    from .telemetry import MetricsSink, StreamMetrics, default_name
+
+    async def main() -> None:
+        probes = ProbeEngine(backoff_cap=args.max_interval, ffprobe=args.ffprobe)
+        slate = args.slate or DEFAULT_RUN_DIR / f"slate_{args.slate_size}.flv"
+        await ensure_slate(slate, ffmpeg_bin=args.ffmpeg, size=args.slate_size, image=args.slate_image)
+        sink = MetricsSink()
+        metrics = StreamMetrics(args.name or default_name(), kind="gapless")
+        scheduler = Scheduler()
+        lease = await scheduler.transcode_lease(args.source_url, args.codec,
+                                                ffprobe=args.ffprobe, name=metrics.name)
+        relay = GaplessRelay.from_slate_file(args.source_url, args.target, slate,
+                                             probes=probes, ffmpeg_bin=args.ffmpeg,
+                                             stall_timeout=args.stall_timeout,
+                                             metrics=metrics, sink=sink, lease=lease)
+        try:
+            await relay.run(max_gap=args.max_gap if args.max_gap > 0 else None)
+        finally:
+            probes.close()
+            if lease is not None:
+                scheduler.release(lease)
+
+    asyncio.run(main())
+    return 0
+
+
+def cmd_fanout(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from .fanout import FanOut
+    from .probe import ProbeEngine
+    from .scheduler import Scheduler
+    from .telemetry import MetricsSink
+
+    async def main() -> bool:
+        probes = ProbeEngine(backoff_cap=args.max_interval, ffprobe=args.ffprobe)
+        fan = FanOut(args.source_url, probes=probes, ffmpeg_bin=args.ffmpeg,
+                     stall_timeout=args.stall_timeout, name=args.name, sink=MetricsSink())
+        scheduler = Scheduler()
+        fan.lease = await scheduler.transcode_lease(args.source_url, args.codec,
+                                                    ffprobe=args.ffprobe, name=fan.name)
+        try:
+            return await fan.serve(args.output, args.socket)
+        finally:
+            probes.close()
+            if fan.lease is not None:
+                scheduler.release(fan.lease)
+
+    return 0 if asyncio.run(main()) else 1
+
+
+def cmd_fanout_ctl(args: argparse.Namespace) -> int:
+    from .control import send_command
+
+    if args.action == "add":
+        msg = {"cmd": "add", "url": args.url}
+    elif args.action == "remove":
+        msg = {"cmd": "remove", "id": args.id}
+    else:
+        msg = {"cmd": "list"}
+    try:
+        reply = send_command(args.socket, msg)
+    except OSError as exc:
+        print(f"[錯誤] 無法連接分發進程 ({args.socket}): {exc}", file=sys.stderr)
+        return 2
+    if args.action == "list" and reply.get("ok") and not args.json:
+        print(f"直播源: {reply['source']}  [{reply['ingest']}] {reply.get('mode', 'copy')} "
+              f"重連 {reply['ingest_restarts']} 次")
+        for o in reply["outputs"]:
+            print(f"{o['id']:<7} {o['state']:<13} 重連 {o['restarts']:<3} 丟棄 {o['dropped']:<6} {o['url']}")
+    else:
+        print(json.dumps(reply, ensure_ascii=False))
+    return 0 if reply.get("ok") else 1
+
+
+def cmd_relay(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from .probe import ProbeEngine
+    from .relay import Relay
+    from .scheduler import Scheduler
+    from .telemetry import MetricsSink, StreamMetrics, default_name
+
+    async def main() -> None:
+        probes = ProbeEngine(backoff_cap=args.max_interval, ffprobe=args.ffprobe)
+        sink = MetricsSink()
+        metrics = StreamMetrics(args.name or default_name(), kind="relay")
+        relay = Relay(args.source_url, args.target, probes=probes, scheduler=Scheduler(),
+                      ffmpeg_bin=args.ffmpeg, ffprobe_bin=args.ffprobe, name=metrics.name,
+                      mode=args.codec, metrics=metrics, sink=sink)
+
+        async def serve() -> None:
+            await probes.wait_live(args.source_url)
+            await relay.run(reconnect_timeout=args.reconnect_seconds or None)
+            logging.getLogger("magic_core.relay").info(
+                "[%s] 斷流超過 %s 秒，轉播結束", relay.name, args.reconnect_seconds)
+
+        task = asyncio.get_running_loop().create_task(serve())
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            asyncio.get_running_loop().add_signal_handler(sig, task.cancel)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        finally:
+            probes.close()
+
+    asyncio.run(main())
+    return 0
+
+
+def cmd_license(args: argparse.Namespace) -> int:
+    """輸出與內核 ``--check-license`` 相同 (stdout 為機器碼，退出碼 0 = 已授權)。"""
+    from . import licensing
+
+    try:
+        state = licensing.refresh() if args.refresh else licensing.get()
+    finally:
+        if args.lock:
+            Path(args.lock).unlink(missing_ok=True)
+    startup.mark("授權校驗")
+    if args.json:
+        print(json.dumps({"ok": state.ok, "machine_id": state.machine_id, "source": state.source,
+                          "checked_at": state.checked_at}, ensure_ascii=False))
+    else:
+        print(state.machine_id)
+        if state.source == "offline":
+            note = "無法連接授權服務器"
+            if state.checked_at:
+                note += f"，上次成功校驗於 {state.age / 3600:.1f} 小時前"
+        elif state.source in ("cache", "grace"):
+            note = f"使用 {state.age / 60:.0f} 分鐘前的校驗結果"
+        else:
+            note = "已連接授權服務器校驗"
+        print(f"[授權] {note}", file=sys.stderr)
+    return 0 if state.ok else 1
+
+
+def cmd_vod(args: argparse.Namespace) -> int:
+    import asyncio
+    import random
+
+    from .ffmpeg import run
+    from .scheduler import Scheduler
+    from .telemetry import MetricsSink, StreamMetrics, default_name
+    from .vod import Library, list_media, play_command, write_concat
+
+    if not args.prepare_only and not args.target:
+        print("[錯誤] 缺少 --target", file=sys.stderr)
+        return 2
+    files = [args.vod_dir / f for f in args.files] if args.files else list_media(args.vod_dir)
+    missing = [str(f) for f in files if not f.is_file()]
+    if missing or not files:
+        print(f"[錯誤] 文件不存在: {', '.join(missing) or args.vod_dir}", file=sys.stderr)
+        return 1
+    name = args.name or default_name()
+
+    async def main() -> int:
+        lib = Library(args.vod_dir, ffmpeg_bin=args.ffmpeg, ffprobe=args.ffprobe,
+                      max_keyint=args.max_keyint, scheduler=Scheduler(), playlist_dir=args.run_dir)
+        items, profile = await lib.prepare(files)
+        if not items:
+            print("[錯誤] 沒有可推送的文件", file=sys.stderr)
+            return 1
+        if args.shuffle:
+            random.shuffle(items)
+        total = sum(i.duration for i in items)
+        print(f"播放列表: {len(items)} 個文件，共 {total / 60:.1f} 分鐘，"
+              f"規格 {profile.width}x{profile.height}@{profile.fps:g}")
+        if args.prepare_only:
+            for i in items:
+                print(f"  {i.action:<9} {i.duration:8.1f}s  {Path(i.source).name}")
+            return 0
+        # 不推流 (--prepare-only) 時不寫播放列表，免得留下引用緩存的孤兒文件
+        playlist = write_concat(items, args.run_dir / f"{name}.ffconcat")
+        sink = MetricsSink()
+        metrics = StreamMetrics(name, kind="vod")
+        cmd = play_command(playlist, args.target, loop=args.loop,
+                           duration=args.duration or None, ffmpeg_bin=args.ffmpeg)
+        task = asyncio.get_running_loop().create_task(run(cmd, name=name, metrics=metrics, sink=sink))
+        for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGHUP):
+            asyncio.get_running_loop().add_signal_handler(sig, task.cancel)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            return 255
+
+    return asyncio.run(main())
+
+
+def cmd_status(args: argparse.Namespace) -> int:
+    import time
+
+    from .scheduler import Scheduler, format_status
+    from .telemetry import collect, format_table
+
+    rows = collect()
+    if args.json:
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return 0
+    print(format_table(rows))
+    scheduler = Scheduler()
+    time.sleep(0.6)   # 取一個短採樣窗口，而不是用 1 分鐘負載估算
+    print(format_status(scheduler.status()))
+    return 0
+
+
+def cmd_serve_metrics(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from .telemetry import serve_http
+
+    async def main() -> None:
+        server = await serve_http(args.host, args.port)
+        logging.getLogger("magic_core.telemetry").info(
+            "指標接口已啟動: http://%s:%d/metrics (/status.json)", args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    import asyncio
+
+    from .bench import SCENARIOS, BenchConfig, Outage, compare, run_bench
+
+    try:
+        streams = [int(x) for x in args.streams.split(",") if x.strip()]
+        outages = [Outage.parse(o) for o in args.outage] if args.outage else None
+    except ValueError as exc:
+        print(f"[錯誤] {exc}", file=sys.stderr)
+        return 2
+    cfg = BenchConfig(scenarios=args.scenario or list(SCENARIOS), streams=streams,
+                      duration=args.duration, reconnect_seconds=args.reconnect_seconds,
+                      source=args.source, size=args.size, core_dir=args.core_dir.resolve(),
+                      ffmpeg_bin=args.ffmpeg, ffprobe_bin=args.ffprobe, keep=args.keep)
+    if outages is not None:
+        cfg.outages = outages
+    report = asyncio.run(run_bench(cfg))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        problems = compare(report, baseline, tolerance=args.tolerance)
+        for line in problems:
+            print(f"[回退] {line}", file=sys.stderr)
+        if problems:
+            return 1
+        print(f"[比較] 與基線 {baseline.get('version', '')} 相比無明顯回退", file=sys.stderr)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="magic_core", description="Magic Stream 核心組件")
+    p.add_argument("--startup-profile", action="store_true",
+                   help="在 stderr 輸出啟動各階段與導入的耗時")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    d = sub.add_parser("daemon", help="常駐調度：單進程承載全部自動轉播任務")
+    d.add_argument("--auth-dir", type=Path, default=DEFAULT_AUTH_DIR)
+    d.add_argument("--socket", type=Path, default=DEFAULT_SOCKET)
+    d.add_argument("--state-file", type=Path, default=DEFAULT_RUN_DIR / "ms_daemon_jobs.json")
+    d.add_argument("--probe-max-interval", type=float, default=60.0,
+                   help="離線探測的最大退避間隔 (秒)")
+    d.add_argument("--ffmpeg", default="ffmpeg")
+    d.add_argument("--ffprobe", default="ffprobe")
+    d.add_argument("--slate-image", type=Path, help="斷流墊片使用的靜態圖 (預設黑屏)")
+    d.set_defaults(func=cmd_daemon)
+
+    c = sub.add_parser("ctl", help="向常駐調度進程增刪任務")
+    c.add_argument("--socket", type=Path, default=DEFAULT_SOCKET)
+    c.add_argument("--json", action="store_true", help="list 以 JSON 輸出")
+    csub = c.add_subparsers(dest="action", required=True)
+    a = csub.add_parser("add")
+    a.add_argument("--source-url", required=True)
+    a.add_argument("--title", default="Magic Stream Live")
+    a.add_argument("--privacy", choices=PRIVACY_CHOICES, default="unlisted")
+    a.add_argument("--reconnect-seconds", type=int, default=300)
+    a.add_argument("--gapless", action="store_true", help="斷流期間推送墊片，保持直播不中斷")
+    a.add_argument("--codec", choices=CODEC_MODES, default="auto", help=CODEC_HELP)
+    r = csub.add_parser("remove")
+    r.add_argument("id")
+    csub.add_parser("list")
+    csub.add_parser("shutdown")
+    c.set_defaults(func=cmd_ctl)
+
+    # 菜單不調用：供手動排查源地址，退出碼便於腳本判斷
+    pr = sub.add_parser("probe", help="探測直播源是否在線 (全部在線時退出碼為 0)")
+    pr.add_argument("urls", nargs="+")
+    pr.add_argument("--wait", action="store_true", help="等待直至全部上線 (指數退避輪詢)")
+    pr.add_argument("--timeout", type=float, default=0, help="--wait 的最長等待秒數，0 表示不限")
+    pr.add_argument("--max-interval", type=float, default=60.0)
+    pr.add_argument("--concurrency", type=int, default=256)
+    pr.add_argument("--ffprobe", default="ffprobe")
+    pr.set_defaults(func=cmd_probe)
+
+    g = sub.add_parser("gapless", help="斷流墊片轉播：源中斷時推送墊片，RTMP 連接不斷開")
+    g.add_argument("--source-url", required=True)
+    g.add_argument("--target", required=True, help="輸出地址，如 rtmp://a.rtmp.youtube.com/live2/<金鑰>")
+    g.add_argument("--max-gap", type=float, default=0, help="源中斷超過此秒數則退出，0 表示不限")
+    g.add_argument("--stall-timeout", type=float, default=5.0, help="源無數據多少秒視為中斷")
+    g.add_argument("--slate", type=Path, help="預編碼墊片 FLV (預設自動生成)")
+    g.add_argument("--slate-image", type=Path)
+    g.add_argument("--slate-size", default="1280x720")
+    g.add_argument("--max-interval", type=float, default=30.0)
+    g.add_argument("--codec", choices=CODEC_MODES, default="auto", help=CODEC_HELP)
+    g.add_argument("--name", help="指標名稱 (預設取 screen 會話名)")
+    g.add_argument("--ffmpeg", default="ffmpeg")
+    g.add_argument("--ffprobe", default="ffprobe")
+    g.set_defaults(func=cmd_gapless)
+
+    f = sub.add_parser("fanout", help="單路拉流、多路分發 (可運行時增刪推流目標)")
+    f.add_argument("--source-url", required=True)
+    f.add_argument("--output", action="append", default=[], metavar="RTMP_URL",
+                   help="推流地址 (含金鑰)，可重複指定")
+    f.add_argument("--socket", type=Path, help="控制接口，用於運行時增刪推流目標")
+    f.add_argument("--stall-timeout", type=float, default=10.0)
+    f.add_argument("--max-interval", type=float, default=30.0)
+    f.add_argument("--codec", choices=CODEC_MODES, default="auto", help=CODEC_HELP)
+    f.add_argument("--name", help="指標名稱前綴 (預設取 screen 會話名)")
+    f.add_argument("--ffmpeg", default="ffmpeg")
+    f.add_argument("--ffprobe", default="ffprobe")
+    f.set_defaults(func=cmd_fanout)
+
+    fc = sub.add_parser("fanout-ctl", help="管理分發進程的推流目標")
+    fc.add_argument("--socket", type=Path, required=True)
+    fc.add_argument("--json", action="store_true")
+    fsub = fc.add_subparsers(dest="action", required=True)
+    fsub.add_parser("add").add_argument("url")
+    fsub.add_parser("remove").add_argument("id")
+    fsub.add_parser("list")
+    fc.set_defaults(func=cmd_fanout_ctl)
+
+    rl = sub.add_parser("relay", help="手動轉播：流複製優先，源不可複製時自動轉碼，斷流自動重連")
+    rl.add_argument("--source-url", required=True)
+    rl.add_argument("--target", required=True, help="輸出地址，如 rtmp://a.rtmp.youtube.com/live2/<金鑰>")
+    rl.add_argument("--codec", choices=CODEC_MODES, default="auto", help=CODEC_HELP)
+    rl.add_argument("--reconnect-seconds", type=float, default=0,
+                    help="斷流超過此秒數則退出 (與自動轉播一致)，0 表示一直等待")
+    rl.add_argument("--name", help="指標名稱 (預設取 screen 會話名)")
+    rl.add_argument("--max-interval", type=float, default=30.0)
+    rl.add_argument("--ffmpeg", default="ffmpeg")
+    rl.add_argument("--ffprobe", default="ffprobe")
+    rl.set_defaults(func=cmd_relay)
+
+    li = sub.add_parser("license", help="授權狀態 (本地緩存，過期後台刷新)")
+    li.add_argument("--refresh", action="store_true", help="忽略緩存，立即連接授權服務器")
+    li.add_argument("--json", action="store_true")
+    li.add_argument("--lock", help=argparse.SUPPRESS)
+    li.set_defaults(func=cmd_license)
+
+    v = sub.add_parser("vod", help="文件推流：預檢/緩存不兼容文件後經 concat 首尾連播")
+    v.add_argument("files", nargs="*", help="vod 目錄下的文件名，不填則推送整個目錄")
+    v.add_argument("--vod-dir", type=Path, default=DEFAULT_VOD_DIR)
+    v.add_argument("--target", help="推流地址 (含金鑰)")
+    v.add_argument("--loop", type=int, default=-1, help="額外重複次數，-1 表示無限循環")
+    v.add_argument("--duration", type=float, default=0, help="推流總時長 (秒)，0 表示不限")
+    v.add_argument("--shuffle", action="store_true")
+    v.add_argument("--max-keyint", type=float, default=0,
+                   help="關鍵幀間隔超過此秒數的文件預先轉碼，0 (預設) 表示只警告")
+    v.add_argument("--prepare-only", action="store_true", help="只建立索引與緩存，不推流")
+    v.add_argument("--run-dir", type=Path, default=DEFAULT_RUN_DIR,
+                   help="播放列表目錄；清理緩存時保留其中各播放列表引用的文件")
+    v.add_argument("--name", help="指標名稱 (預設取 screen 會話名)")
+    v.add_argument("--ffmpeg", default="ffmpeg")
+    v.add_argument("--ffprobe", default="ffprobe")
+    v.set_defaults(func=cmd_vod)
+
+    st = sub.add_parser("status", help="打印全部推流的實時狀態表")
+    st.add_argument("--json", action="store_true")
+    st.set_defaults(func=cmd_status)
+
+    b = sub.add_parser("bench", help="離線壓測：本地合成源 + RTMP 接收端，輸出 JSON 報告")
+    b.add_argument("--scenario", action="append", choices=("manual", "auto", "gapless", "vod"),
+                   help="可重複指定，預設全部")
+    b.add_argument("--streams", default="1,4", help="併發路數，逗號分隔，如 1,4,16")
+    b.add_argument("--duration", type=float, default=60.0, help="每個併發級別的運行秒數")
+    b.add_argument("--outage", action="append", metavar="AT:SECS",
+                   help="斷流腳本 (起始秒:時長秒)，可重複，預設 15:5 與 35:15")
+    b.add_argument("--reconnect-seconds", type=float, default=10.0,
+                   help="auto / gapless 場景的斷流容忍時間")
+    b.add_argument("--source", choices=("flv", "hls"), default="flv")
+    b.add_argument("--size", default="1280x720")
+    b.add_argument("--core-dir", type=Path, default=DEFAULT_RUN_DIR.parent,
+                   help="被測版本的安裝目錄 (預設當前安裝)")
+    b.add_argument("--output", type=Path, help="報告寫入文件 (預設輸出到 stdout)")
+    b.add_argument("--baseline", type=Path, help="與上一版本的報告比較，有回退時退出碼為 1")
+    b.add_argument("--tolerance", type=float, default=0.25, help="時間/資源指標允許的相對增幅")
+    b.add_argument("--keep", action="store_true", help="保留臨時文件與被測進程日誌")
+    b.add_argument("--ffmpeg", default="ffmpeg")
+    b.add_argument("--ffprobe", default="ffprobe")
+    b.set_defaults(func=cmd_bench)
+
+    sm = sub.add_parser("serve-metrics", help="HTTP 指標接口 (/metrics 為 Prometheus 格式)")
+    sm.add_argument("--host", default="127.0.0.1")
+    sm.add_argument("--port", type=int, default=9466)
+    sm.set_defaults(func=cmd_serve_metrics)
+    return p
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.startup_profile:
+        startup.enable()
+    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
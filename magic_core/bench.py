@@ -0,0 +1,686 @@
+"""離線壓測：本地合成直播源 + RTMP 接收端，測量轉播、重連與文件推流的容量。
+
+::
+
+    lavfi testsrc ─ ffmpeg ─> 本地 HTTP-FLV / HLS 服務 (按腳本斷流)
+                                      │ N 路
+        magic_core relay / gapless / vod (被測進程，命令與菜單啟動時一致)
+                                      │
+                  ffmpeg -listen 1 RTMP 接收端 (逐 tag 記錄到達時間)
+
+每路記錄首包時間、斷流後的重新拉流與恢復時間、接收端斷檔、CPU 與內存
+(被測進程及其 ffmpeg 子進程合計)、持續速度比 (收到的媒體時長 / 牆鐘時長)。
+結果為 JSON，可與上一版本的結果比較以發現性能回退。全部在本機完成，
+不需要網絡與 YouTube 憑證。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from . import ffmpeg
+from .flv import FILE_HEADER, TAG_SCRIPT, FlvError, Tag, read_tags
+from .paths import INSTALL_DIR
+from .scheduler import host_cores
+
+log = logging.getLogger("magic_core.bench")
+
+SCENARIOS = ("manual", "auto", "gapless", "vod")
+GAP_THRESHOLD = 0.5        # 接收端超過此秒數沒有數據記為斷檔
+SAMPLE_INTERVAL = 1.0
+SETTLE = 3.0               # 連接建立後的突發與緩衝期，不計入速度比
+MIN_SPAN = 2.0             # 穩定期短於此時長的連接不計入速度比
+CLIENT_BUFFER = 4 * 1024 * 1024
+VOD_FILES = 3
+VOD_SECONDS = 10
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass
+class Outage:
+    at: float
+    duration: float
+
+    @classmethod
+    def parse(cls, text: str) -> "Outage":
+        """``起始秒:時長秒``，如 ``15:5``。"""
+        at, _, dur = text.partition(":")
+        try:
+            return cls(float(at), float(dur))
+        except ValueError:
+            raise ValueError(f"無效斷流腳本: {text} (格式 起始秒:時長秒)") from None
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))], 3)
+
+
+# ---------------- 合成直播源 ----------------
+
+class _Client:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.synced = False
+        self.done = asyncio.Event()
+
+
+class SourceServer:
+    """一個編碼進程供 N 路使用；每路有獨立地址，可單獨斷流。
+
+    HTTP-FLV 由服務端把同一組 tag 分發給各連接 (新連接從下一個關鍵幀
+    開始)；HLS 由 ffmpeg 寫出清單與分片，服務端按路徑轉發文件。斷流期間
+    該路返回 404 並斷開已有連接，與直播平台下播的表現一致。
+    """
+
+    def __init__(self, workdir: Path, *, kind: str = "flv", size: str = "1280x720",
+                 ffmpeg_bin: str = "ffmpeg") -> None:
+        self.workdir = Path(workdir)
+        self.kind = kind
+        self.size = size
+        self.ffmpeg_bin = ffmpeg_bin
+        self.port = 0
+        self.down: Set[int] = set()
+        self.pulls: Dict[int, List[float]] = {}   # 各路媒體請求的時間 (探針請求除外)
+        self._clients: Dict[int, List[_Client]] = {}
+        self._headers: Dict[int, Tag] = {}
+        self._ready = asyncio.Event()
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    def url(self, idx: int) -> str:
+        if self.kind == "hls":
+            return f"http://127.0.0.1:{self.port}/hls/{idx}/live.m3u8"
+        return f"http://127.0.0.1:{self.port}/live/{idx}.flv"
+
+    async def start(self, timeout: float = 30.0) -> None:
+        w, _, h = self.size.partition("x")
+        cmd = [
+            self.ffmpeg_bin, "-hide_banner", "-loglevel", "error", "-re",
+            "-f", "lavfi", "-i", f"testsrc2=s={w}x{h}:r=30",
+            "-f", "lavfi", "-i", "sine=f=440:sample_rate=44100",
+            "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+            "-pix_fmt", "yuv420p", "-g", "60", "-b:v", "2500k",
+            "-c:a", "aac", "-b:a", "128k",
+        ]
+        if self.kind == "hls":
+            hls_dir = self.workdir / "hls"
+            hls_dir.mkdir(parents=True, exist_ok=True)
+            cmd += ["-f", "hls", "-hls_time", "2", "-hls_list_size", "6",
+                    "-hls_flags", "delete_segments+omit_endlist", str(hls_dir / "live.m3u8")]
+            stdout = asyncio.subprocess.DEVNULL
+        else:
+            cmd += ["-f", "flv", "pipe:1"]
+            stdout = asyncio.subprocess.PIPE
+        self._proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=asyncio.subprocess.DEVNULL, stdout=stdout,
+            stderr=asyncio.subprocess.DEVNULL)
+        loop = asyncio.get_running_loop()
+        self._tasks.append(loop.create_task(self._pump() if self.kind == "flv" else self._watch_hls()))
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        for clients in self._clients.values():
+            for c in clients:
+                c.writer.close()
+                c.done.set()
+        # 先結束編碼進程，讓 _pump 讀到 EOF 後退出，管道隨之關閉
+        if self._proc is not None:
+            await ffmpeg.terminate(self._proc)
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def set_down(self, idx: int, down: bool) -> None:
+        if down:
+            self.down.add(idx)
+            for c in self._clients.pop(idx, []):
+                c.writer.close()
+                c.done.set()
+        else:
+            self.down.discard(idx)
+
+    async def _pump(self) -> None:
+        assert self._proc is not None and self._proc.stdout is not None
+        async for tag in read_tags(self._proc.stdout):
+            if tag.type == TAG_SCRIPT:
+                continue
+            if tag.is_sequence_header:
+                self._headers[tag.type] = tag
+            if tag.is_keyframe:
+                self._ready.set()
+            for idx, clients in self._clients.items():
+                for c in list(clients):
+                    if c.writer.is_closing():
+                        clients.remove(c)
+                        c.done.set()
+                        continue
+                    if not c.synced:
+                        if not tag.is_keyframe:
+                            continue
+                        for header in self._headers.values():
+                            if header is not tag:
+                                c.writer.write(header.encode(tag.timestamp))
+                        c.synced = True
+                    c.writer.write(tag.encode(tag.timestamp))
+                    if c.writer.transport.get_write_buffer_size() > CLIENT_BUFFER:
+                        log.warning("源 %d: 客戶端讀取過慢，斷開", idx)
+                        c.writer.close()
+
+    async def _watch_hls(self) -> None:
+        playlist = self.workdir / "hls" / "live.m3u8"
+        while True:
+            try:
+                if playlist.read_text(encoding="utf-8").count("#EXTINF") >= 2:
+                    self._ready.set()
+                    return
+            except OSError:
+                pass
+            await asyncio.sleep(0.5)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            method, path = request.decode("latin-1").split(" ", 2)[:2]
+            path = path.split("?")[0]
+            parts = path.strip("/").split("/")
+            idx = int(parts[1].split(".")[0]) if len(parts) >= 2 and parts[0] in ("live", "hls") else -1
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                ValueError, ConnectionError):
+            writer.close()
+            return
+        if idx < 0 or idx in self.down:
+            self._reply(writer, 404, b"")
+            return
+        if self.kind == "hls":
+            name = parts[-1]
+            try:
+                body = (self.workdir / "hls" / name).read_bytes()
+            except OSError:
+                self._reply(writer, 404, b"")
+                return
+            if method == "GET" and not name.endswith(".m3u8"):
+                self.pulls.setdefault(idx, []).append(time.monotonic())
+            self._reply(writer, 200, body if method == "GET" else b"",
+                        "application/vnd.apple.mpegurl" if name.endswith(".m3u8") else "video/mp2t",
+                        length=len(body))
+            return
+        head = ("HTTP/1.1 200 OK\r\nContent-Type: video/x-flv\r\n"
+                "Connection: close\r\n\r\n").encode("latin-1")
+        if method != "GET":
+            writer.write(head)
+            writer.close()
+            return
+        self.pulls.setdefault(idx, []).append(time.monotonic())
+        writer.write(head + FILE_HEADER)
+        client = _Client(writer)
+        self._clients.setdefault(idx, []).append(client)
+        await client.done.wait()
+
+    @staticmethod
+    def _reply(writer: asyncio.StreamWriter, status: int, body: bytes,
+               ctype: str = "text/plain", length: Optional[int] = None) -> None:
+        reason = "OK" if status == 200 else "Not Found"
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: {ctype}\r\n"
+            f"Content-Length: {len(body) if length is None else length}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body)
+        writer.close()
+
+
+# ---------------- RTMP 接收端 ----------------
+
+@dataclass
+class _Session:
+    first_wall: float
+    first_ts: int
+    last_wall: float = 0.0
+    last_ts: int = 0
+    settle_wall: Optional[float] = None
+    settle_ts: int = 0
+
+
+class Sink:
+    """``ffmpeg -listen 1`` 充當 RTMP 服務器；推流端斷開後立即重新監聽。"""
+
+    def __init__(self, *, ffmpeg_bin: str = "ffmpeg") -> None:
+        self.ffmpeg_bin = ffmpeg_bin
+        self.port = _free_port()
+        self.sessions: List[_Session] = []
+        self.gaps: List[Tuple[float, float]] = []   # (開始, 結束) monotonic
+        self.first_video: Optional[float] = None
+        self._last: Optional[float] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def url(self) -> str:
+        return f"rtmp://127.0.0.1:{self.port}/live/bench"
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            proc = await asyncio.create_subprocess_exec(
+                self.ffmpeg_bin, "-hide_banner", "-loglevel", "error",
+                "-analyzeduration", "500000",   # 縮短接收端自身的探測緩衝
+                "-listen", "1", "-i", self.url, "-c", "copy", "-f", "flv", "pipe:1",
+                stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL)
+            assert proc.stdout is not None
+            session: Optional[_Session] = None
+            try:
+                async for tag in read_tags(proc.stdout):
+                    if tag.type == TAG_SCRIPT:
+                        continue
+                    now = time.monotonic()
+                    if self._last is not None and now - self._last > GAP_THRESHOLD:
+                        self.gaps.append((self._last, now))
+                    self._last = now
+                    if self.first_video is None and tag.is_keyframe:
+                        self.first_video = now
+                    if session is None:
+                        session = _Session(now, tag.timestamp)
+                        self.sessions.append(session)
+                    session.last_wall, session.last_ts = now, tag.timestamp
+                    if session.settle_wall is None and now - session.first_wall >= SETTLE:
+                        session.settle_wall, session.settle_ts = now, tag.timestamp
+            except FlvError:
+                pass
+            except BaseException:
+                await ffmpeg.terminate(proc, 2.0)
+                raise
+            # 推流端已斷開，ffmpeg 會自行退出；不要搶先發信號回收
+            try:
+                await asyncio.wait_for(proc.wait(), 2.0)
+            except asyncio.TimeoutError:
+                await ffmpeg.terminate(proc, 2.0)
+
+    def speed(self) -> Tuple[Optional[float], float]:
+        """(穩定期速度比, 收到的媒體總秒數)；沒有足夠長的穩定期時速度比為 None。"""
+        media = wall = 0.0
+        for s in self.sessions:
+            if s.settle_wall is not None and s.last_wall - s.settle_wall >= MIN_SPAN:
+                media += (s.last_ts - s.settle_ts) / 1000
+                wall += s.last_wall - s.settle_wall
+        total = sum((s.last_ts - s.first_ts) / 1000 for s in self.sessions)
+        return (round(media / wall, 3) if wall else None), round(total, 1)
+
+
+# ---------------- 進程資源 ----------------
+
+def _stat(pid: int) -> Optional[List[bytes]]:
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return f.read().rsplit(b")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+
+
+def _children() -> Dict[int, List[int]]:
+    tree: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            fields = _stat(int(entry))
+            if fields is not None:
+                tree.setdefault(int(fields[1]), []).append(int(entry))
+    return tree
+
+
+class ProcStats:
+    """被測進程及其子進程 (ffmpeg) 的 CPU 時間與常駐內存。"""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.cpu_first: Optional[float] = None
+        self.cpu_last = 0.0
+        self.rss: List[int] = []
+        self._first_at = self._last_at = 0.0
+
+    def sample(self, tree: Dict[int, List[int]]) -> None:
+        root = _stat(self.pid)
+        if root is None or root[0] == b"Z":
+            return
+        ticks = sum(int(x) for x in root[11:15])   # 含已回收子進程
+        rss = int(root[21])
+        todo = list(tree.get(self.pid, []))
+        while todo:
+            pid = todo.pop()
+            fields = _stat(pid)
+            if fields is not None:
+                ticks += sum(int(x) for x in fields[11:15])
+                rss += int(fields[21])
+            todo.extend(tree.get(pid, []))
+        now = time.monotonic()
+        cpu = ticks / _CLK_TCK
+        if self.cpu_first is None:
+            self.cpu_first, self._first_at = cpu, now
+        self.cpu_last, self._last_at = cpu, now
+        self.rss.append(rss * _PAGE)
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        wall = self._last_at - self._first_at
+        cpu = (self.cpu_last - (self.cpu_first or 0.0)) / wall * 100 if wall > 0 else None
+        mb = [r / 1048576 for r in self.rss]
+        return {
+            "cpu_pct": round(cpu, 1) if cpu is not None else None,
+            "rss_mb_avg": round(statistics.mean(mb), 1) if mb else None,
+            "rss_mb_max": round(max(mb), 1) if mb else None,
+        }
+
+
+# ---------------- 壓測流程 ----------------
+
+@dataclass
+class BenchConfig:
+    scenarios: List[str] = field(default_factory=lambda: list(SCENARIOS))
+    streams: List[int] = field(default_factory=lambda: [1, 4])
+    duration: float = 60.0
+    outages: List[Outage] = field(default_factory=lambda: [Outage(15, 5), Outage(35, 15)])
+    reconnect_seconds: float = 10.0
+    source: str = "flv"
+    size: str = "1280x720"
+    core_dir: Path = INSTALL_DIR
+    ffmpeg_bin: str = "ffmpeg"
+    ffprobe_bin: str = "ffprobe"
+    keep: bool = False
+
+
+def _stream_command(cfg: BenchConfig, scenario: str, name: str, source: str, target: str,
+                    workdir: Path) -> List[str]:
+    """與 magic_stream.sh 菜單 / 常駐任務相同的啟動方式。"""
+    base = [sys.executable, "-u", "-m", "magic_core"]
+    tools = ["--ffmpeg", cfg.ffmpeg_bin, "--ffprobe", cfg.ffprobe_bin]
+    if scenario == "manual":
+        return base + ["relay", "--source-url", source, "--target", target, "--name", name, *tools]
+    if scenario == "auto":
+        return base + ["relay", "--source-url", source, "--target", target, "--name", name,
+                       "--reconnect-seconds", str(cfg.reconnect_seconds), *tools]
+    if scenario == "gapless":
+        return base + ["gapless", "--source-url", source, "--target", target, "--name", name,
+                       "--max-gap", str(cfg.reconnect_seconds), "--slate-size", cfg.size, *tools]
+    return base + ["vod", "--vod-dir", str(workdir / "vod"), "--run-dir", str(workdir / "run"),
+                   "--target", target, "--loop", "-1", "--name", name, *tools]
+
+
+async def _make_vod(workdir: Path, cfg: BenchConfig) -> None:
+    vod_dir = workdir / "vod"
+    vod_dir.mkdir(parents=True, exist_ok=True)
+    w, _, h = cfg.size.partition("x")
+    for n in range(1, VOD_FILES + 1):
+        out = vod_dir / f"clip{n}.mp4"
+        proc = await asyncio.create_subprocess_exec(
+            cfg.ffmpeg_bin, "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"testsrc2=s={w}x{h}:r=30",
+            "-f", "lavfi", "-i", f"sine=f={220 * n}:sample_rate=44100",
+            "-t", str(VOD_SECONDS), "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p",
+            "-g", "60", "-c:a", "aac", "-b:a", "128k", "-movflags", "+faststart", str(out),
+            stdin=asyncio.subprocess.DEVNULL)
+        if await proc.wait() != 0:
+            raise RuntimeError(f"生成測試文件失敗: {out}")
+    # 預先建立元數據索引，各併發級別都從熱緩存開播
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "magic_core", "vod", "--vod-dir", str(vod_dir), "--prepare-only",
+        "--run-dir", str(workdir / "run"),
+        "--ffmpeg", cfg.ffmpeg_bin, "--ffprobe", cfg.ffprobe_bin,
+        cwd=str(cfg.core_dir), stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    await proc.wait()
+
+
+async def _stop_process(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        try:
+            proc.send_signal(signal.SIGTERM)
+            await asyncio.wait_for(proc.wait(), 10)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+        except ProcessLookupError:
+            pass
+
+
+def _outage_result(o: Outage, start: float, sink: Sink, pulls: List[float]) -> Dict[str, Any]:
+    begin, end = start + o.at, start + o.at + o.duration
+    repull = next((t - end for t in pulls if t >= end), None)
+    resume = next((s.first_wall - end for s in sink.sessions if s.first_wall >= end), None)
+    overlap = [b - a for a, b in sink.gaps if a < end and b > begin]
+    return {
+        "at": o.at, "duration": o.duration,
+        "repull_s": round(repull, 3) if repull is not None else None,
+        "resume_s": round(resume, 3) if resume is not None else None,
+        "sink_gap_s": round(max(overlap), 3) if overlap else 0.0,
+    }
+
+
+async def run_level(cfg: BenchConfig, scenario: str, n: int, server: Optional[SourceServer],
+                    workdir: Path) -> Dict[str, Any]:
+    log.info("場景 %s × %d 路，時長 %.0f 秒...", scenario, n, cfg.duration)
+    sinks = [Sink(ffmpeg_bin=cfg.ffmpeg_bin) for _ in range(n)]
+    for s in sinks:
+        s.start()
+    await asyncio.sleep(0.5)
+    names = [f"bench_{scenario}_{i + 1:02d}" for i in range(n)]
+    procs: List[asyncio.subprocess.Process] = []
+    logs = []
+    start = time.monotonic()
+    for i in range(n):
+        source = server.url(i) if server is not None else ""
+        logf = open(workdir / "logs" / f"{names[i]}.log", "wb")
+        logs.append(logf)
+        procs.append(await asyncio.create_subprocess_exec(
+            *_stream_command(cfg, scenario, names[i], source, sinks[i].url, workdir),
+            cwd=str(cfg.core_dir), stdin=asyncio.subprocess.DEVNULL,
+            stdout=logf, stderr=subprocess.STDOUT))
+    stats = [ProcStats(p.pid) for p in procs]
+    ended: List[Optional[float]] = [None] * n
+
+    async def script() -> None:
+        if server is None:
+            return
+        for o in sorted(cfg.outages, key=lambda x: x.at):
+            await asyncio.sleep(max(0.0, start + o.at - time.monotonic()))
+            for i in range(n):
+                server.set_down(i, True)
+            await asyncio.sleep(o.duration)
+            for i in range(n):
+                server.set_down(i, False)
+
+    outages = asyncio.get_running_loop().create_task(script())
+    try:
+        while time.monotonic() - start < cfg.duration:
+            tree = _children()
+            for i, (p, st) in enumerate(zip(procs, stats)):
+                if p.returncode is None:
+                    st.sample(tree)
+                elif ended[i] is None:
+                    ended[i] = time.monotonic() - start
+            await asyncio.sleep(SAMPLE_INTERVAL)
+    finally:
+        outages.cancel()
+        await asyncio.gather(outages, return_exceptions=True)
+        await asyncio.gather(*(_stop_process(p) for p in procs))
+        await asyncio.gather(*(s.stop() for s in sinks))
+        for f in logs:
+            f.close()
+        if server is not None:
+            for i in range(n):
+                server.set_down(i, False)
+
+    rows = []
+    for i in range(n):
+        sink = sinks[i]
+        speed, media = sink.speed()
+        row: Dict[str, Any] = {
+            "name": names[i],
+            "ttfp_s": round(sink.first_video - start, 3) if sink.first_video else None,
+            "speed": speed,
+            "media_s": media,
+            "sink_connections": len(sink.sessions),
+            "sink_gaps": [[round(a - start, 2), round(b - a, 2)] for a, b in sink.gaps],
+            "ended_at_s": round(ended[i], 1) if ended[i] is not None else None,
+            **stats[i].summary(),
+        }
+        if server is not None:
+            pulls = server.pulls.get(i, [])
+            row["outages"] = [_outage_result(o, start, sink, pulls) for o in cfg.outages
+                              if o.at < cfg.duration]
+        metrics_file = cfg.core_dir / "run" / "metrics" / f"{names[i]}.json"
+        try:
+            m = json.loads(metrics_file.read_text(encoding="utf-8"))
+            row["relay"] = {k: m.get(k) for k in ("reconnects", "drop_frames", "dup_frames")}
+            metrics_file.unlink()
+        except (OSError, ValueError):
+            pass
+        rows.append(row)
+    return {"scenario": scenario, "streams": n, "per_stream": rows, "summary": _summarize(rows)}
+
+
+def _summarize(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ttfp = [r["ttfp_s"] for r in rows if r["ttfp_s"] is not None]
+    speeds = [r["speed"] for r in rows if r["speed"] is not None]
+    cpu = [r["cpu_pct"] for r in rows if r.get("cpu_pct") is not None]
+    rss = [r["rss_mb_avg"] for r in rows if r.get("rss_mb_avg") is not None]
+    resume = [o["resume_s"] for r in rows for o in r.get("outages", []) if o["resume_s"] is not None]
+    gaps = [o["sink_gap_s"] for r in rows for o in r.get("outages", [])]
+    return {
+        "started": len(ttfp),
+        "ttfp_p50_s": _percentile(ttfp, 50),
+        "ttfp_max_s": max(ttfp) if ttfp else None,
+        "speed_min": min(speeds) if speeds else None,
+        "speed_mean": round(statistics.mean(speeds), 3) if speeds else None,
+        "resume_p50_s": _percentile(resume, 50),
+        "sink_gap_max_s": max(gaps) if gaps else None,
+        "cpu_pct_per_stream": round(statistics.mean(cpu), 1) if cpu else None,
+        "cpu_pct_total": round(sum(cpu), 1) if cpu else None,
+        "rss_mb_per_stream": round(statistics.mean(rss), 1) if rss else None,
+    }
+
+
+def _version(core_dir: Path) -> str:
+    try:
+        return subprocess.run(["git", "-C", str(core_dir), "describe", "--always", "--dirty"],
+                              capture_output=True, text=True, timeout=10, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        digest = hashlib.sha1()
+        for path in sorted((core_dir / "magic_core").glob("*.py")):
+            digest.update(path.read_bytes())
+        return digest.hexdigest()[:12]
+
+
+def _ffmpeg_version(ffmpeg_bin: str) -> str:
+    try:
+        out = subprocess.run([ffmpeg_bin, "-version"], capture_output=True, text=True, timeout=10).stdout
+        return out.splitlines()[0] if out else ""
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+async def run_bench(cfg: BenchConfig) -> Dict[str, Any]:
+    workdir = Path(tempfile.mkdtemp(prefix="magic_bench_"))
+    (workdir / "logs").mkdir()
+    (workdir / "run").mkdir()   # 文件推流的播放列表，不寫入被測安裝目錄
+    report: Dict[str, Any] = {
+        "version": _version(cfg.core_dir),
+        "host": {"cores": len(host_cores()), "loadavg": os.getloadavg()[0],
+                 "ffmpeg": _ffmpeg_version(cfg.ffmpeg_bin)},
+        "config": {"duration": cfg.duration, "source": cfg.source, "size": cfg.size,
+                   "reconnect_seconds": cfg.reconnect_seconds,
+                   "outages": [[o.at, o.duration] for o in cfg.outages]},
+        "started_at": time.time(),
+        "runs": [],
+    }
+    server: Optional[SourceServer] = None
+    try:
+        if any(s != "vod" for s in cfg.scenarios):
+            server = SourceServer(workdir, kind=cfg.source, size=cfg.size, ffmpeg_bin=cfg.ffmpeg_bin)
+            await server.start()
+        if "vod" in cfg.scenarios:
+            await _make_vod(workdir, cfg)
+        for scenario in cfg.scenarios:
+            for n in cfg.streams:
+                result = await run_level(cfg, scenario, n, None if scenario == "vod" else server,
+                                         workdir)
+                report["runs"].append(result)
+                log.info("  %s", json.dumps(result["summary"], ensure_ascii=False))
+                await asyncio.sleep(2)
+    finally:
+        if server is not None:
+            await server.stop()
+        if cfg.keep:
+            log.info("臨時文件保留在 %s", workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+# ---------------- 版本比較 ----------------
+
+# (指標, 越大越好, 說明)
+_CHECKS = (
+    ("speed_min", True, "最低速度比"),
+    ("ttfp_p50_s", False, "首包時間中位數"),
+    ("resume_p50_s", False, "斷流恢復中位數"),
+    ("cpu_pct_per_stream", False, "單路 CPU"),
+    ("rss_mb_per_stream", False, "單路內存"),
+)
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], *, tolerance: float = 0.25,
+            speed_tolerance: float = 0.05) -> List[str]:
+    """與基線逐項比較，返回超出容差的回退說明。
+
+    速度比接近 1.0 且本身波動很小，單獨使用更嚴格的容差。
+    """
+    base = {(r["scenario"], r["streams"]): r["summary"] for r in baseline.get("runs", [])}
+    problems: List[str] = []
+    for run in report.get("runs", []):
+        old = base.get((run["scenario"], run["streams"]))
+        if old is None:
+            continue
+        if run["summary"]["started"] < old.get("started", 0):
+            problems.append(f"{run['scenario']} × {run['streams']}: 成功開播 "
+                            f"{old['started']} -> {run['summary']['started']} 路")
+        for key, higher_better, label in _CHECKS:
+            new_v, old_v = run["summary"].get(key), old.get(key)
+            if new_v is None or old_v is None or old_v <= 0:
+                continue
+            change = (new_v - old_v) / old_v
+            if (higher_better and change < -speed_tolerance) or (not higher_better and change > tolerance):
+                problems.append(f"{run['scenario']} × {run['streams']}: {label} "
+                                f"{old_v} -> {new_v} ({change * 100:+.0f}%)")
+    return problems
@@ -0,0 +1,47 @@
+"""Unix socket 控制接口：每個連接一條 JSON 命令、一條 JSON 回覆。"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import socket
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+Dispatch = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+async def start_server(path: Path, dispatch: Dispatch) -> asyncio.AbstractServer:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            line = await reader.readline()
+            try:
+                reply = await dispatch(json.loads(line or b"{}"))
+            except (ValueError, TypeError, KeyError) as exc:
+                reply = {"ok": False, "error": str(exc)}
+            writer.write(json.dumps(reply, ensure_ascii=False).encode() + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_unix_server(handle, path=str(path))
+
+
+def send_command(path: Path, msg: Dict[str, Any], timeout: float = 10.0) -> Dict[str, Any]:
+    """同步客戶端：發送一條控制命令並返回回覆。"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(path))
+        sock.sendall(json.dumps(msg, ensure_ascii=False).encode() + b"\n")
+        chunks: List[bytes] = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks) or b"{}")
@@ -0,0 +1,296 @@
+"""單路拉流、多路分發。
+
+源只拉取與解封裝一次 (ingest ffmpeg -> FLV 管道)，Python 將每個 tag
+分發給 N 個輸出；每個輸出是獨立的 ``ffmpeg -f flv -i pipe:0 -c copy``
+子進程，擁有自己的有界隊列與重連退避：
+
+* 某個輸出卡住或斷開只影響它自己 —— 隊列滿時丟棄至下一個關鍵幀，
+  不會阻塞拉流，也不會拖慢其他輸出；
+* 輸出可在運行時增刪 (控制接口 add / remove)，拉流不受影響；
+* 源重連後時間戳經 Splicer 續接，各輸出的 RTMP 連接保持不斷。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from . import control, ffmpeg
+from .flv import FILE_HEADER, TAG_SCRIPT, FlvError, Tag, read_tags
+from .gapless import Splicer
+from .probe import Backoff, ProbeEngine
+from .scheduler import Lease
+from .telemetry import MetricsSink, StreamMetrics, default_name, read_progress, with_progress
+
+log = logging.getLogger("magic_core.fanout")
+
+QUEUE_TAGS = 1500      # 約 20~30 秒的音視頻 tag
+STABLE_SECONDS = 60    # 輸出連續正常這麼久後重置退避
+
+
+def mask_url(url: str) -> str:
+    """日誌/列表中隱藏串流金鑰。"""
+    parts = urlsplit(url)
+    if parts.query:
+        return urlunsplit(parts._replace(query="****"))
+    head, sep, key = parts.path.rpartition("/")
+    if not sep or not head or len(key) <= 4:
+        return url
+    return urlunsplit(parts._replace(path=f"{head}/{key[:4]}****", query=""))
+
+
+class Output:
+    def __init__(self, oid: str, url: str, *, ffmpeg_bin: str = "ffmpeg",
+                 stall_timeout: float = 10.0,
+                 metrics: Optional[StreamMetrics] = None,
+                 sink: Optional[MetricsSink] = None) -> None:
+        self.id = oid
+        self.url = url
+        self.ffmpeg_bin = ffmpeg_bin
+        self.stall_timeout = stall_timeout   # 寫入阻塞超過此秒數視為斷開
+        self.metrics = metrics
+        self.sink = sink
+        self.state = "connecting"
+        self.restarts = 0
+        self.dropped = 0
+        self.synced = False    # 已從關鍵幀開始發送
+        self._queue: "asyncio.Queue[Tuple[Tag, int]]" = asyncio.Queue(QUEUE_TAGS)
+        self._backoff = Backoff(base=2.0, cap=60.0)
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    # ---------- 拉流側調用 (不可阻塞) ----------
+
+    def offer(self, tag: Tag, ts: int, headers: Dict[int, Tag]) -> None:
+        if self.state == "reconnecting":
+            return   # 退避期間不積壓過時數據
+        if not self.synced:
+            if not tag.is_keyframe:
+                return
+            if self._queue.maxsize - self._queue.qsize() < len(headers) + 1:
+                return
+            for header in headers.values():
+                self._queue.put_nowait((header, ts))
+            self.synced = True
+        try:
+            self._queue.put_nowait((tag, ts))
+        except asyncio.QueueFull:
+            # 輸出跟不上：清空隊列，從下一個關鍵幀重新同步
+            self.dropped += self._queue.qsize() + 1
+            self._clear()
+            self.synced = False
+
+    def _clear(self) -> None:
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    # ---------- 輸出循環 ----------
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            self.state = "connecting"
+            cmd = ffmpeg.push_command(self.url, ffmpeg=self.ffmpeg_bin)
+            if self.metrics is not None:
+                cmd = with_progress(cmd)
+                self.metrics.begin_attempt()
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE if self.metrics is not None else asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            assert proc.stdin is not None
+            stderr_log = asyncio.get_running_loop().create_task(ffmpeg.log_stderr(
+                proc, self.id, mask=lambda line: line.replace(self.url, mask_url(self.url))))
+            progress = None
+            if self.metrics is not None:
+                assert proc.stdout is not None
+                progress = asyncio.get_running_loop().create_task(
+                    read_progress(proc.stdout, self.metrics, self.sink))
+            started = time.monotonic()
+            try:
+                proc.stdin.write(FILE_HEADER)
+                while True:
+                    tag, ts = await self._queue.get()
+                    proc.stdin.write(tag.encode(ts))
+                    await asyncio.wait_for(proc.stdin.drain(), self.stall_timeout)
+                    self.state = "live"
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            except asyncio.TimeoutError:
+                # RTMP 對端不再讀取：ffmpeg 卡在發送上，按斷開處理
+                log.warning("[%s] 推流 %.0f 秒無法寫入", self.id, self.stall_timeout)
+            finally:
+                proc.stdin.close()
+                await ffmpeg.terminate(proc)
+                await asyncio.gather(stderr_log, return_exceptions=True)
+                if progress is not None:
+                    await asyncio.gather(progress, return_exceptions=True)
+                if self.metrics is not None:
+                    self.metrics.end_attempt()
+                    if self.sink is not None:
+                        self.sink.publish(self.metrics, force=True)
+            if time.monotonic() - started > STABLE_SECONDS:
+                self._backoff.reset()
+            self.restarts += 1
+            self.state = "reconnecting"
+            self.synced = False
+            self._clear()
+            delay = self._backoff.next()
+            log.warning("[%s] 推流中斷 (%s)，%.0f 秒後重連", self.id, mask_url(self.url), delay)
+            await asyncio.sleep(delay)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "url": mask_url(self.url),
+            "state": self.state,
+            "restarts": self.restarts,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+        }
+
+
+class FanOut:
+    def __init__(self, source_url: str, *, probes: ProbeEngine, ffmpeg_bin: str = "ffmpeg",
+                 stall_timeout: float = 10.0, name: Optional[str] = None,
+                 sink: Optional[MetricsSink] = None,
+                 lease: Optional[Lease] = None) -> None:
+        self.source_url = source_url
+        self.lease = lease   # 非空時拉流轉碼並綁定到租約核心
+        self.name = name or default_name()
+        self.sink = sink
+        self.probes = probes
+        self.ffmpeg_bin = ffmpeg_bin
+        self.stall_timeout = stall_timeout
+        self.outputs: Dict[str, Output] = {}
+        self.ingest_state = "waiting"
+        self.ingest_restarts = 0
+        self._splicer = Splicer()
+        self._headers: Dict[int, Tag] = {}
+
+    def add_output(self, url: str) -> Output:
+        n = 1
+        while f"out_{n:02d}" in self.outputs:
+            n += 1
+        oid = f"out_{n:02d}"
+        metrics = StreamMetrics(f"{self.name}.{oid}", kind="fanout") if self.sink else None
+        out = Output(oid, url, ffmpeg_bin=self.ffmpeg_bin, stall_timeout=self.stall_timeout,
+                     metrics=metrics, sink=self.sink)
+        self.outputs[out.id] = out
+        out.start()
+        log.info("[%s] 已加入推流目標 %s", out.id, mask_url(url))
+        return out
+
+    async def remove_output(self, oid: str) -> bool:
+        out = self.outputs.pop(oid, None)
+        if out is None:
+            return False
+        await out.stop()
+        if self.sink is not None and out.metrics is not None:
+            self.sink.remove(out.metrics)
+        log.info("[%s] 已移除推流目標", oid)
+        return True
+
+    async def run_ingest(self) -> None:
+        """拉流循環：源中斷後探測重連，各輸出保持連接。"""
+        while True:
+            self.ingest_state = "waiting"
+            await self.probes.wait_live(self.source_url)
+            threads = self.lease.threads if self.lease is not None else 0
+            proc = await asyncio.create_subprocess_exec(
+                self.ffmpeg_bin, "-hide_banner", "-loglevel", "error",
+                *ffmpeg.input_args(self.source_url, threads=threads),
+                *ffmpeg.codec_args(threads), "-f", "flv", "pipe:1",
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            if self.lease is not None:
+                self.lease.pin(proc.pid)
+            stderr_log = asyncio.get_running_loop().create_task(
+                ffmpeg.log_stderr(proc, f"{self.name}/in"))
+            assert proc.stdout is not None
+            self._splicer.begin_segment()
+            self._headers = {}
+            for out in self.outputs.values():
+                out.synced = False
+            self.ingest_state = "live"
+            log.info("拉流已啟動: %s", self.source_url)
+            tags = read_tags(proc.stdout).__aiter__()
+            try:
+                while True:
+                    try:
+                        tag = await asyncio.wait_for(tags.__anext__(), self.stall_timeout)
+                    except (StopAsyncIteration, asyncio.TimeoutError, FlvError):
+                        break
+                    if tag.type == TAG_SCRIPT:
+                        continue
+                    if tag.is_sequence_header:
+                        self._headers[tag.type] = tag
+                    ts = self._splicer.map(tag)
+                    for out in list(self.outputs.values()):
+                        out.offer(tag, ts, self._headers)
+            finally:
+                await ffmpeg.terminate(proc)
+                await asyncio.gather(stderr_log, return_exceptions=True)
+            self.ingest_restarts += 1
+            log.info("直播源中斷，探測恢復中...")
+
+    async def _dispatch(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = msg.get("cmd")
+        if cmd == "add":
+            url = msg["url"]
+            if not url:
+                raise ValueError("缺少推流地址")
+            return {"ok": True, "id": self.add_output(url).id}
+        if cmd == "remove":
+            return {"ok": await self.remove_output(msg["id"])}
+        if cmd == "list":
+            return {"ok": True, "source": self.source_url, "ingest": self.ingest_state,
+                    "ingest_restarts": self.ingest_restarts,
+                    "mode": "transcode" if self.lease is not None else "copy",
+                    "outputs": [o.status() for o in self.outputs.values()]}
+        raise ValueError(f"未知命令: {cmd}")
+
+    async def serve(self, urls: List[str], socket_path: Optional[Path] = None) -> bool:
+        """運行至收到停止信號 (返回 True) 或拉流無法繼續 (如 ffmpeg 無法啟動，返回 False)。"""
+        for url in urls:
+            self.add_output(url)
+        server = await control.start_server(socket_path, self._dispatch) if socket_path else None
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+        ingest = loop.create_task(self.run_ingest())
+        waiter = loop.create_task(stopping.wait())
+        try:
+            await asyncio.wait({ingest, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            ingest.cancel()
+            result = (await asyncio.gather(ingest, return_exceptions=True))[0]
+            for oid in list(self.outputs):
+                await self.remove_output(oid)
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+                if socket_path is not None and socket_path.exists():
+                    socket_path.unlink()
+        if isinstance(result, Exception):
+            log.error("[%s] 拉流失敗，停止分發: %s", self.name, result,
+                      exc_info=None if isinstance(result, OSError) else result)
+            return False
+        return True
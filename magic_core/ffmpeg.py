@@ -0,0 +1,150 @@
+"""ffmpeg 命令構建與異步子進程管理。"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence
+
+if TYPE_CHECKING:
+    from .telemetry import MetricsSink, StreamMetrics
+
+log = logging.getLogger("magic_core.ffmpeg")
+
+# 與 magic_stream.sh 手動轉播保持一致 (抖音等源需要移動端 UA + Referer)
+USER_AGENT = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1"
+)
+REFERER = "https://live.douyin.com/"
+RW_TIMEOUT_US = 10_000_000
+TRANSCODE_HEIGHT = 720
+TRANSCODE_BITRATE = "4500k"
+
+
+def network_args() -> List[str]:
+    """拉取網絡直播源的 UA / Referer / 讀超時選項 (ffmpeg 與 ffprobe 通用)。"""
+    return [
+        "-user_agent", USER_AGENT,
+        "-headers", f"Referer: {REFERER}\r\n",
+        "-rw_timeout", str(RW_TIMEOUT_US),
+    ]
+
+
+def input_args(source_url: str, *, threads: int = 0) -> List[str]:
+    """網絡直播源的通用輸入參數。
+
+    ``threads`` 大於 0 表示轉碼：限制解碼線程數，並重新生成缺失/錯亂的時間戳。
+    """
+    decode = ["-fflags", "+genpts+discardcorrupt", "-threads", str(threads)] if threads > 0 else []
+    return [*decode, *network_args(), "-i", source_url]
+
+
+def codec_args(threads: int = 0) -> List[str]:
+    """輸出編碼參數：``threads`` 為 0 時流複製，否則按線程預算轉碼為 H.264/AAC。
+
+    轉碼輸出固定 30fps、2 秒 GOP，最高 720p，音頻重採樣補齊斷點，
+    與 YouTube 推流建議及墊片參數一致。
+    """
+    if threads <= 0:
+        return ["-c", "copy"]
+    return [
+        "-vf", f"scale=-2:'min({TRANSCODE_HEIGHT},ih)',fps=30", "-filter_threads", "1",
+        "-c:v", "libx264", "-preset", "veryfast", "-threads", str(threads),
+        "-pix_fmt", "yuv420p", "-b:v", TRANSCODE_BITRATE, "-maxrate", TRANSCODE_BITRATE,
+        "-bufsize", "9000k", "-g", "60", "-keyint_min", "60", "-sc_threshold", "0",
+        "-af", "aresample=async=1000", "-c:a", "aac", "-b:a", "128k", "-ar", "44100", "-ac", "2",
+    ]
+
+
+def relay_command(source_url: str, target: str, *, ffmpeg: str = "ffmpeg",
+                  threads: int = 0) -> List[str]:
+    """轉播：source -> RTMP (FLV)，默認流複製。"""
+    return [
+        ffmpeg, "-hide_banner", "-loglevel", "error",
+        *input_args(source_url, threads=threads),
+        *codec_args(threads), "-f", "flv", target,
+    ]
+
+
+
+def push_command(target: str, *, ffmpeg: str = "ffmpeg") -> List[str]:
+    """輸出級：從 stdin 讀 FLV，原樣推到 RTMP (斷流墊片與多路分發共用)。"""
+    return [
+        ffmpeg, "-hide_banner", "-loglevel", "error",
+        "-f", "flv", "-i", "pipe:0",
+        "-c", "copy", "-flvflags", "no_duration_filesize",
+        "-f", "flv", target,
+    ]
+
+
+async def log_stderr(proc: asyncio.subprocess.Process, prefix: str, *,
+                     on_line: Optional[Callable[[str], None]] = None,
+                     mask: Optional[Callable[[str], str]] = None) -> None:
+    """把子進程 stderr 逐行寫入日誌，直至管道關閉。
+
+    ``mask`` 在寫日誌前改寫每行 (如隱藏串流金鑰)，``on_line`` 收到原始行。
+    """
+    assert proc.stderr is not None
+    async for raw in proc.stderr:
+        line = raw.decode("utf-8", "replace").rstrip()
+        if line:
+            log.info("[%s] %s", prefix, mask(line) if mask is not None else line)
+            if on_line is not None:
+                on_line(line)
+
+
+async def run(cmd: Sequence[str], *, name: str = "ffmpeg", stop_timeout: float = 5.0,
+              metrics: Optional["StreamMetrics"] = None,
+              sink: Optional["MetricsSink"] = None,
+              on_spawn: Optional[Callable[[int], None]] = None,
+              on_stderr: Optional[Callable[[str], None]] = None) -> int:
+    """運行子進程直至退出，stderr 逐行寫入日誌。
+
+    傳入 ``metrics`` 時附加 ``-progress pipe:1`` 並實時解析進度；
+    ``on_spawn`` 在進程啟動後立即以 pid 調用 (如綁定 CPU 核心)；
+    ``on_stderr`` 逐行收到 stderr (如判斷失敗原因)。
+    任務被取消時先 terminate，超時後 kill，保證不留孤兒進程。
+    """
+    from .telemetry import read_progress, with_progress
+
+    if metrics is not None:
+        cmd = with_progress(cmd)
+        metrics.begin_attempt()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE if metrics is not None else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    if on_spawn is not None:
+        on_spawn(proc.pid)
+    progress = None
+    if metrics is not None:
+        assert proc.stdout is not None
+        progress = asyncio.get_running_loop().create_task(read_progress(proc.stdout, metrics, sink))
+    try:
+        await log_stderr(proc, name, on_line=on_stderr)
+        return await proc.wait()
+    finally:
+        await terminate(proc, stop_timeout)
+        if progress is not None:
+            await asyncio.gather(progress, return_exceptions=True)
+        if metrics is not None:
+            metrics.end_attempt()
+            if sink is not None:
+                sink.publish(metrics, force=True)
+
+
+async def terminate(proc: asyncio.subprocess.Process,
+                    timeout: Optional[float] = 5.0) -> None:
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,100 @@
+"""最小 FLV 解析/封裝，用於在 ffmpeg 管道之間逐 tag 轉發與改寫時間戳。"""
+
+from __future__ import annotations
+
+import asyncio
+import struct
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Iterator, List
+
+TAG_AUDIO = 8
+TAG_VIDEO = 9
+TAG_SCRIPT = 18
+
+# 'FLV', 版本 1, 音頻 + 視頻, 頭長 9；後接 PreviousTagSize0
+FILE_HEADER = b"FLV\x01\x05\x00\x00\x00\x09" + b"\x00\x00\x00\x00"
+
+
+class FlvError(Exception):
+    pass
+
+
+@dataclass
+class Tag:
+    type: int
+    timestamp: int   # 毫秒
+    data: bytes
+
+    @property
+    def is_keyframe(self) -> bool:
+        return self.type == TAG_VIDEO and bool(self.data) and self.data[0] >> 4 == 1
+
+    @property
+    def is_sequence_header(self) -> bool:
+        """AVC/HEVC 解碼配置或 AAC AudioSpecificConfig。"""
+        if len(self.data) < 2:
+            return False
+        if self.type == TAG_VIDEO:
+            return self.data[0] & 0x0F in (7, 12) and self.data[1] == 0
+        if self.type == TAG_AUDIO:
+            return self.data[0] >> 4 == 10 and self.data[1] == 0
+        return False
+
+    def encode(self, timestamp: int) -> bytes:
+        ts = timestamp & 0xFFFFFFFF
+        size = len(self.data)
+        head = struct.pack(">B", self.type) + size.to_bytes(3, "big") \
+            + (ts & 0xFFFFFF).to_bytes(3, "big") + bytes([ts >> 24]) + b"\x00\x00\x00"
+        return head + self.data + struct.pack(">I", size + 11)
+
+
+def _parse_tag_header(head: bytes) -> "tuple[int, int, int]":
+    tag_type = head[0] & 0x1F
+    size = int.from_bytes(head[1:4], "big")
+    ts = int.from_bytes(head[4:7], "big") | (head[7] << 24)
+    return tag_type, size, ts
+
+
+async def read_tags(reader: asyncio.StreamReader) -> AsyncIterator[Tag]:
+    """從異步流逐個讀取 tag；流結束時正常返回。"""
+    try:
+        header = await reader.readexactly(9)
+    except asyncio.IncompleteReadError:
+        return
+    if header[:3] != b"FLV":
+        raise FlvError("不是 FLV 流")
+    await reader.readexactly(int.from_bytes(header[5:9], "big") - 9 + 4)
+    while True:
+        try:
+            head = await reader.readexactly(11)
+        except asyncio.IncompleteReadError:
+            return
+        tag_type, size, ts = _parse_tag_header(head)
+        try:
+            data = await reader.readexactly(size)
+            await reader.readexactly(4)
+        except asyncio.IncompleteReadError:
+            return
+        yield Tag(tag_type, ts, data)
+
+
+def iter_file_tags(fp: BinaryIO) -> Iterator[Tag]:
+    header = fp.read(9)
+    if header[:3] != b"FLV":
+        raise FlvError("不是 FLV 文件")
+    fp.read(int.from_bytes(header[5:9], "big") - 9 + 4)
+    while True:
+        head = fp.read(11)
+        if len(head) < 11:
+            return
+        tag_type, size, ts = _parse_tag_header(head)
+        data = fp.read(size)
+        fp.read(4)
+        if len(data) < size:
+            return
+        yield Tag(tag_type, ts, data)
+
+
+def load_file(path: str) -> List[Tag]:
+    with open(path, "rb") as fp:
+        return list(iter_file_tags(fp))
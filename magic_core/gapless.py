@@ -0,0 +1,346 @@
+"""斷流墊片轉播：源中斷時保持 RTMP 推流不斷開。
+
+兩級結構::
+
+    ingest ffmpeg (源 -> FLV stdout) ──┐
+                                      ├─ Python 逐 tag 拼接/改寫時間戳 ─> output ffmpeg (FLV stdin -> RTMP)
+    預編碼墊片 slate.flv (循環) ───────┘
+
+output ffmpeg 在整個任務期間只建立一次 RTMP 連接。源卡住或退出時立即
+切換到墊片 (黑屏/靜態圖 + 靜音)，同時後台重連源；新源出現第一個關鍵幀
+後無縫切回。所有 tag 的輸出時間戳保持單調遞增，播放端不會因時間戳
+回退而斷流。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional
+
+from . import ffmpeg
+from .flv import FILE_HEADER, TAG_AUDIO, TAG_SCRIPT, TAG_VIDEO, FlvError, Tag, load_file, read_tags
+from .probe import ProbeEngine
+from .scheduler import Lease
+from .telemetry import MetricsSink, StreamMetrics, read_progress, with_progress
+
+log = logging.getLogger("magic_core.gapless")
+
+FRAME_MS = 33          # 段與段之間留出的時間戳間隔
+SLATE_LEAD = 0.3       # 墊片允許超前實時的秒數 (填充下游緩衝)
+SLATE_SECONDS = 2
+
+
+class Splicer:
+    """把多段 FLV 拼成每路 (音頻/視頻) 時間戳單調遞增的一條輸出流。"""
+
+    def __init__(self) -> None:
+        self.last: Dict[int, int] = {TAG_AUDIO: -1, TAG_VIDEO: -1}
+        self._base = 0
+        self._first: Optional[int] = None
+
+    def begin_segment(self) -> None:
+        head = max(self.last.values())
+        self._base = head + FRAME_MS if head >= 0 else 0
+        self._first = None
+
+    def map(self, tag: Tag) -> int:
+        if tag.is_sequence_header and self._first is None:
+            out = self._base
+        else:
+            if self._first is None:
+                self._first = tag.timestamp
+            out = self._base + tag.timestamp - self._first
+        out = max(out, self.last.get(tag.type, -1))
+        if tag.type in self.last:
+            self.last[tag.type] = out
+        return out
+
+
+@dataclass
+class GapStats:
+    gaps: int = 0
+    total_gap: float = 0.0
+    last_gap: float = 0.0
+    last_resume_latency: float = 0.0   # 探測到源恢復 -> 切回源畫面的耗時
+    output_restarts: int = 0
+
+
+@dataclass
+class _Ingest:
+    proc: asyncio.subprocess.Process
+    tags: AsyncIterator[Tag]
+    headers: Dict[int, Tag]
+    pending: List[Tag]
+    live_at: float   # 探針確認源在線的時刻
+    stderr_log: "asyncio.Task[None]"
+
+
+async def ensure_slate(path: Path, *, ffmpeg_bin: str = "ffmpeg", size: str = "1280x720",
+                       image: Optional[Path] = None) -> Path:
+    """生成 (或復用) 墊片：H.264 + AAC 靜音，每秒一個關鍵幀，可無縫循環。"""
+    path = Path(path)
+    if path.is_file() and path.stat().st_size > 0:
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    w, h = size.split("x")
+    if image is not None:
+        video_in = ["-loop", "1", "-framerate", "30", "-i", str(image)]
+    else:
+        video_in = ["-f", "lavfi", "-i", f"color=c=black:s={size}:r=30"]
+    tmp = path.with_suffix(".tmp")
+    cmd = [
+        ffmpeg_bin, "-y", "-hide_banner", "-loglevel", "error",
+        *video_in,
+        "-f", "lavfi", "-i", "anullsrc=r=44100:cl=stereo",
+        "-t", str(SLATE_SECONDS),
+        "-vf", f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2",
+        "-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage", "-pix_fmt", "yuv420p",
+        "-r", "30", "-g", "30", "-keyint_min", "30", "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", "128k", "-ar", "44100",
+        "-f", "flv", str(tmp),
+    ]
+    rc = await ffmpeg.run(cmd, name="slate")
+    if rc != 0:
+        raise RuntimeError(f"墊片生成失敗 (ffmpeg 退出碼 {rc})")
+    os.replace(tmp, path)
+    return path
+
+
+class GaplessRelay:
+    def __init__(self, source_url: str, target: str, slate: List[Tag], *,
+                 probes: ProbeEngine, ffmpeg_bin: str = "ffmpeg",
+                 stall_timeout: float = 5.0, name: str = "gapless",
+                 metrics: Optional[StreamMetrics] = None,
+                 sink: Optional[MetricsSink] = None,
+                 lease: Optional[Lease] = None) -> None:
+        self.source_url = source_url
+        self.lease = lease   # 非空時拉流轉碼並綁定到租約核心
+        self.target = target
+        self.slate = [t for t in slate if t.type != TAG_SCRIPT]
+        self.probes = probes
+        self.ffmpeg_bin = ffmpeg_bin
+        self.stall_timeout = stall_timeout   # 源無數據或輸出寫入阻塞超過此秒數視為中斷
+        self.name = name
+        self.metrics = metrics
+        self.sink = sink
+        self.stats = GapStats()
+        self.on_source = False
+        self._splicer = Splicer()
+        self._out: Optional[asyncio.subprocess.Process] = None
+        self._out_log: Optional["asyncio.Task[None]"] = None
+        self._out_progress: Optional["asyncio.Task[None]"] = None
+        self._sent_headers: Dict[int, Tag] = {}
+        self._synced = True   # False: 輸出級剛重建，等待關鍵幀
+
+    @classmethod
+    def from_slate_file(cls, source_url: str, target: str, slate_path: Path,
+                        **kwargs) -> "GaplessRelay":
+        return cls(source_url, target, load_file(str(slate_path)), **kwargs)
+
+    # ---------------- 輸出級 ----------------
+
+    async def _start_output(self) -> None:
+        cmd = ffmpeg.push_command(self.target, ffmpeg=self.ffmpeg_bin)
+        if self.metrics is not None:
+            cmd = with_progress(cmd)
+            self.metrics.begin_attempt()
+        self._out = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE if self.metrics is not None else asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        loop = asyncio.get_running_loop()
+        self._out_log = loop.create_task(ffmpeg.log_stderr(self._out, f"{self.name}/out"))
+        if self.metrics is not None:
+            assert self._out.stdout is not None
+            self._out_progress = loop.create_task(
+                read_progress(self._out.stdout, self.metrics, self.sink))
+        assert self._out.stdin is not None
+        self._out.stdin.write(FILE_HEADER)
+
+    async def _stop_output(self) -> None:
+        if self._out is None:
+            return
+        if self._out.stdin is not None:
+            self._out.stdin.close()
+        await ffmpeg.terminate(self._out)
+        for task in (self._out_log, self._out_progress):
+            if task is not None:
+                await asyncio.gather(task, return_exceptions=True)
+        if self.metrics is not None:
+            self.metrics.end_attempt()
+            if self.sink is not None:
+                self.sink.publish(self.metrics, force=True)
+        self._out = None
+
+    async def _write(self, tag: Tag, ts: int) -> None:
+        if tag.is_sequence_header:
+            self._sent_headers[tag.type] = tag
+        elif not self._synced:
+            # 新的 RTMP 會話必須從關鍵幀開始，之前的幀丟棄
+            if not tag.is_keyframe:
+                return
+            self._synced = True
+        while True:
+            assert self._out is not None and self._out.stdin is not None
+            try:
+                self._out.stdin.write(tag.encode(ts))
+                await asyncio.wait_for(self._out.stdin.drain(), self.stall_timeout)
+                return
+            except (BrokenPipeError, ConnectionResetError, asyncio.TimeoutError) as exc:
+                # RTMP 被服務端斷開或對端不再讀取：重建輸出級，補發解碼配置後繼續
+                if isinstance(exc, asyncio.TimeoutError):
+                    log.warning("[%s] 輸出 %.0f 秒無法寫入，2 秒後重建", self.name, self.stall_timeout)
+                else:
+                    log.warning("[%s] 輸出連接中斷，2 秒後重建", self.name)
+                self.stats.output_restarts += 1
+                await self._stop_output()
+                await asyncio.sleep(2)
+                await self._start_output()
+                for header in self._sent_headers.values():
+                    if header is not tag:
+                        self._out.stdin.write(header.encode(ts))
+                if not (tag.is_sequence_header or tag.is_keyframe):
+                    self._synced = False
+                    return
+
+    # ---------------- 輸入級 ----------------
+
+    async def _open_source(self) -> _Ingest:
+        """重連源直至拿到解碼配置與第一個視頻關鍵幀。"""
+        while True:
+            await self.probes.wait_live(self.source_url)
+            live_at = time.monotonic()
+            threads = self.lease.threads if self.lease is not None else 0
+            cmd = [
+                self.ffmpeg_bin, "-hide_banner", "-loglevel", "error",
+                *ffmpeg.input_args(self.source_url, threads=threads),
+                *ffmpeg.codec_args(threads), "-f", "flv", "pipe:1",
+            ]
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+            )
+            if self.lease is not None:
+                self.lease.pin(proc.pid)
+            stderr_log = asyncio.get_running_loop().create_task(
+                ffmpeg.log_stderr(proc, f"{self.name}/in"))
+            assert proc.stdout is not None
+            tags = read_tags(proc.stdout).__aiter__()
+            headers: Dict[int, Tag] = {}
+            try:
+                while True:
+                    tag = await asyncio.wait_for(tags.__anext__(), self.stall_timeout)
+                    if tag.is_sequence_header:
+                        headers[tag.type] = tag
+                    elif tag.is_keyframe and TAG_VIDEO in headers:
+                        return _Ingest(proc, tags, headers, [tag], live_at, stderr_log)
+            except (StopAsyncIteration, asyncio.TimeoutError, FlvError):
+                await ffmpeg.terminate(proc)
+                await asyncio.gather(stderr_log, return_exceptions=True)
+                await asyncio.sleep(1)
+            except BaseException:
+                await ffmpeg.terminate(proc)
+                await asyncio.gather(stderr_log, return_exceptions=True)
+                raise
+
+    async def _pump(self, ingest: _Ingest) -> None:
+        """轉發源數據，直至源結束或超過 stall_timeout 無數據。"""
+        try:
+            for tag in ingest.pending:
+                await self._write(tag, self._splicer.map(tag))
+            while True:
+                try:
+                    tag = await asyncio.wait_for(ingest.tags.__anext__(), self.stall_timeout)
+                except (StopAsyncIteration, asyncio.TimeoutError, FlvError):
+                    return
+                if tag.type == TAG_SCRIPT:
+                    continue
+                await self._write(tag, self._splicer.map(tag))
+        finally:
+            await ffmpeg.terminate(ingest.proc)
+            await asyncio.gather(ingest.stderr_log, return_exceptions=True)
+
+    # ---------------- 墊片 ----------------
+
+    async def _play_slate(self, opener: "asyncio.Task[_Ingest]",
+                          max_gap: Optional[float]) -> Optional[_Ingest]:
+        gap_start = time.monotonic()
+        self._splicer.begin_segment()
+        for tag in self.slate:
+            if tag.is_sequence_header:
+                await self._write(tag, self._splicer.map(tag))
+        wall0 = time.monotonic()
+        ts0: Optional[int] = None
+        idx = 0
+        while not opener.done():
+            if max_gap is not None and time.monotonic() - gap_start > max_gap:
+                opener.cancel()
+                await asyncio.gather(opener, return_exceptions=True)
+                return None
+            if idx == len(self.slate):
+                idx = 0
+                self._splicer.begin_segment()
+            tag = self.slate[idx]
+            idx += 1
+            if tag.is_sequence_header:
+                continue
+            ts = self._splicer.map(tag)
+            if ts0 is None:
+                ts0 = ts
+            delay = wall0 + (ts - ts0) / 1000 - SLATE_LEAD - time.monotonic()
+            if delay > 0:
+                await asyncio.wait({opener}, timeout=delay)
+                if opener.done():
+                    break
+            await self._write(tag, ts)
+
+        ingest = opener.result()
+        now = time.monotonic()
+        if self.stats.gaps:
+            self.stats.last_gap = now - gap_start
+            self.stats.total_gap += self.stats.last_gap
+        self.stats.last_resume_latency = now - ingest.live_at
+        return ingest
+
+    # ---------------- 主循環 ----------------
+
+    async def run(self, max_gap: Optional[float] = None) -> None:
+        """持續推流；源中斷超過 ``max_gap`` 秒後返回 (None 表示永不放棄)。"""
+        await self._start_output()
+        try:
+            while True:
+                opener = asyncio.get_running_loop().create_task(self._open_source())
+                try:
+                    ingest = await self._play_slate(opener, max_gap)
+                except BaseException:
+                    opener.cancel()
+                    await asyncio.gather(opener, return_exceptions=True)
+                    raise
+                if ingest is None:
+                    log.info("[%s] 源中斷超過 %s 秒，停止推流", self.name, max_gap)
+                    return
+                if self.stats.gaps:
+                    log.info("[%s] 源已恢復，缺口 %.1f 秒，切回耗時 %.0f 毫秒", self.name,
+                             self.stats.last_gap, self.stats.last_resume_latency * 1000)
+                self.on_source = True
+                self._splicer.begin_segment()
+                for header in ingest.headers.values():
+                    await self._write(header, self._splicer.map(header))
+                await self._pump(ingest)
+                self.on_source = False
+                self.stats.gaps += 1
+                log.info("[%s] 源中斷，切換到墊片並重連...", self.name)
+        finally:
+            await self._stop_output()
+
+    def status(self) -> Dict[str, object]:
+        info: Dict[str, object] = asdict(self.stats)
+        info["on_source"] = self.on_source
+        return info
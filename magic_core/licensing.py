@@ -0,0 +1,195 @@
+"""授權狀態緩存。
+
+加密內核的 ``--check-license`` 每次都要加載整套依賴並訪問 GitHub Gist，
+GitHub 慢或不可達時調用方會一直卡住。這裡把結果緩存到
+``run/license.json``：
+
+* 緩存未過期 (TTL) -> 直接返回，不啟動內核；
+* 過期但仍在寬限期內 -> 先按已授權返回，同時在後台刷新；
+* 超過寬限期或從未授權 -> 同步校驗。內核報告未授權時再確認一次網絡，
+  網絡不通視為「無法校驗」而不是「未授權」，不會覆蓋已有緩存。
+
+網絡可達時內核也可能因 Gist 5xx、限流等報告未授權，所以被拒的結果
+只記錄時間 (denied_at)，不覆蓋上次通過的校驗；此後不再走緩存與寬限期，
+每次都同步重新校驗，直至再次通過。管理員開通或恢復後下一次調用即生效。
+
+緩存綁定本機 (machine-id 指紋)，且不接受未來時間，複製或篡改的緩存
+一律作廢。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from .paths import INSTALL_DIR, RUN_DIR
+
+log = logging.getLogger("magic_core.licensing")
+
+KERNEL = INSTALL_DIR / "magic_autostream.py"
+LICENSE_FILE = RUN_DIR / "license.json"
+TTL = 6 * 3600           # 緩存有效期
+GRACE = 72 * 3600        # 授權服務器不可達時沿用上次結果的最長時間
+CHECK_TIMEOUT = 30.0
+LICENSE_HOSTS = ("gist.githubusercontent.com", "api.github.com")
+CLOCK_SKEW = 300.0       # 容忍的時鐘回撥
+
+
+@dataclass
+class LicenseState:
+    ok: bool
+    machine_id: str = ""
+    checked_at: float = 0.0   # 最近一次成功完成校驗的時間
+    source: str = "fresh"     # fresh / cache / grace / offline
+    denied_at: float = 0.0    # 最近一次被拒的時間 (不覆蓋上次通過的結果)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.checked_at
+
+    @property
+    def trusted(self) -> bool:
+        """上次通過之後沒有再被拒，可以走緩存與寬限期。"""
+        return self.ok and self.denied_at < self.checked_at
+
+
+def _host_id() -> str:
+    """本機指紋；緩存文件被複製到其他機器後作廢。"""
+    for name in ("/etc/machine-id", "/var/lib/dbus/machine-id"):
+        try:
+            value = Path(name).read_text(encoding="utf-8").strip()
+        except OSError:
+            continue
+        if value:
+            break
+    else:
+        value = socket.gethostname()
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()[:16]
+
+
+def load(path: Path = LICENSE_FILE) -> Optional[LicenseState]:
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        state = LicenseState(bool(data["ok"]), str(data.get("machine_id", "")),
+                             float(data["checked_at"]), "cache", float(data.get("denied_at", 0.0)))
+        host = data.get("host")
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    latest = time.time() + CLOCK_SKEW
+    if host != _host_id() or state.checked_at > latest or state.denied_at > latest:
+        return None
+    return state
+
+
+def save(state: LicenseState, path: Path = LICENSE_FILE) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    data = asdict(state)
+    data.pop("source")
+    data["host"] = _host_id()
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _reachable(timeout: float = 5.0) -> bool:
+    for host in LICENSE_HOSTS:
+        try:
+            socket.create_connection((host, 443), timeout).close()
+            return True
+        except OSError:
+            continue
+    return False
+
+
+def check_now(timeout: float = CHECK_TIMEOUT) -> LicenseState:
+    """運行內核校驗。結果不可信 (超時、網絡不通) 時 source 為 offline。"""
+    try:
+        proc = subprocess.run([sys.executable, str(KERNEL), "--check-license"],
+                              stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, cwd=str(INSTALL_DIR), timeout=timeout)
+    except subprocess.TimeoutExpired:
+        log.warning("授權校驗超時 (%.0f 秒)", timeout)
+        return LicenseState(False, source="offline")
+    except OSError as exc:
+        log.warning("無法啟動授權校驗: %s", exc)
+        return LicenseState(False, source="offline")
+    lines = proc.stdout.decode("utf-8", "replace").split()
+    state = LicenseState(proc.returncode == 0, lines[-1] if lines else "", time.time())
+    if not state.ok and not _reachable():
+        state.source, state.checked_at = "offline", 0.0
+    return state
+
+
+def refresh(path: Path = LICENSE_FILE, timeout: float = CHECK_TIMEOUT) -> LicenseState:
+    """同步校驗；通過的結果寫入緩存，被拒只記錄時間。"""
+    state = check_now(timeout)
+    if state.source != "fresh":
+        return state
+    if state.ok:
+        save(state, path)
+    else:
+        record = load(path) or LicenseState(False, state.machine_id)
+        record.denied_at = state.checked_at
+        save(record, path)
+    return state
+
+
+def spawn_refresh(path: Path = LICENSE_FILE) -> None:
+    """在獨立進程中刷新緩存，調用方立即返回；多個調用方同時觸發只運行一次。"""
+    lock = Path(path).with_name(f".{Path(path).name}.refreshing")
+    try:
+        if time.time() - lock.stat().st_mtime < CHECK_TIMEOUT * 2:
+            return
+        lock.unlink()
+    except OSError:
+        pass
+    try:
+        os.close(os.open(str(lock), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except OSError:
+        return
+    subprocess.Popen(
+        [sys.executable, "-m", "magic_core", "license", "--refresh", "--lock", str(lock)],
+        cwd=str(INSTALL_DIR), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+
+
+def get(path: Path = LICENSE_FILE, *, ttl: float = TTL, grace: float = GRACE) -> LicenseState:
+    cached = load(path)
+    if cached is not None and cached.trusted:
+        if cached.age < ttl:
+            return cached
+        if cached.age < grace:
+            spawn_refresh(path)
+            cached.source = "grace"
+            return cached
+    state = refresh(path)
+    if state.source == "offline" and cached is not None:
+        state.machine_id = state.machine_id or cached.machine_id
+        state.checked_at = cached.checked_at
+    return state
+
+
+async def keep_fresh(path: Path = LICENSE_FILE, interval: float = TTL / 2) -> None:
+    """常駐進程用：定期在後台刷新，使其他命令總能命中緩存。"""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        state = await loop.run_in_executor(None, refresh, path)
+        cached = load(path)
+        if state.source == "offline" and cached is not None:
+            log.warning("授權服務器不可達，沿用 %.1f 小時前的校驗結果", cached.age / 3600)
+        elif not state.ok:
+            log.warning("授權已失效，現有任務繼續運行，新啟動將被拒絕")
@@ -0,0 +1,8 @@
+"""編碼模式常量。
+
+命令行入口構建參數時就要用到；單獨成模塊，避免為幾個常量導入調度器與 asyncio。
+"""
+
+COPY = "copy"
+TRANSCODE = "transcode"
+MODES = ("auto", COPY, TRANSCODE)
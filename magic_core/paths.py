@@ -0,0 +1,10 @@
+"""安裝目錄佈局 (與 magic_stream.sh 保持一致)。"""
+
+from pathlib import Path
+
+INSTALL_DIR = Path(__file__).resolve().parent.parent
+AUTH_DIR = INSTALL_DIR / "youtube_auth"
+RUN_DIR = INSTALL_DIR / "run"
+VOD_DIR = INSTALL_DIR / "vod"
+METRICS_DIR = RUN_DIR / "metrics"
+SCHED_DIR = RUN_DIR / "sched"
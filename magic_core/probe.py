@@ -0,0 +1,371 @@
+"""直播源探針引擎。
+
+HTTP(S) 源使用長連接池 + HEAD / 小範圍 GET 探測，不再為每次探測拉起
+ffprobe；單進程可並發探測數百個源。離線期間按帶抖動的指數退避放緩
+輪詢，一旦源狀態出現變化 (例如 HLS 清單已生成但尚無分片) 立即恢復
+快速輪詢，縮短開播到轉播的延遲。
+
+非 HTTP 源 (rtmp:// 等) 仍回退到 ffprobe。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import ssl
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from .ffmpeg import REFERER, USER_AGENT, network_args
+
+log = logging.getLogger("magic_core.probe")
+
+LIVE = "live"
+WARMING = "warming"   # 源已有響應但尚未出畫面，應快速輪詢
+OFFLINE = "offline"
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 5
+MANIFEST_LIMIT = 256 * 1024
+SNIFF_LIMIT = 1024
+
+
+@dataclass
+class ProbeResult:
+    state: str
+    status: int = 0
+    detail: str = ""
+    latency: float = 0.0
+
+    @property
+    def signature(self) -> Tuple[int, str]:
+        """離線狀態指紋；指紋變化說明源端有動靜。"""
+        return (self.status, self.detail)
+
+
+class Backoff:
+    """帶抖動的指數退避：第 n 次等待 ``uniform(base, min(cap, base*factor**n))``。"""
+
+    def __init__(self, base: float = 2.0, cap: float = 60.0, factor: float = 2.0,
+                 rng: Optional[random.Random] = None) -> None:
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self._rng = rng or random.Random()
+        self._attempt = 0
+
+    def reset(self) -> None:
+        self._attempt = 0
+
+    def next(self) -> float:
+        self._attempt += 1
+        ceiling = min(self.cap, self.base * self.factor ** self._attempt)
+        return self._rng.uniform(self.base, max(self.base, ceiling))
+
+
+# ---------------- HTTP 長連接池 ----------------
+
+_PoolKey = Tuple[str, str, int]
+
+
+@dataclass
+class _Conn:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    idle_since: float = field(default_factory=time.monotonic)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class ConnectionPool:
+    """按 (scheme, host, port) 複用的 HTTP/1.1 keep-alive 連接池。
+
+    同一主機最多 ``max_per_host`` 條並發連接，其餘請求排隊等待複用，
+    避免數百個探測同時對同一 CDN 建連。
+    """
+
+    def __init__(self, *, max_per_host: int = 8, idle_timeout: float = 30.0,
+                 connect_timeout: float = 10.0) -> None:
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self._idle: Dict[_PoolKey, List[_Conn]] = {}
+        self._slots: Dict[_PoolKey, asyncio.Semaphore] = {}
+        self._ssl = ssl.create_default_context()
+        self.opened = 0
+
+    async def acquire(self, key: _PoolKey) -> Tuple[_Conn, bool]:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = asyncio.Semaphore(self.max_per_host)
+        await slot.acquire()
+        try:
+            return await self._checkout(key)
+        except BaseException:
+            slot.release()
+            raise
+
+    async def _checkout(self, key: _PoolKey) -> Tuple[_Conn, bool]:
+        idle = self._idle.get(key, [])
+        now = time.monotonic()
+        while idle:
+            conn = idle.pop()
+            if now - conn.idle_since < self.idle_timeout and not conn.reader.at_eof():
+                return conn, True
+            conn.close()
+        scheme, host, port = key
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port,
+                ssl=self._ssl if scheme == "https" else None,
+                server_hostname=host if scheme == "https" else None,
+            ),
+            self.connect_timeout,
+        )
+        self.opened += 1
+        return _Conn(reader, writer), False
+
+    def release(self, key: _PoolKey, conn: _Conn, reusable: bool) -> None:
+        if reusable:
+            conn.idle_since = time.monotonic()
+            self._idle.setdefault(key, []).append(conn)
+        else:
+            conn.close()
+        self._slots[key].release()
+
+    def close(self) -> None:
+        for idle in self._idle.values():
+            for conn in idle:
+                conn.close()
+        self._idle.clear()
+
+
+@dataclass
+class _Response:
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    url: str
+
+
+class _StaleConnection(Exception):
+    pass
+
+
+async def _read_response(reader: asyncio.StreamReader, method: str,
+                         body_limit: int) -> Tuple[int, Dict[str, str], bytes, bool]:
+    """解析一個 HTTP/1.1 響應；返回 (狀態碼, 頭部, 正文, 連接可否複用)。"""
+    line = await reader.readline()
+    if not line:
+        raise _StaleConnection()
+    parts = line.decode("latin-1").split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+        raise ValueError(f"無效 HTTP 響應: {line[:80]!r}")
+    status = int(parts[1])
+    headers: Dict[str, str] = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+
+    reusable = headers.get("connection", "").lower() != "close" and parts[0] != "HTTP/1.0"
+    if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+        return status, headers, b"", reusable
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = bytearray()
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                await reader.readline()
+                break
+            if len(body) + size > body_limit:
+                body += await reader.read(body_limit - len(body))
+                return status, headers, bytes(body), False
+            body += await reader.readexactly(size)
+            await reader.readline()
+        return status, headers, bytes(body), reusable
+
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        if length <= body_limit:
+            return status, headers, await reader.readexactly(length), reusable
+        return status, headers, await reader.read(body_limit), False
+
+    # 無長度的直播流 (FLV 常見)：嗅探開頭即斷開
+    return status, headers, await reader.read(body_limit), False
+
+
+# ---------------- 探針引擎 ----------------
+
+class ProbeEngine:
+    def __init__(self, *, concurrency: int = 256, timeout: float = 10.0,
+                 pool: Optional[ConnectionPool] = None,
+                 headers: Optional[Dict[str, str]] = None,
+                 backoff_base: float = 2.0, backoff_cap: float = 60.0,
+                 ffprobe: str = "ffprobe") -> None:
+        self.pool = pool or ConnectionPool()
+        self.timeout = timeout
+        self.headers = headers if headers is not None else {
+            "User-Agent": USER_AGENT,
+            "Referer": REFERER,
+            "Accept": "*/*",
+        }
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.ffprobe = ffprobe
+        self._sem = asyncio.Semaphore(concurrency)
+
+    # ---------- HTTP ----------
+
+    async def _request_once(self, method: str, url: str, extra: Dict[str, str],
+                            body_limit: int) -> _Response:
+        u = urlsplit(url)
+        scheme = u.scheme.lower()
+        port = u.port or (443 if scheme == "https" else 80)
+        key = (scheme, u.hostname or "", port)
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        host = u.hostname or ""
+        if u.port:
+            host = f"{host}:{u.port}"
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+        lines += [f"{k}: {v}" for k, v in {**self.headers, **extra}.items()]
+        payload = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        for attempt in (0, 1):
+            conn, reused = await self.pool.acquire(key)
+            try:
+                conn.writer.write(payload)
+                await conn.writer.drain()
+                status, headers, body, reusable = await _read_response(conn.reader, method, body_limit)
+            except (_StaleConnection, ConnectionError, asyncio.IncompleteReadError):
+                self.pool.release(key, conn, False)
+                if reused and attempt == 0:
+                    continue   # 池中連接已被服務端關閉，換新連接重試一次
+                raise ConnectionError("連接被關閉")
+            except BaseException:
+                self.pool.release(key, conn, False)
+                raise
+            self.pool.release(key, conn, reusable)
+            return _Response(status, headers, body, url)
+        raise AssertionError("unreachable")
+
+    async def _request(self, method: str, url: str, *, extra: Optional[Dict[str, str]] = None,
+                       body_limit: int = 0) -> _Response:
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = await self._request_once(method, url, extra or {}, body_limit)
+            if resp.status in REDIRECT_CODES and "location" in resp.headers:
+                url = urljoin(url, resp.headers["location"])
+                continue
+            return resp
+        raise ConnectionError("重定向次數過多")
+
+    async def _probe_hls(self, url: str) -> ProbeResult:
+        resp = await self._request("GET", url, body_limit=MANIFEST_LIMIT)
+        if not 200 <= resp.status < 300:
+            return ProbeResult(OFFLINE, resp.status)
+        text = resp.body.decode("utf-8", "replace")
+        if "#EXT-X-STREAM-INF" in text:
+            # 主清單：檢查第一個子清單是否已有分片
+            for ln in text.splitlines():
+                if ln and not ln.startswith("#"):
+                    sub = await self._request("GET", urljoin(resp.url, ln.strip()),
+                                              body_limit=MANIFEST_LIMIT)
+                    if 200 <= sub.status < 300:
+                        text = sub.body.decode("utf-8", "replace")
+                    break
+        if "#EXTINF" in text:
+            return ProbeResult(LIVE, resp.status)
+        return ProbeResult(WARMING, resp.status, "empty-playlist")
+
+    async def _probe_stream(self, url: str) -> ProbeResult:
+        resp = await self._request("HEAD", url)
+        if resp.status in (405, 501) or resp.status == 403:
+            # 部分 CDN 拒絕 HEAD，改用 1KB 範圍 GET 嗅探
+            resp = await self._request("GET", url, extra={"Range": f"bytes=0-{SNIFF_LIMIT - 1}"},
+                                       body_limit=SNIFF_LIMIT)
+            if resp.status in (200, 206):
+                if resp.body:
+                    return ProbeResult(LIVE, resp.status)
+                return ProbeResult(WARMING, resp.status, "empty-body")
+            return ProbeResult(OFFLINE, resp.status)
+        if 200 <= resp.status < 300:
+            if resp.headers.get("content-length") == "0":
+                return ProbeResult(WARMING, resp.status, "empty-body")
+            return ProbeResult(LIVE, resp.status)
+        return ProbeResult(OFFLINE, resp.status)
+
+    # ---------- 公共接口 ----------
+
+    async def probe(self, url: str) -> ProbeResult:
+        started = time.monotonic()
+        async with self._sem:
+            scheme = urlsplit(url).scheme.lower()
+            try:
+                if scheme not in ("http", "https"):
+                    ok = await ffprobe_is_live(url, ffprobe=self.ffprobe)
+                    result = ProbeResult(LIVE if ok else OFFLINE, 0, "ffprobe")
+                elif ".m3u8" in urlsplit(url).path.lower():
+                    result = await asyncio.wait_for(self._probe_hls(url), self.timeout)
+                else:
+                    result = await asyncio.wait_for(self._probe_stream(url), self.timeout)
+            except asyncio.TimeoutError:
+                result = ProbeResult(OFFLINE, 0, "timeout")
+            except (OSError, ValueError) as exc:
+                result = ProbeResult(OFFLINE, 0, type(exc).__name__)
+        result.latency = time.monotonic() - started
+        return result
+
+    async def probe_many(self, urls: Iterable[str]) -> Dict[str, ProbeResult]:
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(self.probe(u) for u in urls))
+        return dict(zip(urls, results))
+
+    async def wait_live(self, url: str, *, timeout: Optional[float] = None) -> bool:
+        """輪詢直至源上線；``timeout`` 秒內未上線返回 False (None 表示無限等待)。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        backoff = Backoff(self.backoff_base, self.backoff_cap)
+        last: Optional[Tuple[int, str]] = None
+        while True:
+            result = await self.probe(url)
+            if result.state == LIVE:
+                return True
+            if result.state == WARMING or (last is not None and result.signature != last):
+                backoff.reset()
+            last = result.signature
+            delay = backoff.next()
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+            log.debug("%s: %s (%s %s)，%.1f 秒後重試", url, result.state, result.status, result.detail, delay)
+            await asyncio.sleep(delay)
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+async def ffprobe_is_live(source_url: str, *, ffprobe: str = "ffprobe",
+                          timeout: float = 20.0) -> bool:
+    """ffprobe 能打開源即視為在線 (非 HTTP 源的回退方案)。"""
+    proc = await asyncio.create_subprocess_exec(
+        ffprobe, "-v", "error", *network_args(),
+        "-show_entries", "format=format_name", "-of", "csv=p=0",
+        source_url,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        return await asyncio.wait_for(proc.wait(), timeout) == 0
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False
@@ -0,0 +1,124 @@
+"""單路轉播：流複製優先，源無法複製時經 CPU 調度器轉碼。
+
+開播前用 ffprobe 檢查源編碼 (如 HEVC、TS 內的非 AAC 音頻)；檢查不出
+問題但流複製連續快速退出、且 ffmpeg 報告時間戳/封裝錯誤時同樣改為轉碼。
+這種回退保持 FALLBACK_SECONDS 後重新嘗試流複製，避免在兩種模式之間
+來回切換，也不會因一時的壞數據永久佔用轉碼核心。
+
+推流失敗 (源仍在線但推流地址錯誤、平台拒絕等) 按指數退避重試，
+推流穩定運行 STABLE_SECONDS 後才重置退避。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from . import ffmpeg
+from .modes import TRANSCODE
+from .probe import Backoff, ProbeEngine
+from .scheduler import FALLBACK_SECONDS, FastFailCounter, Scheduler, choose_mode, is_copy_error
+from .telemetry import MetricsSink, StreamMetrics
+
+log = logging.getLogger("magic_core.relay")
+
+STABLE_SECONDS = 60    # 推流連續正常這麼久後重置退避
+
+
+class Relay:
+    def __init__(self, source_url: str, target: str, *, probes: ProbeEngine,
+                 scheduler: Scheduler, ffmpeg_bin: str = "ffmpeg", ffprobe_bin: str = "ffprobe",
+                 name: str = "relay", mode: str = "auto",
+                 metrics: Optional[StreamMetrics] = None,
+                 sink: Optional[MetricsSink] = None,
+                 refresh_target: Optional[Callable[[], Awaitable[str]]] = None) -> None:
+        self.source_url = source_url
+        self.target = target
+        self.probes = probes
+        self.scheduler = scheduler
+        self.ffmpeg_bin = ffmpeg_bin
+        self.ffprobe_bin = ffprobe_bin
+        self.name = name
+        self.requested = mode
+        self.mode: Optional[str] = None   # 實際採用的 copy / transcode
+        self.metrics = metrics
+        self.sink = sink
+        # 斷流重連前調用，返回 (可能已更換的) 推流地址；如校驗 YouTube 直播是否已被自動結束
+        self.refresh_target = refresh_target
+        self.state = "waiting"
+        self.fails = FastFailCounter()
+        self.uptime = 0.0      # 最近一次推流的運行時長
+        self._backoff = Backoff(base=2.0, cap=60.0)
+        self._fallback_until: Optional[float] = None
+
+    async def run_once(self) -> int:
+        """推流一次直至 ffmpeg 退出，返回退出碼。"""
+        if self._fallback_until is not None and time.monotonic() >= self._fallback_until:
+            log.info("[%s] 轉碼回退已滿 %.0f 分鐘，重新嘗試流複製", self.name, FALLBACK_SECONDS / 60)
+            self.mode = None
+            self._fallback_until = None
+        if self.mode is None:
+            self.mode = await choose_mode(self.source_url, self.requested,
+                                          ffprobe=self.ffprobe_bin, name=self.name)
+        transcode = self.mode == TRANSCODE
+        self.state = "queued"
+        lease = await self.scheduler.admit(self.name, transcode=transcode)
+        copy_error = False
+
+        def watch(line: str) -> None:
+            nonlocal copy_error
+            copy_error = copy_error or is_copy_error(line)
+
+        started = time.monotonic()
+        try:
+            self.state = "live"
+            if lease is not None:
+                log.info("[%s] 啟動推流 (轉碼，%d 線程，核心 %s)...", self.name, lease.threads,
+                         ",".join(str(c) for c in lease.cores))
+            else:
+                log.info("[%s] 啟動推流...", self.name)
+            cmd = ffmpeg.relay_command(self.source_url, self.target, ffmpeg=self.ffmpeg_bin,
+                                       threads=lease.threads if lease is not None else 0)
+            rc = await ffmpeg.run(cmd, name=self.name, metrics=self.metrics, sink=self.sink,
+                                  on_spawn=lease.pin if lease is not None else None,
+                                  on_stderr=watch)
+        finally:
+            self.uptime = time.monotonic() - started
+            if lease is not None:
+                self.scheduler.release(lease)
+        if (not transcode and self.requested == "auto"
+                and self.fails.record(rc, self.uptime, copy_error)):
+            log.warning("[%s] 流複製連續 %d 次在 %.0f 秒內因時間戳/封裝錯誤失敗，"
+                        "改用 libx264 轉碼 %.0f 分鐘", self.name, self.fails.limit,
+                        self.fails.seconds, FALLBACK_SECONDS / 60)
+            self.mode = TRANSCODE
+            self.fails.count = 0
+            self._fallback_until = time.monotonic() + FALLBACK_SECONDS
+        return rc
+
+    async def run(self, reconnect_timeout: Optional[float] = None) -> None:
+        """反覆推流，直至源中斷超過 ``reconnect_timeout`` 秒 (None 表示不限)。"""
+        while True:
+            rc = await self.run_once()
+            self.state = "reconnecting"
+            if self.uptime > STABLE_SECONDS:
+                self._backoff.reset()
+            delay = self._backoff.next()
+            if reconnect_timeout is not None:
+                delay = min(delay, reconnect_timeout)
+            log.info("[%s] 直播中斷 (ffmpeg 退出碼 %s)，%.0f 秒後重試%s", self.name, rc, delay,
+                     f"，{reconnect_timeout:.0f} 秒內未恢復則結束" if reconnect_timeout is not None else "")
+            await asyncio.sleep(delay)
+            timeout = None if reconnect_timeout is None else reconnect_timeout - delay
+            if not await self.probes.wait_live(self.source_url, timeout=timeout):
+                return
+            if self.refresh_target is not None:
+                try:
+                    self.target = await self.refresh_target()
+                except Exception as exc:
+                    log.warning("[%s] 校驗推流目標失敗，沿用原地址: %s", self.name, exc)
+
+    def status(self) -> Dict[str, object]:
+        return {"state": self.state, "mode": self.mode or "-"}
@@ -0,0 +1,354 @@
+"""CPU 調度：流複製優先，不可複製的源自動轉碼並按核心預算准入。
+
+流複製幾乎不耗 CPU，一台機器可以帶幾十路；一路 libx264 轉碼卻能吃滿
+數個核心。調度器在主機範圍內 (跨 screen 會話、跨進程) 協調：
+
+* 每路轉碼申請一份租約，獲得固定的線程數與一組獨佔核心，進程綁定到
+  這些核心並降低優先級；編號最小的核心保留給流複製與網絡 IO，轉碼
+  永遠不會佔用；
+* 空閒核心不足或實測 CPU 使用率超過 ADMIT_UTIL 時轉碼任務排隊；
+* 流複製任務只在 CPU 接近飽和時排隊，且有流複製在排隊時不再放行新的
+  轉碼，保證一路壞源拖不垮同機的其他轉播。
+
+租約記錄在 ``run/sched/`` 下，持有進程退出後自動失效，無需守護進程。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .ffmpeg import network_args
+from .modes import COPY, TRANSCODE
+from .paths import SCHED_DIR
+from .telemetry import pid_alive
+
+log = logging.getLogger("magic_core.scheduler")
+
+COPY_VIDEO = ("h264",)             # RTMP/FLV 可直接承載的編碼
+COPY_AUDIO = ("aac", "mp3")
+TRANSCODE_THREADS = 2              # 單路 720p30 veryfast 的線程預算
+TRANSCODE_NICE = 10
+ADMIT_UTIL = 0.85                  # 實測使用率高於此值時轉碼排隊
+COPY_ADMIT_UTIL = 0.95             # 流複製只在接近飽和時排隊
+FAST_FAIL_SECONDS = 20.0           # 流複製啟動後這麼快退出視為失敗
+FAST_FAIL_LIMIT = 3                # 連續快速失敗次數，達到後改為轉碼
+FALLBACK_SECONDS = 1800.0          # 因快速失敗改用轉碼後，這麼久再重新嘗試流複製
+MIN_SAMPLE_INTERVAL = 0.5
+
+
+# ---------------- 源編碼檢測 ----------------
+
+async def source_codecs(source_url: str, *, ffprobe: str = "ffprobe",
+                        timeout: float = 20.0) -> Optional[Tuple[str, str]]:
+    """返回源的 (視頻編碼, 音頻編碼)；探測失敗返回 None。"""
+    proc = await asyncio.create_subprocess_exec(
+        ffprobe, "-v", "error", *network_args(),
+        "-show_entries", "stream=codec_type,codec_name", "-of", "json",
+        source_url,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return None
+    if proc.returncode != 0:
+        return None
+    try:
+        streams = json.loads(out.decode("utf-8", "replace")).get("streams", [])
+    except ValueError:
+        return None
+    video = next((s.get("codec_name", "") for s in streams if s.get("codec_type") == "video"), "")
+    audio = next((s.get("codec_name", "") for s in streams if s.get("codec_type") == "audio"), "")
+    return video, audio
+
+
+def can_copy(codecs: Optional[Tuple[str, str]]) -> bool:
+    """無法判斷時按可複製處理，由快速失敗計數兜底。"""
+    if codecs is None:
+        return True
+    video, audio = codecs
+    return (not video or video in COPY_VIDEO) and (not audio or audio in COPY_AUDIO)
+
+
+async def choose_mode(source_url: str, mode: str = "auto", *,
+                      ffprobe: str = "ffprobe", name: str = "") -> str:
+    if mode != "auto":
+        return mode
+    codecs = await source_codecs(source_url, ffprobe=ffprobe)
+    if can_copy(codecs):
+        return COPY
+    assert codecs is not None
+    log.warning("[%s] 源編碼 %s/%s 無法直接複製到 FLV，改用 libx264 轉碼",
+                name, codecs[0] or "-", codecs[1] or "-")
+    return TRANSCODE
+
+
+# ffmpeg 流複製時報告的編碼/時間戳問題 (小寫匹配)；只有這類失敗轉碼才能解決
+COPY_ERRORS = (
+    "non-monotonous dts",
+    "non monotonically increasing dts",
+    "codec not currently supported in container",
+    "not compatible with flv",
+    "invalid dts",
+    "pts has no value",
+)
+
+
+def is_copy_error(line: str) -> bool:
+    line = line.lower()
+    return any(pattern in line for pattern in COPY_ERRORS)
+
+
+class FastFailCounter:
+    """流複製連續快速退出且報告編碼/時間戳錯誤時建議改為轉碼。
+
+    推流地址錯誤、平台拒絕、源短暫斷開等失敗與編碼無關，轉碼也救不了，
+    既不計數也不清零；只有穩定運行超過 ``seconds`` 才清零。
+    """
+
+    def __init__(self, seconds: float = FAST_FAIL_SECONDS, limit: int = FAST_FAIL_LIMIT) -> None:
+        self.seconds = seconds
+        self.limit = limit
+        self.count = 0
+
+    def record(self, rc: int, elapsed: float, copy_error: bool) -> bool:
+        if elapsed >= self.seconds:
+            self.count = 0
+        elif rc != 0 and copy_error:
+            self.count += 1
+        return self.count >= self.limit
+
+
+# ---------------- 負載測量 ----------------
+
+def _read_stat() -> Optional[Tuple[int, int]]:
+    """/proc/stat 匯總行的 (忙碌, 總計) jiffies。"""
+    try:
+        with open("/proc/stat", "rb") as f:
+            parts = [int(x) for x in f.readline().split()[1:9]]
+    except (OSError, ValueError):
+        return None
+    idle = parts[3] + parts[4]   # idle + iowait
+    return sum(parts) - idle, sum(parts)
+
+
+def host_cores() -> List[int]:
+    """本進程可用的核心編號 (尊重 cpuset / taskset 限制)。"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class CpuSampler:
+    """兩次採樣之間的主機 CPU 使用率 (0~1)；首次採樣前用 1 分鐘負載估算。"""
+
+    def __init__(self, ncores: int) -> None:
+        self.ncores = max(1, ncores)
+        self._prev = _read_stat()
+        self._prev_at = time.monotonic()
+        try:
+            self.util = min(1.0, os.getloadavg()[0] / self.ncores)
+        except OSError:
+            self.util = 0.0
+
+    def restart(self) -> None:
+        """從現在開始一個新的採樣窗口 (丟棄剛結束任務的負載)。"""
+        self._prev, self._prev_at = _read_stat(), time.monotonic()
+
+    def sample(self) -> float:
+        now = time.monotonic()
+        if now - self._prev_at < MIN_SAMPLE_INTERVAL:
+            return self.util
+        cur = _read_stat()
+        if cur is not None and self._prev is not None and cur[1] > self._prev[1]:
+            self.util = (cur[0] - self._prev[0]) / (cur[1] - self._prev[1])
+        elif cur is None:
+            try:
+                self.util = min(1.0, os.getloadavg()[0] / self.ncores)
+            except OSError:
+                pass
+        self._prev, self._prev_at = cur, now
+        return self.util
+
+
+# ---------------- 租約 ----------------
+
+@dataclass
+class Lease:
+    name: str
+    pid: int
+    cores: List[int]
+    threads: int
+    since: float = field(default_factory=time.time)
+    path: Optional[Path] = field(default=None, repr=False, compare=False)
+
+    def pin(self, pid: int) -> None:
+        """把 ffmpeg 的所有線程綁定到租約核心並降低優先級。"""
+        try:
+            tids = [int(t) for t in os.listdir(f"/proc/{pid}/task")]
+        except OSError:
+            tids = [pid]
+        for tid in tids:
+            try:
+                if hasattr(os, "sched_setaffinity"):
+                    os.sched_setaffinity(tid, self.cores)
+                # Linux 下 nice 值按線程生效
+                os.setpriority(os.PRIO_PROCESS, tid, TRANSCODE_NICE)
+            except OSError as exc:
+                log.debug("[%s] 設置 CPU 親和性失敗 (tid %s): %s", self.name, tid, exc)
+
+
+class Scheduler:
+    def __init__(self, directory: Path = SCHED_DIR, *, cores: Optional[List[int]] = None,
+                 reserved: Optional[int] = None, admit_util: float = ADMIT_UTIL,
+                 copy_admit_util: float = COPY_ADMIT_UTIL) -> None:
+        self.directory = Path(directory)
+        self.cores = cores or host_cores()
+        if reserved is None:
+            reserved = 1 if len(self.cores) >= 2 else 0
+        self.reserved = self.cores[:reserved]
+        # 單核機器無法保留，轉碼與流複製共用 (依靠 nice 與准入控制)
+        self.allocatable = self.cores[reserved:] or self.cores
+        self.admit_util = admit_util
+        self.copy_admit_util = copy_admit_util
+        self.sampler = CpuSampler(len(self.cores))
+        self._seq = 0
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / ".lock", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _entries(self, prefix: str) -> List[Tuple[Path, Dict[str, Any]]]:
+        """讀取記錄並清理持有進程已退出的條目 (需持鎖)。"""
+        out: List[Tuple[Path, Dict[str, Any]]] = []
+        for path in sorted(self.directory.glob(f"{prefix}_*.json")):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            if not pid_alive(int(data.get("pid", 0))):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                continue
+            out.append((path, data))
+        return out
+
+    def _new_path(self, prefix: str) -> Path:
+        self._seq += 1
+        return self.directory / f"{prefix}_{os.getpid()}_{self._seq}.json"
+
+    def leases(self) -> List[Lease]:
+        with self._locked():
+            return [Lease(d["name"], d["pid"], d["cores"], d["threads"], d.get("since", 0.0), p)
+                    for p, d in self._entries("lease")]
+
+    def try_admit(self, name: str, transcode: bool,
+                  threads: int = TRANSCODE_THREADS) -> Tuple[bool, Optional[Lease]]:
+        """立即判斷能否放行；放行轉碼時返回寫入的租約。"""
+        util = self.sampler.sample()
+        with self._locked():
+            if not transcode:
+                return util < self.copy_admit_util, None
+            if self._entries("wait"):
+                return False, None
+            if util >= self.admit_util:
+                return False, None
+            used = {c for _, d in self._entries("lease") for c in d.get("cores", [])}
+            free = [c for c in self.allocatable if c not in used]
+            need = max(1, min(threads, len(self.allocatable)))
+            if len(free) < need:
+                return False, None
+            lease = Lease(name, os.getpid(), free[:need], need, path=self._new_path("lease"))
+            data = asdict(lease)
+            data.pop("path")
+            assert lease.path is not None
+            lease.path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            return True, lease
+
+    async def admit(self, name: str, *, transcode: bool, threads: int = TRANSCODE_THREADS,
+                    poll: float = 5.0) -> Optional[Lease]:
+        """等待直至任務被放行。轉碼任務返回租約，用畢須 ``release``。"""
+        waiting: Optional[Path] = None
+        if transcode:
+            # 轉碼按當前負載准入：剛釋放的租約 (如連續轉碼文件) 不應計入
+            self.sampler.restart()
+            await asyncio.sleep(MIN_SAMPLE_INTERVAL)
+        try:
+            while True:
+                ok, lease = self.try_admit(name, transcode, threads)
+                if ok:
+                    if waiting is not None:
+                        log.info("[%s] 已獲准啟動", name)
+                    return lease
+                if waiting is None:
+                    log.info("[%s] 主機負載 %.0f%%，%s任務排隊中", name,
+                             self.sampler.util * 100, "轉碼" if transcode else "流複製")
+                    waiting = self._new_path("wait" if not transcode else "queue")
+                    waiting.write_text(json.dumps({"name": name, "pid": os.getpid()}),
+                                       encoding="utf-8")
+                await asyncio.sleep(poll + random.uniform(0, 1))
+        finally:
+            if waiting is not None:
+                try:
+                    waiting.unlink()
+                except OSError:
+                    pass
+
+    async def transcode_lease(self, source_url: str, mode: str = "auto", *,
+                              ffprobe: str = "ffprobe", name: str = "") -> Optional[Lease]:
+        """拉流前決定編碼模式：需要轉碼時排隊並返回租約，流複製返回 None。"""
+        if await choose_mode(source_url, mode, ffprobe=ffprobe, name=name) != TRANSCODE:
+            return None
+        return await self.admit(name, transcode=True)
+
+    def release(self, lease: Lease) -> None:
+        if lease.path is not None:
+            try:
+                lease.path.unlink()
+            except OSError:
+                pass
+
+    def status(self) -> Dict[str, Any]:
+        leases = self.leases()
+        with self._locked():
+            queued = len(self._entries("queue")) + len(self._entries("wait"))
+        return {
+            "cores": len(self.cores),
+            "reserved": self.reserved,
+            "util": round(self.sampler.sample(), 3),
+            "transcode_cores": sum(len(lease.cores) for lease in leases),
+            "allocatable": len(self.allocatable),
+            "queued": queued,
+            "leases": [{"name": lease.name, "pid": lease.pid, "cores": lease.cores}
+                       for lease in leases],
+        }
+
+
+def format_status(info: Dict[str, Any]) -> str:
+    line = (f"CPU: {info['cores']} 核 使用率 {info['util'] * 100:.0f}%  "
+            f"轉碼佔用 {info['transcode_cores']}/{info['allocatable']} 核  排隊 {info['queued']}")
+    rows = [line] + [f"  轉碼 {item['name']} (pid {item['pid']}) -> 核心 "
+                     f"{','.join(str(c) for c in item['cores'])}" for item in info["leases"]]
+    return "\n".join(rows)
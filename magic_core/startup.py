@@ -0,0 +1,112 @@
+"""``--startup-profile``：統計啟動各階段與導入的耗時。
+
+未啟用時 ``mark`` 為空操作，對正常運行沒有任何開銷。
+"""
+
+from __future__ import annotations
+
+import atexit
+import builtins
+import os
+import sys
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+TOP_IMPORTS = 8
+MIN_IMPORT_MS = 5.0
+
+
+def _process_age() -> Optional[float]:
+    """進程已運行的秒數 (Linux /proc)，用於計算解釋器自身的啟動耗時。"""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            start_ticks = int(f.read().rsplit(b")", 1)[1].split()[19])
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _label(text: str, width: int = 22) -> str:
+    used = sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+    return text + " " * max(1, width - used)
+
+
+class StartupProfile:
+    def __init__(self) -> None:
+        self.t0 = time.perf_counter()
+        self.before_main = _process_age()
+        self.marks: List[Tuple[str, float]] = []
+        self.imports: Dict[str, float] = {}
+        self.reported = False
+        self._local = threading.local()   # 各線程獨立的嵌套深度
+        self._orig_import = builtins.__import__
+
+    def install(self) -> None:
+        orig = self._orig_import
+
+        def timed_import(name: str, globals: Any = None, locals: Any = None,
+                         fromlist: Any = (), level: int = 0) -> Any:
+            if level == 0 and name in sys.modules:
+                return orig(name, globals, locals, fromlist, level)
+            # 只統計最外層導入，嵌套導入計入其頂層包
+            if level:
+                top = ((globals or {}).get("__package__") or name).partition(".")[0]
+            else:
+                top = name.partition(".")[0]
+            depth = getattr(self._local, "depth", 0)
+            self._local.depth = depth + 1
+            start = time.perf_counter()
+            try:
+                return orig(name, globals, locals, fromlist, level)
+            finally:
+                self._local.depth = depth
+                if depth == 0:
+                    self.imports[top] = self.imports.get(top, 0.0) + time.perf_counter() - start
+
+        builtins.__import__ = timed_import
+        atexit.register(self.report)
+
+    def mark(self, label: str) -> None:
+        self.marks.append((label, time.perf_counter()))
+
+    def report(self) -> None:
+        if self.reported:
+            return
+        self.reported = True
+        builtins.__import__ = self._orig_import
+        out = sys.stderr
+        if self.before_main is not None:
+            print(f"[啟動耗時] {_label('解釋器啟動及入口導入')}{self.before_main * 1000:8.1f} ms", file=out)
+        prev = self.t0
+        for label, t in self.marks:
+            print(f"[啟動耗時] {_label(label)}{(t - prev) * 1000:8.1f} ms", file=out)
+            prev = t
+        total = prev - self.t0 + (self.before_main or 0.0)
+        print(f"[啟動耗時] {_label('合計')}{total * 1000:8.1f} ms", file=out)
+        heavy = sorted(((v, k) for k, v in self.imports.items() if v * 1000 >= MIN_IMPORT_MS),
+                       reverse=True)[:TOP_IMPORTS]
+        for secs, name in heavy:
+            print(f"[啟動耗時] {_label('  導入 ' + name)}{secs * 1000:8.1f} ms", file=out)
+
+
+_profile: Optional[StartupProfile] = None
+
+
+def enable() -> None:
+    global _profile
+    if _profile is None:
+        _profile = StartupProfile()
+        _profile.install()
+
+
+def mark(label: str, *, final: bool = False) -> None:
+    """記錄一個階段的結束；``final`` 時立即輸出報告 (常駐進程就緒後不會退出)。"""
+    if _profile is None:
+        return
+    _profile.mark(label)
+    if final:
+        _profile.report()
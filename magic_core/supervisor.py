@@ -0,0 +1,283 @@
+"""常駐調度進程：一個 asyncio 事件循環承載全部自動轉播任務。
+
+每個任務只佔用一個 ffmpeg 子進程；YouTube 客戶端、憑證與 Python 解釋器
+全部共享。任務通過 Unix socket 以單行 JSON 命令動態增刪::
+
+    {"cmd": "add", "job": {"source_url": "...", "title": "...", ...}}
+    {"cmd": "remove", "id": "job_03"}
+    {"cmd": "list"}
+
+任務列表持久化到 ``state_file``，調度進程重啟後自動恢復；停止調度進程
+不會結束正在進行的直播，重啟後經由直播資源緩存原樣接回。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import signal
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from . import control, licensing, startup
+from .gapless import GaplessRelay, ensure_slate
+from .modes import COPY, MODES, TRANSCODE
+from .probe import ProbeEngine
+from .relay import Relay
+from .scheduler import Scheduler
+from .telemetry import MetricsSink, StreamMetrics
+from .youtube import PRIVACY_CHOICES, LiveSession, YouTubeClient
+
+log = logging.getLogger("magic_core.supervisor")
+
+
+@dataclass
+class JobSpec:
+    source_url: str
+    title: str = "Magic Stream Live"
+    privacy: str = "unlisted"
+    reconnect_seconds: int = 300
+    gapless: bool = False   # 斷流期間推送墊片，保持 YouTube 連接不斷
+    codec: str = "auto"     # auto: 可複製則流複製，否則轉碼；copy / transcode 強制
+    id: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "JobSpec":
+        known = {f.name for f in fields(cls)}
+        spec = cls(**{k: v for k, v in data.items() if k in known})
+        if not spec.source_url:
+            raise ValueError("缺少 source_url")
+        if spec.privacy not in PRIVACY_CHOICES:
+            raise ValueError(f"無效隱私狀態: {spec.privacy}")
+        if spec.codec not in MODES:
+            raise ValueError(f"無效編碼模式: {spec.codec}")
+        spec.reconnect_seconds = int(spec.reconnect_seconds)
+        spec.gapless = bool(spec.gapless)
+        return spec
+
+
+@dataclass
+class Job:
+    spec: JobSpec
+    state: str = "waiting"
+    session: Optional[LiveSession] = None
+    detached: bool = False   # True: 停止時保留 YouTube 直播 (調度進程重啟)
+    relay: Optional[GaplessRelay] = field(default=None, repr=False)
+    runner: Optional[Relay] = field(default=None, repr=False)
+    mode: Optional[str] = None
+    metrics: Optional[StreamMetrics] = field(default=None, repr=False)
+    task: Optional["asyncio.Task[None]"] = field(default=None, repr=False)
+
+    def status(self) -> Dict[str, Any]:
+        info = asdict(self.spec)
+        info["state"] = self.runner.state if self.runner is not None else self.state
+        info["mode"] = self.runner.mode if self.runner is not None else self.mode
+        info["broadcast_id"] = self.session.broadcast_id if self.session else None
+        if self.relay is not None:
+            info["gaps"] = self.relay.status()
+        if self.metrics is not None:
+            info["speed"] = self.metrics.speed
+            info["reconnects"] = self.metrics.reconnects
+        return info
+
+
+class Supervisor:
+    def __init__(self, auth_dir: Path, socket_path: Path, state_file: Path, *,
+                 ffmpeg_bin: str = "ffmpeg", ffprobe_bin: str = "ffprobe",
+                 probe_max_interval: float = 60.0,
+                 slate_image: Optional[Path] = None) -> None:
+        self.youtube = YouTubeClient(auth_dir)
+        self.socket_path = Path(socket_path)
+        self.state_file = Path(state_file)
+        self.ffmpeg_bin = ffmpeg_bin
+        self.ffprobe_bin = ffprobe_bin
+        self.slate_path = self.state_file.parent / "slate_1280x720.flv"
+        self.slate_image = slate_image
+        # 所有任務共用一個探針引擎 (連接池 + 並發上限)
+        self.probes = ProbeEngine(backoff_cap=probe_max_interval, ffprobe=ffprobe_bin)
+        self.sink = MetricsSink()
+        self.scheduler = Scheduler()
+        self.jobs: Dict[str, Job] = {}
+        self._stopping = asyncio.Event()
+
+    # ---------------- 任務管理 ----------------
+
+    def _next_id(self) -> str:
+        used = {int(i.rsplit("_", 1)[-1]) for i in self.jobs if i.rsplit("_", 1)[-1].isdigit()}
+        n = 1
+        while n in used:
+            n += 1
+        return f"job_{n:02d}"
+
+    def add(self, spec: JobSpec) -> Job:
+        if not spec.id or spec.id in self.jobs:
+            spec.id = self._next_id()
+        job = Job(spec, metrics=StreamMetrics(f"ms_daemon.{spec.id}", kind="auto"))
+        self.jobs[spec.id] = job
+        job.task = asyncio.get_running_loop().create_task(self._run_job(job))
+        log.info("[%s] 任務已加入: %s", spec.id, spec.source_url)
+        self._save()
+        return job
+
+    async def remove(self, job_id: str) -> bool:
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return False
+        self._save()
+        if job.task is not None:
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        if job.metrics is not None:
+            self.sink.remove(job.metrics)
+        log.info("[%s] 任務已移除", job_id)
+        return True
+
+    def _save(self) -> None:
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps([asdict(j.spec) for j in self.jobs.values()], ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.state_file)
+
+    def _restore(self) -> None:
+        if not self.state_file.is_file():
+            return
+        for item in json.loads(self.state_file.read_text(encoding="utf-8")):
+            try:
+                self.add(JobSpec.from_dict(item))
+            except (TypeError, ValueError) as exc:
+                log.warning("忽略無效任務 %r: %s", item, exc)
+
+    # ---------------- 單任務生命週期 ----------------
+
+    async def _run_job(self, job: Job) -> None:
+        spec = job.spec
+        try:
+            while True:
+                job.state = "waiting"
+                await self.probes.wait_live(spec.source_url)
+                job.state = "starting"
+                try:
+                    job.session = await self.youtube.aopen_session(spec.id, spec.title, spec.privacy)
+                except Exception as exc:
+                    log.error("[%s] 創建 YouTube 直播失敗: %s", spec.id, exc)
+                    await asyncio.sleep(60)
+                    continue
+                log.info("[%s] 直播已就緒: https://youtu.be/%s", spec.id, job.session.broadcast_id)
+                try:
+                    await self._relay_until_timeout(job)
+                finally:
+                    if not job.detached:
+                        await self.youtube.acomplete(spec.id, job.session.broadcast_id)
+                    job.session = None
+                log.info("[%s] 斷流超過 %s 秒，本場直播結束，重新等待開播", spec.id, spec.reconnect_seconds)
+        except asyncio.CancelledError:
+            job.state = "stopped"
+            raise
+        except Exception:
+            # 單個任務的意外錯誤不能拖垮整個調度進程
+            job.state = "failed"
+            log.exception("[%s] 任務異常退出", spec.id)
+
+    async def _relay_until_timeout(self, job: Job) -> None:
+        spec = job.spec
+        assert job.session is not None
+        if spec.gapless:
+            await self._relay_gapless(job)
+            return
+
+        async def refresh() -> str:
+            assert job.session is not None
+            session = await self.youtube.aresume_session(spec.id, job.session, spec.title, spec.privacy)
+            if session.broadcast_id != job.session.broadcast_id:
+                log.info("[%s] 直播已重開: https://youtu.be/%s", spec.id, session.broadcast_id)
+            job.session = session
+            return session.ingest_url
+
+        job.runner = Relay(
+            spec.source_url, job.session.ingest_url, probes=self.probes, scheduler=self.scheduler,
+            ffmpeg_bin=self.ffmpeg_bin, ffprobe_bin=self.ffprobe_bin, name=spec.id,
+            mode=spec.codec, metrics=job.metrics, sink=self.sink, refresh_target=refresh,
+        )
+        try:
+            await job.runner.run(reconnect_timeout=spec.reconnect_seconds)
+        finally:
+            job.mode = job.runner.mode
+            job.runner = None
+
+    async def _relay_gapless(self, job: Job) -> None:
+        spec = job.spec
+        assert job.session is not None
+        slate = await ensure_slate(self.slate_path, ffmpeg_bin=self.ffmpeg_bin, image=self.slate_image)
+        job.state = "queued"
+        lease = await self.scheduler.transcode_lease(spec.source_url, spec.codec,
+                                                     ffprobe=self.ffprobe_bin, name=spec.id)
+        job.mode = TRANSCODE if lease is not None else COPY
+        job.relay = GaplessRelay.from_slate_file(
+            spec.source_url, job.session.ingest_url, slate,
+            probes=self.probes, ffmpeg_bin=self.ffmpeg_bin, name=spec.id,
+            metrics=job.metrics, sink=self.sink, lease=lease,
+        )
+        job.state = "live"
+        log.info("[%s] 啟動推流 (斷流墊片模式%s)...", spec.id, "，轉碼" if lease is not None else "")
+        try:
+            await job.relay.run(max_gap=spec.reconnect_seconds)
+        finally:
+            job.relay = None
+            if lease is not None:
+                self.scheduler.release(lease)
+
+    # ---------------- 控制接口 ----------------
+
+    async def _dispatch(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        cmd = msg.get("cmd")
+        if cmd == "add":
+            spec = JobSpec.from_dict(msg["job"])
+            # 授權結果有本地緩存，通常不會啟動內核；過期時的同步校驗放到線程中
+            state = await asyncio.get_running_loop().run_in_executor(None, licensing.get)
+            if not state.ok:
+                raise ValueError("腳本未激活或授權已失效，無法新增任務")
+            job = self.add(spec)
+            return {"ok": True, "id": job.spec.id}
+        if cmd == "remove":
+            return {"ok": await self.remove(msg["id"])}
+        if cmd == "list":
+            return {"ok": True, "jobs": [j.status() for j in self.jobs.values()],
+                    "quota_used": self.youtube.quota_used, "cpu": self.scheduler.status()}
+        if cmd == "shutdown":
+            self._stopping.set()
+            return {"ok": True}
+        raise ValueError(f"未知命令: {cmd}")
+
+    async def serve(self) -> None:
+        server = await control.start_server(self.socket_path, self._dispatch)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+        self._restore()
+        log.info("常駐調度已啟動，控制接口: %s，恢復任務 %d 個", self.socket_path, len(self.jobs))
+        startup.mark("控制接口就緒", final=True)
+        # 就緒後才在 API 線程加載 google 庫，首個任務開播時無需再等待
+        self.youtube.warm()
+        try:
+            await self._stopping.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            tasks = [j.task for j in self.jobs.values() if j.task is not None]
+            for j in self.jobs.values():
+                j.detached = True
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.youtube.close()
+            self.probes.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            log.info("常駐調度已退出")
+
@@ -0,0 +1,282 @@
+"""推流遙測：解析 ffmpeg ``-progress`` 輸出並匯總為 Prometheus / JSON 指標。
+
+每條推流 (手動轉播、常駐任務、分發目標、文件推流……) 由所在進程把快照
+寫入 ``run/metrics/<名稱>.json``；``magic_core serve-metrics`` 讀取該目錄
+提供 HTTP 接口，``magic_core status`` 打印狀態表。跨進程無需任何 IPC。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+import unicodedata
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .paths import METRICS_DIR
+
+log = logging.getLogger("magic_core.telemetry")
+
+# ffmpeg 4.x 起支持；默認每 0.5 秒輸出一組 key=value，以 progress=... 結尾
+PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+PUBLISH_INTERVAL = 2.0
+STALE_SECONDS = 3600   # 進程已退出且超過此時間未更新的快照會被清理
+
+
+def with_progress(cmd: Sequence[str]) -> List[str]:
+    """在 ffmpeg 可執行文件之後插入進度輸出參數。"""
+    return [cmd[0], *PROGRESS_ARGS, *cmd[1:]]
+
+
+def default_name() -> str:
+    """screen 會話名 (如 ms_manual_01)，不在 screen 中時退回進程號。"""
+    sty = os.environ.get("STY", "")
+    return sty.split(".", 1)[1] if "." in sty else f"pid{os.getpid()}"
+
+
+def _num(value: Optional[str], suffix: str = "") -> float:
+    if not value or value == "N/A":
+        return 0.0
+    try:
+        return float(value[: -len(suffix)] if suffix and value.endswith(suffix) else value)
+    except ValueError:
+        return 0.0
+
+
+@dataclass
+class StreamMetrics:
+    name: str
+    kind: str = "relay"
+    state: str = "starting"      # starting / live / down
+    out_time: float = 0.0        # 秒
+    bitrate_kbps: float = 0.0
+    fps: float = 0.0
+    speed: float = 0.0
+    drop_frames: int = 0
+    dup_frames: int = 0
+    bytes_sent: int = 0          # 跨重連累計
+    reconnects: int = 0
+    ttfp: Optional[float] = None  # 最近一次啟動到首個數據包的秒數
+    started_at: float = field(default_factory=time.time)
+    updated_at: float = 0.0
+    pid: int = field(default_factory=os.getpid)
+    session: str = field(default_factory=lambda: os.environ.get("STY", ""))
+
+    _attempts: int = field(default=0, repr=False)
+    _attempt_start: float = field(default=0.0, repr=False)
+    _bytes_base: int = field(default=0, repr=False)
+    _first_seen: bool = field(default=False, repr=False)
+    _published: float = field(default=0.0, repr=False)
+
+    # ---------- 生命週期 ----------
+
+    def begin_attempt(self) -> None:
+        if self._attempts:
+            self.reconnects += 1
+        self._attempts += 1
+        self._attempt_start = time.monotonic()
+        self._bytes_base = self.bytes_sent
+        self._first_seen = False
+        self.state = "starting"
+
+    def end_attempt(self) -> None:
+        self.state = "down"
+        self.speed = 0.0
+        self.fps = 0.0
+        self.bitrate_kbps = 0.0
+
+    def update(self, kv: Dict[str, str]) -> None:
+        self.out_time = _num(kv.get("out_time_us") or kv.get("out_time_ms")) / 1e6
+        self.bitrate_kbps = _num(kv.get("bitrate"), "kbits/s")
+        self.fps = _num(kv.get("fps"))
+        self.speed = _num(kv.get("speed"), "x")
+        self.drop_frames = int(_num(kv.get("drop_frames")))
+        self.dup_frames = int(_num(kv.get("dup_frames")))
+        size = int(_num(kv.get("total_size")))
+        self.bytes_sent = self._bytes_base + size
+        if not self._first_seen and (self.out_time > 0 or _num(kv.get("frame")) > 0):
+            self._first_seen = True
+            self.ttfp = time.monotonic() - self._attempt_start
+        if self._first_seen:
+            self.state = "live"
+
+    # ---------- 持久化 ----------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if not f.name.startswith("_")}
+
+
+class MetricsSink:
+    """把快照原子寫入指標目錄，每條流最多每 PUBLISH_INTERVAL 秒一次。"""
+
+    def __init__(self, directory: Path = METRICS_DIR) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def publish(self, m: StreamMetrics, *, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - m._published < PUBLISH_INTERVAL:
+            return
+        m._published = now
+        m.updated_at = time.time()
+        path = self.directory / f"{m.name}.json"
+        tmp = path.with_name(f".{path.name}.tmp")
+        try:
+            tmp.write_text(json.dumps(m.to_dict(), ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as exc:
+            log.debug("寫入指標失敗 %s: %s", path, exc)
+
+    def remove(self, m: StreamMetrics) -> None:
+        try:
+            (self.directory / f"{m.name}.json").unlink()
+        except OSError:
+            pass
+
+
+async def read_progress(stream: asyncio.StreamReader, m: StreamMetrics,
+                        sink: Optional[MetricsSink]) -> None:
+    kv: Dict[str, str] = {}
+    async for raw in stream:
+        key, _, value = raw.decode("utf-8", "replace").strip().partition("=")
+        if key == "progress":
+            m.update(kv)
+            if sink is not None:
+                sink.publish(m)
+            kv = {}
+        elif key:
+            kv[key] = value
+
+
+# ---------------- 匯總 ----------------
+
+def pid_alive(pid: int) -> bool:
+    """進程是否仍存在 (無權發信號的他人進程也算存在)。"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect(directory: Path = METRICS_DIR) -> List[Dict[str, Any]]:
+    directory = Path(directory)
+    rows: List[Dict[str, Any]] = []
+    now = time.time()
+    for path in sorted(directory.glob("*.json")):
+        try:
+            row = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if not pid_alive(int(row.get("pid", 0))):
+            if now - float(row.get("updated_at", 0)) > STALE_SECONDS:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                continue
+            row["state"] = "down"
+        rows.append(row)
+    return rows
+
+
+_GAUGES = (
+    ("up", "推流是否正常 (1/0)", None),
+    ("speed", "處理速度相對實時的倍率，低於 1 表示跟不上", "speed"),
+    ("bitrate_kbps", "輸出碼率 (kbit/s)", "bitrate_kbps"),
+    ("fps", "輸出幀率", "fps"),
+    ("out_time_seconds", "當前連接已推送的媒體時長", "out_time"),
+    ("drop_frames", "丟幀數 (本次連接)", "drop_frames"),
+    ("dup_frames", "重複幀數 (本次連接)", "dup_frames"),
+    ("bytes_sent", "累計發送字節數", "bytes_sent"),
+    ("reconnects", "重連次數", "reconnects"),
+    ("ttfp_seconds", "最近一次啟動到首個數據包的秒數", "ttfp"),
+)
+
+
+def render_prometheus(rows: List[Dict[str, Any]]) -> str:
+    out: List[str] = []
+    for metric, help_text, key in _GAUGES:
+        out.append(f"# HELP magic_stream_{metric} {help_text}")
+        out.append(f"# TYPE magic_stream_{metric} gauge")
+        for row in rows:
+            if key is None:
+                value: Any = 1 if row.get("state") == "live" else 0
+            else:
+                value = row.get(key)
+                if value is None:
+                    continue
+            name = str(row.get("name", "")).replace("\\", "\\\\").replace('"', '\\"')
+            out.append(f'magic_stream_{metric}{{stream="{name}",kind="{row.get("kind", "")}"}} {value}')
+    return "\n".join(out) + "\n"
+
+
+def _width(text: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(c) in "WF" else 1 for c in text)
+
+
+def _cell(text: str, width: int, right: bool = False) -> str:
+    pad = " " * max(0, width - _width(text))
+    return pad + text if right else text + pad
+
+
+def format_table(rows: List[Dict[str, Any]]) -> str:
+    """菜單用的緊湊狀態表；速度低於 1.0x 的在線推流以 ! 標出。"""
+    if not rows:
+        return "無推流指標"
+    cols = (("名稱", 22, False), ("類型", 8, False), ("狀態", 9, False), ("速度", 7, True),
+            ("碼率kbps", 9, True), ("FPS", 6, True), ("丟幀", 6, True), ("重連", 6, True),
+            ("首包s", 7, True), ("時長", 10, True))
+    lines = ["".join(_cell(title, w, r) for title, w, r in cols)]
+    for row in rows:
+        speed = float(row.get("speed") or 0)
+        ttfp = row.get("ttfp")
+        dur = int(float(row.get("out_time") or 0))
+        values = (
+            str(row.get("name", "")), str(row.get("kind", "")), str(row.get("state", "")),
+            f"{speed:.2f}x", f"{float(row.get('bitrate_kbps') or 0):.0f}",
+            f"{float(row.get('fps') or 0):.1f}", str(int(row.get("drop_frames") or 0)),
+            str(int(row.get("reconnects") or 0)), f"{ttfp:.1f}" if ttfp is not None else "-",
+            f"{dur // 3600:02d}:{dur % 3600 // 60:02d}:{dur % 60:02d}",
+        )
+        line = "".join(_cell(v, w, r) for v, (_, w, r) in zip(values, cols))
+        if row.get("state") == "live" and 0 < speed < 1.0:
+            line += " !"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def serve_http(host: str, port: int, directory: Path = METRICS_DIR) -> asyncio.AbstractServer:
+    """``/metrics`` (Prometheus 文本格式) 與 ``/status.json``。"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+            path = request.split(b" ", 2)[1].split(b"?")[0].decode("latin-1")
+            rows = collect(directory)
+            if path == "/metrics":
+                status, ctype, body = 200, "text/plain; version=0.0.4", render_prometheus(rows)
+            elif path in ("/", "/status.json"):
+                status, ctype, body = 200, "application/json", json.dumps(rows, ensure_ascii=False)
+            else:
+                status, ctype, body = 404, "text/plain", "not found\n"
+            data = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                f"Content-Type: {ctype}; charset=utf-8\r\nContent-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                IndexError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,442 @@
+"""文件推流播放列表：元數據索引 + 預轉封裝緩存 + concat 無縫連播。
+
+* ffprobe 結果 (編碼、時基、時長、關鍵幀間隔) 按 路徑 + 大小 + 修改時間
+  緩存在 ``vod/.magic_index.json``，未改動的文件再次開播無需重新探測；
+* 與頻道規格不一致、無法直接流複製的文件只在首次轉封裝 / 轉碼一次，
+  結果放入 ``vod/.magic_cache/``，以後直接複用；原文件被修改或刪除、
+  頻道規格變化後，不再被任何播放列表引用的緩存自動清理；
+* 全部文件經 concat 分離器首尾相接推送，換文件時 RTMP 連接不斷開。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import ffmpeg
+from .paths import RUN_DIR, VOD_DIR
+from .scheduler import Scheduler
+
+log = logging.getLogger("magic_core.vod")
+
+MEDIA_SUFFIXES = {".mp4", ".m4v", ".mov", ".mkv", ".flv", ".ts", ".webm", ".avi"}
+# concat 分離器可直接流複製的容器 (ffprobe format_name)
+COPY_CONTAINERS = {"mov,mp4,m4a,3gp,3g2,mj2", "flv", "matroska,webm"}
+KEYINT_WINDOW = 60      # 只讀取前 60 秒的包來估算關鍵幀間隔
+MAX_KEYINT = 4.0        # YouTube 建議關鍵幀間隔不超過 4 秒；超過只警告 (平台仍接受)
+PROBE_CONCURRENCY = 4
+CACHE_MIN_AGE = 3600    # 最近一小時內寫入的緩存不清理 (可能正在生成或即將寫入播放列表)
+
+COPY, REMUX, NORMALIZE, SKIP = "copy", "remux", "normalize", "skip"
+
+# ffprobe 的 H.264 profile 名稱 -> libx264 -profile:v
+_X264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline",
+                  "Main": "main", "High": "high"}
+
+
+def _natural_key(path: Path) -> List[Any]:
+    return [int(p) if p.isdigit() else p.lower() for p in re.split(r"(\d+)", path.name)]
+
+
+def list_media(directory: Path = VOD_DIR) -> List[Path]:
+    """目錄下的視頻文件 (自然排序，忽略隱藏文件與緩存目錄)。"""
+    directory = Path(directory)
+    files = [p for p in directory.iterdir()
+             if p.is_file() and not p.name.startswith(".") and p.suffix.lower() in MEDIA_SUFFIXES]
+    return sorted(files, key=_natural_key)
+
+
+def _rate(value: Optional[str]) -> float:
+    num, _, den = (value or "0/1").partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+@dataclass
+class MediaInfo:
+    path: str
+    size: int
+    mtime: float
+    format: str = ""
+    duration: float = 0.0
+    vcodec: str = ""
+    profile: str = ""
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    pix_fmt: str = ""
+    time_base: str = ""
+    keyint: float = 0.0       # 前 KEYINT_WINDOW 秒內最大的關鍵幀間隔
+    acodec: str = ""
+    sample_rate: int = 0
+    channels: int = 0
+    extra_streams: int = 0    # 字幕、數據等多餘軌道
+    error: str = ""
+
+    @property
+    def signature(self) -> Tuple[Any, ...]:
+        """concat 流複製要求各文件完全一致的參數。"""
+        return (self.vcodec, self.profile, self.width, self.height, round(self.fps, 2),
+                self.pix_fmt, self.acodec, self.sample_rate, self.channels)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MediaInfo":
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+class MetaIndex:
+    """ffprobe 結果緩存；文件大小或修改時間變化即失效。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.dirty = False
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            raw = {}
+        self._items: Dict[str, MediaInfo] = {}
+        for key, item in raw.items():
+            try:
+                self._items[key] = MediaInfo.from_dict(item)
+            except TypeError:
+                self.dirty = True
+
+    def get(self, path: Path) -> Optional[MediaInfo]:
+        info = self._items.get(str(path))
+        if info is None:
+            return None
+        st = path.stat()
+        if info.size != st.st_size or info.mtime != st.st_mtime:
+            return None
+        return info
+
+    def put(self, info: MediaInfo) -> None:
+        self._items[info.path] = info
+        self.dirty = True
+
+    def prune(self) -> None:
+        for key in [k for k in self._items if not os.path.exists(k)]:
+            del self._items[key]
+            self.dirty = True
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(json.dumps({k: asdict(v) for k, v in self._items.items()},
+                                  ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+async def _capture(cmd: Sequence[str]) -> Tuple[int, bytes]:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+    )
+    try:
+        out, _ = await proc.communicate()
+    finally:
+        await ffmpeg.terminate(proc)
+    return proc.returncode or 0, out
+
+
+async def probe_media(path: Path, *, ffprobe: str = "ffprobe") -> MediaInfo:
+    st = path.stat()
+    info = MediaInfo(str(path), st.st_size, st.st_mtime)
+    (rc, out), (_, packets) = await asyncio.gather(
+        _capture([ffprobe, "-v", "error", "-show_format", "-show_streams", "-of", "json", str(path)]),
+        _capture([ffprobe, "-v", "error", "-select_streams", "v:0",
+                  "-read_intervals", f"%+{KEYINT_WINDOW}",
+                  "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", str(path)]),
+    )
+    try:
+        meta = json.loads(out or b"{}")
+    except ValueError:
+        meta = {}
+    if rc != 0 or "format" not in meta:
+        info.error = "ffprobe 無法識別"
+        return info
+    fmt = meta["format"]
+    info.format = fmt.get("format_name", "")
+    info.duration = float(fmt.get("duration") or 0)
+    video = audio = None
+    for s in meta.get("streams", []):
+        kind = s.get("codec_type")
+        if kind == "video" and video is None and not s.get("disposition", {}).get("attached_pic"):
+            video = s
+        elif kind == "audio" and audio is None:
+            audio = s
+        else:
+            info.extra_streams += 1
+    if video is None:
+        info.error = "無視頻軌"
+        return info
+    info.vcodec = video.get("codec_name", "")
+    info.profile = video.get("profile", "")
+    info.width = int(video.get("width") or 0)
+    info.height = int(video.get("height") or 0)
+    info.fps = _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate"))
+    info.pix_fmt = video.get("pix_fmt", "")
+    info.time_base = video.get("time_base", "")
+    if audio is not None:
+        info.acodec = audio.get("codec_name", "")
+        info.sample_rate = int(audio.get("sample_rate") or 0)
+        info.channels = int(audio.get("channels") or 0)
+
+    keys: List[float] = []
+    for line in packets.decode("utf-8", "replace").splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags:
+            try:
+                keys.append(float(pts))
+            except ValueError:
+                pass
+    if len(keys) >= 2:
+        keys.sort()
+        info.keyint = round(max(b - a for a, b in zip(keys, keys[1:])), 3)
+    else:
+        # 窗口內至多一個關鍵幀：間隔至少為窗口長度
+        info.keyint = min(info.duration or KEYINT_WINDOW, KEYINT_WINDOW)
+    return info
+
+
+@dataclass
+class ChannelProfile:
+    """整個播放列表統一的輸出規格：取文件中最常見的一組參數。"""
+
+    width: int = 1280
+    height: int = 720
+    fps: float = 30.0
+    profile: str = "High"
+    sample_rate: int = 44100
+    channels: int = 2
+
+    @classmethod
+    def from_media(cls, infos: Sequence[MediaInfo]) -> "ChannelProfile":
+        usable = [i for i in infos if not i.error]
+        if not usable:
+            return cls()
+        top = Counter((i.width, i.height, round(i.fps, 2)) for i in usable).most_common(1)[0][0]
+        prof = cls(top[0], top[1], top[2])
+        h264 = [i.profile for i in usable if i.vcodec == "h264" and i.profile in _X264_PROFILES]
+        if h264:
+            prof.profile = Counter(h264).most_common(1)[0][0]
+        audio = [(i.sample_rate, i.channels) for i in usable if i.acodec == "aac"]
+        if audio:
+            prof.sample_rate, prof.channels = Counter(audio).most_common(1)[0][0]
+        return prof
+
+    @property
+    def signature(self) -> Tuple[Any, ...]:
+        return ("h264", self.profile, self.width, self.height, round(self.fps, 2),
+                "yuv420p", "aac", self.sample_rate, self.channels)
+
+    @property
+    def tag(self) -> str:
+        return "_".join(str(x) for x in self.signature)
+
+
+def plan(info: MediaInfo, profile: ChannelProfile, *, max_keyint: float = 0.0) -> Tuple[str, str]:
+    """返回 (處理方式, 原因)。``max_keyint`` 大於 0 時關鍵幀間隔過長的文件也轉碼。"""
+    if info.error:
+        return SKIP, info.error
+    if info.signature != profile.signature:
+        return NORMALIZE, "編碼參數與頻道規格不一致"
+    if max_keyint and info.keyint > max_keyint:
+        return NORMALIZE, f"關鍵幀間隔 {info.keyint:.1f} 秒過長"
+    if info.format not in COPY_CONTAINERS or info.extra_streams:
+        return REMUX, "容器或多餘軌道不適合直接連播"
+    return COPY, ""
+
+
+def _cache_path(cache_dir: Path, info: MediaInfo, action: str, profile: ChannelProfile) -> Path:
+    key = f"{info.path}|{info.size}|{info.mtime}|{action}"
+    if action == NORMALIZE:
+        key += f"|{profile.tag}"
+    return cache_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.mp4"
+
+
+def _convert_command(info: MediaInfo, action: str, profile: ChannelProfile, out: Path,
+                     ffmpeg_bin: str, threads: int = 0) -> List[str]:
+    budget = ["-threads", str(threads)] if threads > 0 else []
+    cmd = [ffmpeg_bin, "-y", "-hide_banner", "-loglevel", "error", *budget, "-i", info.path]
+    if action == REMUX:
+        return cmd + ["-map", "0:v:0", "-map", "0:a:0", "-c", "copy",
+                      "-movflags", "+faststart", "-f", "mp4", str(out)]
+    w, h, fps = profile.width, profile.height, profile.fps
+    if not info.acodec:
+        layout = "stereo" if profile.channels == 2 else "mono"
+        cmd += ["-f", "lavfi", "-i", f"anullsrc=r={profile.sample_rate}:cl={layout}", "-shortest"]
+    gop = max(1, round(fps * 2))
+    return cmd + [
+        "-map", "0:v:0", "-map", "0:a:0" if info.acodec else "1:a:0",
+        "-vf", f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,"
+               f"setsar=1,fps={fps:g},format=yuv420p",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "20", *budget,
+        "-profile:v", _X264_PROFILES.get(profile.profile, "high"),
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-c:a", "aac", "-b:a", "128k", "-ar", str(profile.sample_rate), "-ac", str(profile.channels),
+        "-movflags", "+faststart", "-f", "mp4", str(out),
+    ]
+
+
+@dataclass
+class PlaylistItem:
+    source: str
+    play: str          # 實際推送的文件 (原文件或緩存)
+    action: str
+    duration: float
+
+
+class Library:
+    def __init__(self, directory: Path = VOD_DIR, *, ffmpeg_bin: str = "ffmpeg",
+                 ffprobe: str = "ffprobe", max_keyint: float = 0.0,
+                 scheduler: Optional[Scheduler] = None, playlist_dir: Path = RUN_DIR) -> None:
+        self.directory = Path(directory)
+        self.cache_dir = self.directory / ".magic_cache"
+        self.playlist_dir = Path(playlist_dir)   # 其他推流進程的 .ffconcat，其引用的緩存不清理
+        self.index = MetaIndex(self.directory / ".magic_index.json")
+        self.ffmpeg_bin = ffmpeg_bin
+        self.ffprobe = ffprobe
+        self.max_keyint = max_keyint
+        self.scheduler = scheduler   # 轉碼經調度器限定線程與核心，避免擠佔同機轉播
+
+    async def scan(self, files: Sequence[Path]) -> List[MediaInfo]:
+        """讀取元數據：命中索引的文件只需一次 stat，其餘並發探測。"""
+        sem = asyncio.Semaphore(PROBE_CONCURRENCY)
+        infos: List[Optional[MediaInfo]] = [self.index.get(p) for p in files]
+        todo = [n for n, info in enumerate(infos) if info is None]
+        if todo:
+            log.info("探測 %d 個新文件 (已索引 %d 個)...", len(todo), len(files) - len(todo))
+
+        async def one(n: int) -> None:
+            async with sem:
+                info = await probe_media(files[n], ffprobe=self.ffprobe)
+            self.index.put(info)
+            infos[n] = info
+
+        await asyncio.gather(*(one(n) for n in todo))
+        self.index.prune()
+        self.index.save()
+        return [i for i in infos if i is not None]
+
+    async def prepare(self, files: Sequence[Path]) -> Tuple[List[PlaylistItem], ChannelProfile]:
+        infos = await self.scan(files)
+        profile = ChannelProfile.from_media(infos)
+        items: List[PlaylistItem] = []
+        for info in infos:
+            action, reason = plan(info, profile, max_keyint=self.max_keyint)
+            name = Path(info.path).name
+            if action == SKIP:
+                log.warning("跳過 %s: %s", name, reason)
+                continue
+            if action != NORMALIZE and info.keyint > MAX_KEYINT:
+                log.warning("%s: 關鍵幀間隔 %.1f 秒，超過 YouTube 建議的 %.0f 秒 (照常推流；"
+                            "--max-keyint %.0f 可預先轉碼)", name, info.keyint, MAX_KEYINT, MAX_KEYINT)
+            play = info.path
+            if action != COPY:
+                out = _cache_path(self.cache_dir, info, action, profile)
+                if not out.is_file():
+                    log.info("%s %s: %s", "轉封裝" if action == REMUX else "轉碼", name, reason)
+                    self.cache_dir.mkdir(parents=True, exist_ok=True)
+                    tmp = out.with_name(f".{out.name}")
+                    rc = await self._convert(info, action, profile, tmp, name)
+                    if rc != 0:
+                        log.warning("跳過 %s: 處理失敗 (ffmpeg 退出碼 %s)", name, rc)
+                        continue
+                    os.replace(tmp, out)
+                play = str(out)
+            items.append(PlaylistItem(info.path, play, action, info.duration))
+        self.prune_cache(items)
+        return items, profile
+
+    def prune_cache(self, items: Sequence[PlaylistItem]) -> None:
+        """刪除本次計劃與現有播放列表都不再引用的緩存文件。"""
+        if not self.cache_dir.is_dir():
+            return
+        keep = {os.path.abspath(i.play) for i in items}
+        for playlist in self.playlist_dir.glob("*.ffconcat"):
+            keep.update(os.path.abspath(f) for f in read_concat(playlist))
+        cutoff = time.time() - CACHE_MIN_AGE
+        freed = removed = 0
+        for path in self.cache_dir.iterdir():
+            try:
+                st = path.stat()
+                if os.path.abspath(path) in keep or st.st_mtime > cutoff or not path.is_file():
+                    continue
+                path.unlink()
+            except OSError:
+                continue
+            freed += st.st_size
+            removed += 1
+        if removed:
+            log.info("清理 %d 個不再使用的緩存文件，釋放 %.1f MB", removed, freed / 1048576)
+
+    async def _convert(self, info: MediaInfo, action: str, profile: ChannelProfile,
+                       out: Path, name: str) -> int:
+        lease = None
+        if action == NORMALIZE and self.scheduler is not None:
+            lease = await self.scheduler.admit(name, transcode=True)
+        try:
+            cmd = _convert_command(info, action, profile, out, self.ffmpeg_bin,
+                                   lease.threads if lease is not None else 0)
+            return await ffmpeg.run(cmd, name=name, on_spawn=lease.pin if lease is not None else None)
+        finally:
+            if lease is not None:
+                self.scheduler.release(lease)
+
+
+def write_concat(items: Sequence[PlaylistItem], path: Path) -> Path:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    lines = ["ffconcat version 1.0"]
+    for item in items:
+        lines.append("file '{}'".format(item.play.replace("'", "'\\''")))
+        if item.duration > 0:
+            lines.append(f"duration {item.duration:.3f}")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def read_concat(path: Path) -> List[str]:
+    """write_concat 寫出的播放列表中的文件路徑；讀取失敗返回空列表。"""
+    try:
+        text = Path(path).read_text(encoding="utf-8")
+    except OSError:
+        return []
+    files = []
+    for line in text.splitlines():
+        if line.startswith("file '") and line.endswith("'"):
+            files.append(line[6:-1].replace("'\\''", "'"))
+    return files
+
+
+def play_command(playlist: Path, target: str, *, loop: int = -1, duration: Optional[float] = None,
+                 ffmpeg_bin: str = "ffmpeg") -> List[str]:
+    """concat 連播；``loop`` 為額外重複次數 (-1 無限)。"""
+    cmd = [
+        ffmpeg_bin, "-hide_banner", "-loglevel", "error",
+        "-re", "-fflags", "+genpts", "-stream_loop", str(loop),
+        "-f", "concat", "-safe", "0", "-i", str(playlist),
+    ]
+    if duration:
+        cmd += ["-t", str(duration)]
+    return cmd + [
+        "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+        "-max_muxing_queue_size", "2048", "-flvflags", "no_duration_filesize",
+        "-f", "flv", target,
+    ]
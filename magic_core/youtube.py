@@ -0,0 +1,299 @@
+"""共享的 YouTube Data API 客戶端。
+
+整個常駐進程只加載一次 googleapiclient 並只持有一份憑證。httplib2 不是
+線程安全的，所以所有 API 調用都經由單線程執行器串行化，協程側用
+``await client.call(...)`` 調用，不會阻塞事件循環。
+
+每個任務的 liveBroadcast / liveStream 按任務 id 記錄在
+``auth_dir/live_cache.json`` (與 token.json 同目錄)；同一個源的兩個任務
+各有各的直播與推流碼。斷流重連或調度進程重啟後優先復用：
+
+* 直播仍有效 -> 僅一次 ``liveBroadcasts.list`` 校驗 (1 配額)，直接沿用推流碼；
+* 直播已結束 -> 復用可重複使用的 liveStream，只需 insert + bind；
+* 無緩存     -> 完整創建流程。
+"""
+
+from __future__ import annotations
+
+import datetime as _dt
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+log = logging.getLogger("magic_core.youtube")
+
+PRIVACY_CHOICES = ("public", "unlisted", "private")
+
+# YouTube Data API v3 配額單價 (https://developers.google.com/youtube/v3/determine_quota_cost)
+QUOTA_COST = {"list": 1, "insert": 50, "update": 50, "bind": 50, "transition": 50, "delete": 50}
+DAILY_QUOTA = 10_000
+
+# 仍可繼續推流的直播生命週期狀態
+REUSABLE_LIFECYCLE = ("created", "ready", "testStarting", "testing", "liveStarting", "live")
+
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ: _dt.tzinfo = ZoneInfo("America/Los_Angeles")
+except Exception:  # Python < 3.9 或缺少時區數據
+    _QUOTA_TZ = _dt.timezone(_dt.timedelta(hours=-8))
+
+
+@dataclass
+class LiveSession:
+    """一次 YouTube 直播：broadcast + 已綁定的 stream。"""
+
+    broadcast_id: str
+    stream_id: str
+    ingest_url: str
+
+
+class ResourceCache:
+    """live_cache.json：按任務緩存直播資源，並記錄當日配額消耗。
+
+    配額按太平洋時間零點重置 (與 Google 一致)。
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.quota_date = ""
+        self.quota_used = 0
+        if self.path.is_file():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.jobs = data.get("jobs", {})
+                self.quota_date = data.get("quota", {}).get("date", "")
+                self.quota_used = int(data.get("quota", {}).get("used", 0))
+            except (ValueError, OSError) as exc:
+                log.warning("直播資源緩存損壞，已忽略: %s", exc)
+
+    def get(self, key: str) -> Dict[str, Any]:
+        return dict(self.jobs.get(key, {}))
+
+    def put(self, key: str, **fields: Any) -> None:
+        with self._lock:
+            entry = self.jobs.setdefault(key, {})
+            entry.update(fields)
+            entry = {k: v for k, v in entry.items() if v is not None}
+            self.jobs[key] = entry
+        self.save()
+
+    def charge(self, method: str, calls: int = 1) -> None:
+        today = _dt.datetime.now(_QUOTA_TZ).date().isoformat()
+        with self._lock:
+            if self.quota_date != today:
+                self.quota_date, self.quota_used = today, 0
+            before = self.quota_used
+            self.quota_used += QUOTA_COST[method] * calls
+        # 立即落盤：list / transition 等調用之後未必還有 put()
+        self.save()
+        if before < DAILY_QUOTA * 0.8 <= self.quota_used:
+            log.warning("YouTube API 今日配額已用 %d / %d", self.quota_used, DAILY_QUOTA)
+
+    def save(self) -> None:
+        with self._lock:
+            payload = {"jobs": self.jobs, "quota": {"date": self.quota_date, "used": self.quota_used}}
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, self.path)
+
+
+class YouTubeClient:
+    def __init__(self, auth_dir: Path, *, api_endpoint: Optional[str] = None,
+                 credentials: Any = None) -> None:
+        self.auth_dir = Path(auth_dir)
+        self.token_path = self.auth_dir / "token.json"
+        # api_endpoint / credentials 可指向本地偽 API 以便測試
+        self.api_endpoint = api_endpoint
+        self._credentials = credentials
+        self.cache = ResourceCache(self.auth_dir / "live_cache.json")
+        self._service: Any = None
+        # 命令行入口導入本模塊只為取常量；線程池與 asyncio 用到時才導入
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="yt-api")
+
+    # ---------------- 基礎 ----------------
+
+    def _build(self) -> Any:
+        # 延遲導入：未用到 API 的子命令不必承擔 google 庫的導入開銷
+        from googleapiclient.discovery import build
+
+        creds = self._credentials
+        if creds is None:
+            from google.auth.transport.requests import Request
+            from google.oauth2.credentials import Credentials
+
+            creds = Credentials.from_authorized_user_file(str(self.token_path))
+            if not creds.valid and creds.refresh_token:
+                creds.refresh(Request())
+                self.token_path.write_text(creds.to_json(), encoding="utf-8")
+        options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+        return build("youtube", "v3", credentials=creds, cache_discovery=False,
+                     static_discovery=True, client_options=options)
+
+    @property
+    def service(self) -> Any:
+        if self._service is None:
+            self._service = self._build()
+        return self._service
+
+    def _execute(self, method: str, request: Any) -> Any:
+        self.cache.charge(method)
+        return request.execute()
+
+    def warm(self) -> None:
+        """在 API 線程中提前加載 google 庫與憑證，不阻塞調用方；失敗則留待首次調用重試。"""
+
+        def build() -> None:
+            try:
+                self.service
+            except Exception as exc:
+                log.debug("預加載 YouTube 客戶端失敗: %s", exc)
+
+        self._executor.submit(build)
+
+    async def call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    @property
+    def quota_used(self) -> int:
+        return self.cache.quota_used
+
+    # ---------------- 同步 API (於執行器線程中運行) ----------------
+
+    def _insert_stream(self, key: str, title: str) -> Tuple[str, str]:
+        stream = self._execute("insert", self.service.liveStreams().insert(
+            part="snippet,cdn,contentDetails,status",
+            body={
+                "snippet": {"title": title},
+                "cdn": {
+                    "ingestionType": "rtmp",
+                    "frameRate": "variable",
+                    "resolution": "variable",
+                },
+                "contentDetails": {"isReusable": True},
+            },
+        ))
+        info = stream["cdn"]["ingestionInfo"]
+        ingest_url = f"{info['ingestionAddress']}/{info['streamName']}"
+        self.cache.put(key, stream_id=stream["id"], ingest_url=ingest_url)
+        return stream["id"], ingest_url
+
+    def _insert_broadcast(self, title: str, privacy: str) -> Dict[str, Any]:
+        start = _dt.datetime.now(_dt.timezone.utc).isoformat()
+        return self._execute("insert", self.service.liveBroadcasts().insert(
+            part="snippet,status,contentDetails",
+            body={
+                "snippet": {"title": title, "scheduledStartTime": start},
+                "status": {"privacyStatus": privacy, "selfDeclaredMadeForKids": False},
+                "contentDetails": {"enableAutoStart": True, "enableAutoStop": True},
+            },
+        ))
+
+    def _bind(self, broadcast_id: str, stream_id: str) -> None:
+        self._execute("bind", self.service.liveBroadcasts().bind(
+            part="id,contentDetails", id=broadcast_id, streamId=stream_id,
+        ))
+
+    def _rebind(self, cached: Dict[str, Any], title: str, privacy: str) -> Optional[LiveSession]:
+        """一次 list 調用校驗緩存的直播是否仍可用。"""
+        if cached.get("title") != title or cached.get("privacy") != privacy:
+            return None
+        resp = self._execute("list", self.service.liveBroadcasts().list(
+            part="status,contentDetails", id=cached["broadcast_id"],
+        ))
+        items = resp.get("items") or []
+        if not items:
+            return None
+        item = items[0]
+        if item["status"].get("lifeCycleStatus") not in REUSABLE_LIFECYCLE:
+            return None
+        if item.get("contentDetails", {}).get("boundStreamId") != cached["stream_id"]:
+            return None
+        return LiveSession(cached["broadcast_id"], cached["stream_id"], cached["ingest_url"])
+
+    def open_session(self, key: str, title: str, privacy: str) -> LiveSession:
+        cached = self.cache.get(key)
+        if cached.get("broadcast_id") and cached.get("stream_id"):
+            try:
+                session = self._rebind(cached, title, privacy)
+            except Exception as exc:
+                log.info("校驗緩存直播失敗，改為新建: %s", exc)
+                session = None
+            if session is not None:
+                log.info("復用直播 %s (推流碼不變)", session.broadcast_id)
+                return session
+
+        stream_id, ingest_url = cached.get("stream_id"), cached.get("ingest_url")
+        if not (stream_id and ingest_url):
+            stream_id, ingest_url = self._insert_stream(key, title)
+
+        broadcast = self._insert_broadcast(title, privacy)
+        try:
+            self._bind(broadcast["id"], stream_id)
+        except Exception as exc:
+            if cached.get("stream_id") != stream_id:
+                raise
+            # 緩存的 liveStream 已被刪除：新建後重試一次
+            log.info("緩存的推流碼已失效，重新創建: %s", exc)
+            stream_id, ingest_url = self._insert_stream(key, title)
+            self._bind(broadcast["id"], stream_id)
+
+        self.cache.put(key, broadcast_id=broadcast["id"], stream_id=stream_id,
+                       ingest_url=ingest_url, title=title, privacy=privacy)
+        return LiveSession(broadcast["id"], stream_id, ingest_url)
+
+    def resume_session(self, key: str, session: LiveSession, title: str, privacy: str) -> LiveSession:
+        """斷流重連前校驗直播 (一次 list)。
+
+        直播開啟了 enableAutoStop，斷流約一分鐘後 YouTube 即自動結束；此時沿用
+        原推流碼繼續推不會有觀眾看到，需要新開一場並綁定同一推流碼。
+        """
+        cached = {"broadcast_id": session.broadcast_id, "stream_id": session.stream_id,
+                  "ingest_url": session.ingest_url, "title": title, "privacy": privacy}
+        if self._rebind(cached, title, privacy) is not None:
+            return session
+        log.info("直播 %s 已被自動結束，重新開播", session.broadcast_id)
+        self.cache.put(key, broadcast_id=None)
+        return self.open_session(key, title, privacy)
+
+    def complete(self, key: str, broadcast_id: str) -> None:
+        # 推流碼 (liveStream) 保留供下一場復用，只清除已結束的直播
+        self.cache.put(key, broadcast_id=None)
+        try:
+            self._execute("transition", self.service.liveBroadcasts().transition(
+                part="status", id=broadcast_id, broadcastStatus="complete",
+            ))
+        except Exception as exc:  # 已自動結束 / 未曾上線時 API 會拒絕，忽略即可
+            log.info("結束直播 %s 失敗 (可忽略): %s", broadcast_id, exc)
+
+    # ---------------- 異步封裝 ----------------
+
+    async def aopen_session(self, key: str, title: str, privacy: str) -> LiveSession:
+        return await self.call(self.open_session, key, title, privacy)
+
+    async def aresume_session(self, key: str, session: LiveSession, title: str,
+                              privacy: str) -> LiveSession:
+        return await self.call(self.resume_session, key, session, title, privacy)
+
+    async def acomplete(self, key: str, broadcast_id: str) -> None:
+        await self.call(self.complete, key, broadcast_id)
+
+
+def check_auth(auth_dir: Path) -> Optional[str]:
+    """返回錯誤信息；憑證存在則返回 None。"""
+    if not (Path(auth_dir) / "token.json").is_file():
+        return f"未找到 API 憑證: {Path(auth_dir) / 'token.json'}"
+    return None
@@ -9,6 +9,10 @@ LOG_DIR="$INSTALL_DIR/logs"
 VOD_DIR="$INSTALL_DIR/vod"
 AUTH_DIR="$INSTALL_DIR/youtube_auth"
 PYTHON_BIN="$INSTALL_DIR/venv/bin/python"
+RUN_DIR="$INSTALL_DIR/run"
+DAEMON_SOCK="$RUN_DIR/ms_daemon.sock"
+METRICS_PORT=9466
+RAW_BASE="https://raw.githubusercontent.com/DeepSeaHK/magic-stream/main"
 
 # 顏色定義
 C_RESET="\e[0m"
@@ -20,7 +24,7 @@ C_OK="\e[32m"
 C_DIM="\e[90m"
 C_INPUT="\e[38;5;159m"
 
-mkdir -p "$LOG_DIR" "$VOD_DIR" "$AUTH_DIR"
+mkdir -p "$LOG_DIR" "$VOD_DIR" "$AUTH_DIR" "$RUN_DIR"
 
 if [ ! -x "$PYTHON_BIN" ]; then PYTHON_BIN="python3"; fi
 
@@ -66,6 +70,46 @@ ensure_python_auth() {
   fi
 }
 
+daemon_running() {
+  screen -ls 2>/dev/null | grep -q "[0-9]\+\.ms_daemon[[:space:]]"
+}
+
+# 常駐調度進程：所有自動轉播任務共用一個 Python 進程
+ensure_daemon() {
+  ensure_metrics_server
+  if daemon_running && [ -S "$DAEMON_SOCK" ]; then return 0; fi
+  local LOG_FILE="$LOG_DIR/ms_daemon_$(date +%m%d_%H%M%S).log"
+  local CMD="cd \"$INSTALL_DIR\" && \"$PYTHON_BIN\" -u -m magic_core daemon \
+    --auth-dir \"$AUTH_DIR\" \
+    --socket \"$DAEMON_SOCK\""
+  daemon_running || screen -S "ms_daemon" -dm bash -c "$CMD 2>&1 | tee \"$LOG_FILE\""
+  local i
+  for i in $(seq 1 30); do
+    [ -S "$DAEMON_SOCK" ] && return 0
+    daemon_running || break
+    sleep 1
+  done
+  echo -e "${C_ERR}[錯誤] 常駐調度進程啟動失敗，請查看日誌: $LOG_FILE${C_RESET}"
+  return 1
+}
+
+metrics_running() {
+  screen -ls 2>/dev/null | grep -q "[0-9]\+\.ms_metrics[[:space:]]"
+}
+
+# 指標接口：http://127.0.0.1:$METRICS_PORT/metrics (Prometheus) 與 /status.json
+# 每次啟動推流時確保在運行，無需先打開菜單 3-6
+ensure_metrics_server() {
+  metrics_running && return 0
+  local LOG_FILE="$LOG_DIR/ms_metrics_$(date +%m%d_%H%M%S).log"
+  local CMD="cd \"$INSTALL_DIR\" && \"$PYTHON_BIN\" -u -m magic_core serve-metrics --port $METRICS_PORT"
+  screen -S "ms_metrics" -dm bash -c "$CMD 2>&1 | tee \"$LOG_FILE\""
+}
+
+daemon_ctl() {
+  (cd "$INSTALL_DIR" && "$PYTHON_BIN" -m magic_core ctl --socket "$DAEMON_SOCK" "$@")
+}
+
 next_screen_name() {
   local prefix="$1"
   local max_id
@@ -82,12 +126,14 @@ menu_relay() {
     echo -e "${C_MENU}Magic Stream -> 1. 轉播推流${C_RESET}"
     echo "1. 手動 RTMP 轉播 (輸入連結 -> 直接推流)"
     echo "2. 自動轉播 (API 監控模式 - 斷流自動重建)"
+    echo "3. 多平台分發 (單路拉流 -> 多路推流)"
     echo "0. 返回主選單"
     echo
     read -rp "請選擇: " choice
     case "$choice" in
       1) relay_manual_rtmp ;;
       2) relay_auto_youtube ;;
+      3) relay_fanout ;;
       0) return ;;
       *) echo -e "${C_WARN}無效選項。${C_RESET}"; sleep 1 ;;
     esac
@@ -105,29 +151,35 @@ relay_manual_rtmp() {
   RTMP_ADDR="${TMP_RTMP:-rtmp://a.rtmp.youtube.com/live2}"
   read -rp "請輸入直播串流金鑰: " STREAM_KEY
   [ -z "$STREAM_KEY" ] && return
+  echo; read -rp "斷流時推送墊片 (保持直播間不斷開)？(y/N): " GAPLESS
 
   draw_header
   echo -e "${C_MENU}--- 任務摘要 (直接推流) ---${C_RESET}"
   echo -e "直播源   : ${C_INPUT}$SOURCE_URL${C_RESET}"
-  echo -e "核心優化 : ${C_OK}H.264 流複製 (無轉碼/防卡頓)${C_RESET}"
+  echo -e "核心優化 : ${C_OK}H.264 流複製優先 (源不可複製時自動轉碼)${C_RESET}"
+  case "$GAPLESS" in y|Y) echo -e "斷流處理 : ${C_OK}墊片無縫銜接 (RTMP 不斷開)${C_RESET}" ;; esac
   confirm_action || { echo "已取消。"; pause_return; return; }
+  ensure_metrics_server
 
   local SCREEN_NAME
   SCREEN_NAME=$(next_screen_name "ms_manual")
   local LOG_FILE="$LOG_DIR/${SCREEN_NAME}_$(date +%m%d_%H%M%S).log"
 
   local CMD
-  CMD="while true; do \
-    echo \"[\$(date)] 啟動推流...\"; \
-    ffmpeg -hide_banner -loglevel error \
-      -user_agent \"Mozilla/5.0 (iPhone; CPU iPhone OS 16_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Mobile/15E148 Safari/604.1\" \
-      -headers \"Referer: https://live.douyin.com/\" \
-      -rw_timeout 10000000 \
-      -i \"$SOURCE_URL\" \
-      -c copy -f flv \"$RTMP_ADDR/$STREAM_KEY\"; \
-    echo \"[\$(date)] 直播中斷，5秒後重連...\"; \
-    sleep 5; \
-  done"
+  case "$GAPLESS" in
+    y|Y)
+      CMD="cd \"$INSTALL_DIR\" && \"$PYTHON_BIN\" -u -m magic_core gapless \
+        --source-url \"$SOURCE_URL\" \
+        --target \"$RTMP_ADDR/$STREAM_KEY\""
+      screen -S "$SCREEN_NAME" -dm bash -c "$CMD 2>&1 | tee \"$LOG_FILE\""
+      echo -e "${C_OK}推流已啟動 [$SCREEN_NAME]。${C_RESET}"; pause_return
+      return ;;
+  esac
+
+  # 流複製優先；源為 HEVC 等無法複製或時間戳錯亂時自動轉碼 (按 CPU 核心預算排隊)
+  CMD="cd \"$INSTALL_DIR\" && \"$PYTHON_BIN\" -u -m magic_core relay \
+    --source-url \"$SOURCE_URL\" \
+    --target \"$RTMP_ADDR/$STREAM_KEY\""
 
   screen -S "$SCREEN_NAME" -dm bash -c "$CMD 2>&1 | tee \"$LOG_FILE\""
   echo -e "${C_OK}推流已啟動 [$SCREEN_NAME]。${C_RESET}"; pause_return
@@ -153,26 +205,74 @@ relay_auto_youtube() {
   echo; read -rp "斷流容忍時間 (秒，預設300): " TO
   TIMEOUT="${TO:-300}"
 
+  echo; read -rp "斷流時推送墊片 (保持直播間不斷開)？(y/N): " GAPLESS
+  local GAPLESS_OPT=""
+  case "$GAPLESS" in y|Y) GAPLESS_OPT="--gapless" ;; esac
+
   draw_header
   echo -e "${C_MENU}--- 任務摘要 (自動值守) ---${C_RESET}"
   echo -e "監控源   : ${C_INPUT}$SOURCE_URL${C_RESET}"
   echo -e "標題     : ${C_INPUT}$TITLE${C_RESET}"
-  echo -e "核心狀態 : ${C_OK}已啟用加密內核 (v0.7.5 Ultra)${C_RESET}"
+  echo -e "運行方式 : ${C_OK}常駐調度 [ms_daemon] (magic_core)${C_RESET}"
+  echo -e "斷流處理 : ${C_INPUT}$([ -n "$GAPLESS_OPT" ] && echo "推送墊片" || echo "等待重連")，容忍 ${TIMEOUT} 秒${C_RESET}"
   
   confirm_action || { echo "已取消。"; pause_return; return; }
 
-  local SCREEN_NAME=$(next_screen_name "ms_auto")
-  local LOG_FILE="$LOG_DIR/${SCREEN_NAME}_$(date +%m%d_%H%M%S).log"
+  ensure_daemon || { pause_return; return; }
+  if daemon_ctl add \
+      --source-url "$SOURCE_URL" \
+      --title "$TITLE" \
+      --privacy "$PRIV" \
+      --reconnect-seconds "$TIMEOUT" $GAPLESS_OPT >/dev/null; then
+    echo -e "${C_OK}自動值守任務已加入常駐調度 [ms_daemon]。${C_RESET}"
+  else
+    echo -e "${C_ERR}[錯誤] 任務加入失敗。${C_RESET}"
+  fi
+  pause_return
+}
 
-  local CMD="cd \"$INSTALL_DIR\" && \"$PYTHON_BIN\" -u \"$INSTALL_DIR/magic_autostream.py\" \
+relay_fanout() {
+  ensure_env
+  draw_header
+  echo -e "${C_MENU}Magic Stream -> 1.3 多平台分發${C_RESET}"
+  echo -e "${C_DIM}只拉取一次直播源，同時推送到多個 RTMP 目標；單個目標斷開不影響其他目標。${C_RESET}"
+  echo
+  read -rp "請輸入直播源 URL: " SOURCE_URL
+  [ -z "$SOURCE_URL" ] && return
+
+  local OUTPUTS=() n=1 addr key
+  while true; do
+    echo
+    read -rp "目標 $n RTMP 位址（預設 rtmp://a.rtmp.youtube.com/live2）: " addr
+    addr="${addr:-rtmp://a.rtmp.youtube.com/live2}"
+    read -rp "目標 $n 串流金鑰 (直接回車結束添加): " key
+    if [ -z "$key" ]; then
+      [ ${#OUTPUTS[@]} -gt 0 ] && break
+      continue
+    fi
+    OUTPUTS+=("$addr/$key")
+    ((n++))
+  done
+
+  draw_header
+  echo -e "${C_MENU}--- 任務摘要 (多平台分發) ---${C_RESET}"
+  echo -e "直播源   : ${C_INPUT}$SOURCE_URL${C_RESET}"
+  echo -e "推流目標 : ${C_INPUT}${#OUTPUTS[@]} 個${C_RESET}"
+  echo -e "核心優化 : ${C_OK}單路拉流 + 流複製分發 (源不可複製時拉流端轉碼)${C_RESET}"
+  confirm_action || { echo "已取消。"; pause_return; return; }
+  ensure_metrics_server
+
+  local SCREEN_NAME
+  SCREEN_NAME=$(next_screen_name "ms_fanout")
+  local LOG_FILE="$LOG_DIR/${SCREEN_NAME}_$(date +%m%d_%H%M%S).log"
+  local CMD="cd \"$INSTALL_DIR\" && \"$PYTHON_BIN\" -u -m magic_core fanout \
     --source-url \"$SOURCE_URL\" \
-    --title \"$TITLE\" \
-    --privacy \"$PRIV\" \
-    --reconnect-seconds \"$TIMEOUT\" \
-    --auth-dir \"$AUTH_DIR\""
+    --socket \"$RUN_DIR/$SCREEN_NAME.sock\""
+  local o
+  for o in "${OUTPUTS[@]}"; do CMD="$CMD --output \"$o\""; done
 
   screen -S "$SCREEN_NAME" -dm bash -c "$CMD 2>&1 | tee \"$LOG_FILE\""
-  echo -e "${C_OK}自動值守進程已啟動 [$SCREEN_NAME]。${C_RESET}"; pause_return
+  echo -e "${C_OK}分發已啟動 [$SCREEN_NAME]。${C_RESET}"; pause_return
 }
 
 # ---------------- 2. 文件推流 ----------------
@@ -180,21 +280,25 @@ relay_auto_youtube() {
 menu_vod() {
   ensure_env
   draw_header
-  echo -e "${C_MENU}Magic Stream -> 2. 文件推流 (逻辑修正版)${C_RESET}"
+  echo -e "${C_MENU}Magic Stream -> 2. 文件推流 (播放列表)${C_RESET}"
   echo "視頻目錄：$VOD_DIR"
   
   # 列出目录下的文件方便选择
   ls -lh "$VOD_DIR"
   echo
   
-  read -rp "請輸入文件名 (需在 vod 目錄下): " FILE_NAME
-  [ -z "$FILE_NAME" ] && return
-  local FULL_PATH="$VOD_DIR/$FILE_NAME"
-  
-  if [ ! -f "$FULL_PATH" ]; then 
-      echo -e "${C_ERR}錯誤：文件不存在！${C_RESET}"
-      echo "請確認文件已上傳至: $VOD_DIR"
-      pause_return; return
+  echo "1. 單個文件  2. 整個目錄 (按文件名順序連播)"
+  read -rp "請選擇 (1-2): " src_choice
+  local FILE_NAME="" FILE_DESC="整個目錄"
+  if [ "$src_choice" != "2" ]; then
+    read -rp "請輸入文件名 (需在 vod 目錄下): " FILE_NAME
+    [ -z "$FILE_NAME" ] && return
+    if [ ! -f "$VOD_DIR/$FILE_NAME" ]; then 
+        echo -e "${C_ERR}錯誤：文件不存在！${C_RESET}"
+        echo "請確認文件已上傳至: $VOD_DIR"
+        pause_return; return
+    fi
+    FILE_DESC="$FILE_NAME"
   fi
   
   read -rp "請輸入直播串流金鑰 (Stream Key): " STREAM_KEY
@@ -203,16 +307,13 @@ menu_vod() {
   echo; echo "推流模式： 1.無限循環(推薦)  2.定時停止  3.定次播放"
   read -rp "請選擇 (1-3): " mode_choice
   
-  # 基础参数：读取速度控制 + 时间戳修复
-  local FFMPEG_PRE_FLAGS="-re -fflags +genpts"
-  local LOOP_OPTS="-stream_loop -1"
+  local LOOP_OPTS="--loop -1"
   local MODE_DESC="無限循環"
 
   case "$mode_choice" in
     2) 
         read -rp "時長(分鐘): " m
-        # 计算秒数
-        LOOP_OPTS="-stream_loop -1 -t $((m*60))"
+        LOOP_OPTS="--loop -1 --duration $((m*60))"
         MODE_DESC="定時 $m 分鐘" 
         ;;
     3) 
@@ -225,34 +326,33 @@ menu_vod() {
         else
             local loop_count=0
         fi
-        LOOP_OPTS="-stream_loop $loop_count"
+        LOOP_OPTS="--loop $loop_count"
         MODE_DESC="定次播放 $c 遍" 
         ;;
   esac
+  if [ "$src_choice" == "2" ]; then
+    read -rp "隨機順序播放？(y/N): " sh
+    case "$sh" in y|Y) LOOP_OPTS="$LOOP_OPTS --shuffle"; MODE_DESC="$MODE_DESC (隨機)" ;; esac
+  fi
 
   draw_header
   echo -e "${C_MENU}--- 任務摘要 ---${C_RESET}"
-  echo -e "文件     : ${C_INPUT}$FILE_NAME${C_RESET}"
+  echo -e "文件     : ${C_INPUT}$FILE_DESC${C_RESET}"
   echo -e "模式     : ${C_OK}$MODE_DESC${C_RESET}"
-  echo -e "技術優化 : ${C_OK}流複製 + H.264 Annex-B 濾鏡${C_RESET}"
+  echo -e "技術優化 : ${C_OK}開播前預檢，不兼容文件預先轉碼並緩存；concat 連播不斷流${C_RESET}"
   confirm_action || { echo "已取消。"; pause_return; return; }
+  ensure_metrics_server
 
   local SCREEN_NAME=$(next_screen_name "ms_vod")
   local LOG_FILE="$LOG_DIR/${SCREEN_NAME}_$(date +%m%d_%H%M%S).log"
   
-  # 核心推流命令 (保持之前的防卡顿优化)
-  local CMD="ffmpeg $FFMPEG_PRE_FLAGS $LOOP_OPTS -i \"$FULL_PATH\" \
-    -c:v copy -c:a copy \
-    -bsf:v h264_mp4toannexb \
-    -max_muxing_queue_size 2048 \
-    -f flv \"rtmp://a.rtmp.youtube.com/live2/$STREAM_KEY\""
-    
-  # 自动重启机制
-  local FULL_CMD="while true; do echo '正在启动推流...'; $CMD; echo '推流结束或意外中断，3秒后重试...'; sleep 3; break; done"
-
-  # 注意：上面的 break 保证了定次播放结束后脚本会退出循环，不会无限重启
-
-  screen -S "$SCREEN_NAME" -dm bash -c "$FULL_CMD 2>&1 | tee \"$LOG_FILE\""
+  # 元數據索引與轉碼緩存位於 vod/.magic_index.json、vod/.magic_cache/
+  local CMD="cd \"$INSTALL_DIR\" && \"$PYTHON_BIN\" -u -m magic_core vod \
+    --vod-dir \"$VOD_DIR\" $LOOP_OPTS \
+    --target \"rtmp://a.rtmp.youtube.com/live2/$STREAM_KEY\""
+  [ -n "$FILE_NAME" ] && CMD="$CMD \"$FILE_NAME\""
+
+  screen -S "$SCREEN_NAME" -dm bash -c "{ echo '正在启动推流...'; $CMD; echo '推流結束。'; } 2>&1 | tee \"$LOG_FILE\""
   
   echo -e "${C_OK}推流已啟動 [$SCREEN_NAME]。${C_RESET}"
   pause_return
@@ -268,20 +368,39 @@ menu_process() {
     echo "1. 查看狀態 (僅列出)"
     echo "2. 停止指定直播"
     echo "3. 進入直播間 (查看實時日誌)"
+    echo "4. 自動轉播任務 (常駐調度)"
+    echo "5. 多平台分發目標管理"
+    echo "6. 實時推流指標 (速度/碼率/丟幀/重連)"
     echo "0. 返回"
     read -rp "選擇: " c
     case "$c" in
       1) screen -ls | grep "ms_" || echo "無運行中進程"; pause_return ;;
       2) process_kill ;;
       3) process_view ;;
+      4) process_daemon_jobs ;;
+      5) process_fanout ;;
+      6) process_metrics ;;
       0) return ;;
     esac
   done
 }
 
+process_metrics() {
+  ensure_metrics_server
+  while true; do
+    draw_header; echo -e "${C_MENU}實時推流指標${C_RESET}"; echo
+    (cd "$INSTALL_DIR" && "$PYTHON_BIN" -m magic_core status)
+    echo
+    echo -e "${C_DIM}速度低於 1.00x 標記 !：源或上行帶寬跟不上實時。"
+    echo -e "指標接口: http://127.0.0.1:$METRICS_PORT/metrics  (JSON: /status.json)${C_RESET}"
+    echo; read -rp "回車刷新，輸入 0 返回: " c
+    [ "$c" == "0" ] && return
+  done
+}
+
 process_kill() {
   draw_header; echo -e "${C_MENU}停止指定直播${C_RESET}"; echo
-  mapfile -t SESSIONS < <(screen -ls | grep -oE "[0-9]+\.ms_(manual|vod|smart|auto)_[0-9]+" | sort)
+  mapfile -t SESSIONS < <(screen -ls | grep -oE "[0-9]+\.ms_((manual|vod|smart|auto|fanout)_[0-9]+|daemon|metrics)" | sort)
   if [ ${#SESSIONS[@]} -eq 0 ]; then echo "無進程。"; pause_return; return; fi
 
   local i=1
@@ -302,7 +421,7 @@ process_view() {
   draw_header; echo -e "${C_MENU}進入直播間 (查看實時日誌)${C_RESET}"; echo
   echo -e "${C_DIM}提示：按 Ctrl+A 然後按 D 退出查看（不要按 Ctrl+C，否則會停止直播）${C_RESET}"; echo
   
-  mapfile -t SESSIONS < <(screen -ls | grep -oE "[0-9]+\.ms_(manual|vod|smart|auto)_[0-9]+" | sort)
+  mapfile -t SESSIONS < <(screen -ls | grep -oE "[0-9]+\.ms_((manual|vod|smart|auto|fanout)_[0-9]+|daemon|metrics)" | sort)
   if [ ${#SESSIONS[@]} -eq 0 ]; then echo "無進程。"; pause_return; return; fi
 
   local i=1
@@ -319,11 +438,81 @@ process_view() {
   screen -r "$target"
 }
 
+process_daemon_jobs() {
+  draw_header; echo -e "${C_MENU}自動轉播任務 (常駐調度)${C_RESET}"; echo
+  if ! daemon_running; then echo "常駐調度未運行。"; pause_return; return; fi
+  daemon_ctl list
+  echo; read -rp "輸入要移除的任務 ID (如 job_01，直接回車返回): " jid
+  [ -z "$jid" ] && return
+  if daemon_ctl remove "$jid" >/dev/null; then
+    echo -e "${C_OK}已移除: $jid${C_RESET}"
+  else
+    echo -e "${C_ERR}未找到任務: $jid${C_RESET}"
+  fi
+  pause_return
+}
+
+process_fanout() {
+  draw_header; echo -e "${C_MENU}多平台分發目標管理${C_RESET}"; echo
+  mapfile -t SESSIONS < <(screen -ls | grep -oE "ms_fanout_[0-9]+" | sort)
+  if [ ${#SESSIONS[@]} -eq 0 ]; then echo "無分發任務。"; pause_return; return; fi
+
+  local i=1
+  for sess in "${SESSIONS[@]}"; do
+    echo -e " ${C_OK}[$i]${C_RESET} $sess"
+    ((i++))
+  done
+  echo; read -rp "輸入序號 (0返回): " k
+  if [[ "$k" == "0" ]]; then return; fi
+  if [[ ! "$k" =~ ^[0-9]+$ ]] || [ "$k" -gt "${#SESSIONS[@]}" ]; then echo "無效序號"; sleep 1; return; fi
+
+  local SOCK="$RUN_DIR/${SESSIONS[$((k-1))]}.sock"
+  while true; do
+    draw_header; echo -e "${C_MENU}${SESSIONS[$((k-1))]}${C_RESET}"; echo
+    (cd "$INSTALL_DIR" && "$PYTHON_BIN" -m magic_core fanout-ctl --socket "$SOCK" list)
+    echo
+    echo "1. 添加推流目標  2. 移除推流目標  0. 返回"
+    read -rp "選擇: " c
+    case "$c" in
+      1)
+        read -rp "RTMP 位址（預設 rtmp://a.rtmp.youtube.com/live2）: " addr
+        addr="${addr:-rtmp://a.rtmp.youtube.com/live2}"
+        read -rp "串流金鑰: " key
+        [ -n "$key" ] && (cd "$INSTALL_DIR" && "$PYTHON_BIN" -m magic_core fanout-ctl --socket "$SOCK" add "$addr/$key" >/dev/null)
+        ;;
+      2)
+        read -rp "輸入要移除的目標 ID (如 out_01): " oid
+        [ -n "$oid" ] && (cd "$INSTALL_DIR" && "$PYTHON_BIN" -m magic_core fanout-ctl --socket "$SOCK" remove "$oid" >/dev/null)
+        ;;
+      0) return ;;
+    esac
+  done
+}
+
 # ------------- 4. 系統維護 -------------
 
 menu_update() {
     draw_header; echo "正在從 GitHub 拉取最新版..."; 
-    curl -fsSL "https://raw.githubusercontent.com/DeepSeaHK/magic-stream/main/magic_stream.sh?t=$(date +%s)" -o magic_stream.sh
+    cd "$INSTALL_DIR" || return
+    local ts f tmp
+    ts=$(date +%s)
+    # 先下載到臨時目錄，全部成功後再替換，避免半新半舊
+    tmp=$(mktemp -d) || return
+    if ! curl -fsSL "$RAW_BASE/magic_stream.sh?t=$ts" -o "$tmp/magic_stream.sh" \
+        || ! curl -fsSL "$RAW_BASE/magic_core/FILES?t=$ts" -o "$tmp/FILES"; then
+        echo -e "${C_ERR}下載失敗，已保留當前版本。${C_RESET}"; rm -rf "$tmp"; pause_return; return
+    fi
+    mkdir -p "$tmp/magic_core"
+    for f in $(cat "$tmp/FILES"); do
+        if ! curl -fsSL "$RAW_BASE/magic_core/$f?t=$ts" -o "$tmp/magic_core/$f"; then
+            echo -e "${C_ERR}下載 magic_core/$f 失敗，已保留當前版本。${C_RESET}"; rm -rf "$tmp"; pause_return; return
+        fi
+    done
+    mkdir -p magic_core
+    cp "$tmp/FILES" magic_core/FILES
+    cp "$tmp"/magic_core/*.py magic_core/
+    cp "$tmp/magic_stream.sh" magic_stream.sh
+    rm -rf "$tmp"
     chmod +x magic_stream.sh
     echo "更新完成，重啟中..."; sleep 1; exec "$0" "$@"
 }
@@ -332,13 +521,13 @@ show_license_info() {
   ensure_python_venv
   draw_header
   echo -e "${C_MENU}Magic Stream -> 5. 功能授權${C_RESET}"
-  echo "正在連接授權服務器 (GitHub Gist)..."
+  echo "正在查詢授權狀態 (GitHub Gist，結果本地緩存)..."
   
   cd "$INSTALL_DIR" || return
   
   # 1. 獲取 Python 輸出 (機器碼)
   # 2. 獲取 Python 退出狀態碼 (0=已授權, 1=未授權)
-  MACHINE_ID=$("$PYTHON_BIN" magic_autostream.py --check-license)
+  MACHINE_ID=$("$PYTHON_BIN" -m magic_core license)
   RET_CODE=$?
   
   echo
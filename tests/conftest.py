@@ -0,0 +1,6 @@
+"""倉庫沒有打包配置，測試直接從源碼目錄導入 magic_core。"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+
+from magic_core import fanout
+from magic_core.flv import TAG_AUDIO, TAG_VIDEO, Tag
+
+AVC_HEADER = Tag(TAG_VIDEO, 0, bytes([0x17, 0x00]))
+AAC_HEADER = Tag(TAG_AUDIO, 0, bytes([0xAF, 0x00]))
+HEADERS = {TAG_VIDEO: AVC_HEADER, TAG_AUDIO: AAC_HEADER}
+
+
+def _key(ts):
+    return Tag(TAG_VIDEO, ts, bytes([0x17, 0x01]))
+
+
+def _inter(ts):
+    return Tag(TAG_VIDEO, ts, bytes([0x27, 0x01]))
+
+
+def _drain(out):
+    items = []
+    while not out._queue.empty():
+        items.append(out._queue.get_nowait())
+    return items
+
+
+def _output(monkeypatch, size=8):
+    monkeypatch.setattr(fanout, "QUEUE_TAGS", size)
+    return fanout.Output("out_01", "rtmp://a.rtmp.youtube.com/live2/abcd-efgh")
+
+
+def test_starts_on_keyframe_with_headers(monkeypatch):
+    out = _output(monkeypatch)
+    out.offer(_inter(0), 0, HEADERS)
+    assert out._queue.empty() and not out.synced
+    out.offer(_key(33), 33, HEADERS)
+    out.offer(_inter(66), 66, HEADERS)
+    sent = _drain(out)
+    assert [tag for tag, _ in sent[:2]] == [AVC_HEADER, AAC_HEADER]
+    assert [ts for _, ts in sent] == [33, 33, 33, 66]
+    assert out.synced
+
+
+def test_overflow_drops_until_next_keyframe(monkeypatch):
+    out = _output(monkeypatch, size=4)
+    for i in range(4):
+        out.offer(_key(0) if i == 0 else _inter(i), i, HEADERS)   # 2 頭 + 2 幀，隊列已滿
+    out.offer(_inter(4), 4, HEADERS)
+    assert (out.dropped, out.synced, out._queue.qsize()) == (5, False, 0)
+
+    out.offer(_inter(5), 5, HEADERS)
+    assert out._queue.empty()
+    out.offer(_key(6), 6, HEADERS)
+    # 重新同步時補發解碼配置
+    assert [tag for tag, _ in _drain(out)] == [AVC_HEADER, AAC_HEADER, _key(6)]
+
+
+def test_keyframe_waits_for_room_for_headers(monkeypatch):
+    out = _output(monkeypatch, size=4)
+    out._queue.put_nowait((_inter(0), 0))
+    out._queue.put_nowait((_inter(1), 1))
+    out.offer(_key(2), 2, HEADERS)   # 只剩 2 個空位，放不下 2 頭 + 關鍵幀
+    assert (out.synced, out._queue.qsize()) == (False, 2)
+
+
+def test_reconnecting_output_takes_nothing(monkeypatch):
+    out = _output(monkeypatch)
+    out.state = "reconnecting"
+    out.offer(_key(0), 0, HEADERS)
+    assert out._queue.empty()
+
+
+def test_mask_url_hides_stream_key():
+    assert fanout.mask_url("rtmp://a.rtmp.youtube.com/live2/abcd-efgh-ijkl") == \
+        "rtmp://a.rtmp.youtube.com/live2/abcd****"
+
+
+class _LiveProbes:
+    async def wait_live(self, url, timeout=None):
+        await asyncio.sleep(0.05)
+        return True
+
+
+def test_ingest_stderr_is_logged(tmp_path, caplog):
+    stub = tmp_path / "ffmpeg"
+    stub.write_text("#!/bin/sh\necho 'Server returned 404 Not Found' >&2\nexit 1\n")
+    stub.chmod(0o755)
+    fan = fanout.FanOut("http://src/live.flv", probes=_LiveProbes(), ffmpeg_bin=str(stub), name="fan")
+
+    async def run():
+        task = asyncio.get_running_loop().create_task(fan.run_ingest())
+        await asyncio.sleep(0.5)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    with caplog.at_level(logging.INFO):
+        asyncio.run(run())
+    assert "[fan/in] Server returned 404 Not Found" in caplog.messages
+    assert fan.ingest_restarts >= 1
+
+
+def test_serve_exits_when_ingest_cannot_start(tmp_path):
+    fan = fanout.FanOut("http://src/live.flv", probes=_LiveProbes(),
+                        ffmpeg_bin=str(tmp_path / "missing-ffmpeg"), name="fan")
+    assert asyncio.run(asyncio.wait_for(fan.serve([]), 5)) is False
@@ -0,0 +1,64 @@
+import asyncio
+
+from magic_core.flv import TAG_AUDIO, TAG_VIDEO, Tag
+from magic_core.gapless import FRAME_MS, GaplessRelay, Splicer
+
+AVC_HEADER = bytes([0x17, 0x00])
+AVC_KEY = bytes([0x17, 0x01])
+AVC_INTER = bytes([0x27, 0x01])
+AAC_HEADER = bytes([0xAF, 0x00])
+AAC_RAW = bytes([0xAF, 0x01])
+
+
+def _segment(start, frames=10):
+    tags = [Tag(TAG_VIDEO, start, AVC_HEADER), Tag(TAG_AUDIO, start, AAC_HEADER)]
+    for i in range(frames):
+        ts = start + i * 33
+        tags.append(Tag(TAG_VIDEO, ts, AVC_KEY if i == 0 else AVC_INTER))
+        tags.append(Tag(TAG_AUDIO, ts + 10, AAC_RAW))
+    return tags
+
+
+def test_timestamps_increase_across_segments():
+    splicer = Splicer()
+    out = {TAG_AUDIO: [], TAG_VIDEO: []}
+    ends = []
+    # 源從中途開始、墊片從 0 開始、重連後的源時間戳回退
+    for start in (50000, 0, 1200, 0):
+        splicer.begin_segment()
+        mapped = [(tag.type, splicer.map(tag)) for tag in _segment(start)]
+        for kind, ts in mapped:
+            out[kind].append(ts)
+        ends.append((mapped[2][1], max(ts for _, ts in mapped)))
+
+    for series in out.values():
+        assert series == sorted(series)
+    for (_, prev_end), (next_start, _) in zip(ends, ends[1:]):
+        assert next_start == prev_end + FRAME_MS
+
+
+def test_first_segment_starts_at_zero():
+    splicer = Splicer()
+    splicer.begin_segment()
+    assert [splicer.map(tag) for tag in _segment(7000, frames=2)] == [0, 0, 0, 10, 33, 43]
+
+
+def test_stalled_output_is_rebuilt(tmp_path):
+    # 偽 ffmpeg：第一次啟動不讀 stdin (RTMP 對端卡住)，重建後正常消費
+    marker = tmp_path / "started"
+    stub = tmp_path / "ffmpeg"
+    stub.write_text(f"#!/bin/sh\nif [ -e {marker} ]; then exec cat >/dev/null; fi\n"
+                    f"touch {marker}\nexec sleep 60\n")
+    stub.chmod(0o755)
+    relay = GaplessRelay("http://src/live.flv", "rtmp://dst/live/key", [], probes=None,
+                         ffmpeg_bin=str(stub), stall_timeout=0.3)
+
+    async def run():
+        await relay._start_output()
+        try:
+            await asyncio.wait_for(relay._write(Tag(TAG_VIDEO, 0, AVC_KEY + bytes(1 << 20)), 0), 10)
+        finally:
+            await relay._stop_output()
+
+    asyncio.run(run())
+    assert relay.stats.output_restarts == 1
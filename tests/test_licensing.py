@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from magic_core import licensing
+from magic_core.licensing import LicenseState
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """替換內核校驗與後台刷新；``checks`` 為 check_now 依次返回的結果。"""
+
+    class Env:
+        path = tmp_path / "license.json"
+        checks = []
+        spawned = 0
+
+    def check_now(timeout=licensing.CHECK_TIMEOUT):
+        return Env.checks.pop(0)
+
+    def spawn_refresh(path=licensing.LICENSE_FILE):
+        Env.spawned += 1
+
+    monkeypatch.setattr(licensing, "check_now", check_now)
+    monkeypatch.setattr(licensing, "spawn_refresh", spawn_refresh)
+    return Env
+
+
+def _passed(age=0.0):
+    return LicenseState(True, "m1", time.time() - age)
+
+
+def test_within_ttl_uses_cache(env):
+    licensing.save(_passed(age=60), env.path)
+    state = licensing.get(env.path, ttl=3600, grace=7200)
+    assert (state.ok, state.source, env.spawned) == (True, "cache", 0)
+
+
+def test_within_grace_refreshes_in_background(env):
+    licensing.save(_passed(age=5000), env.path)
+    state = licensing.get(env.path, ttl=3600, grace=7200)
+    assert (state.ok, state.source, env.spawned) == (True, "grace", 1)
+
+
+def test_expired_checks_synchronously(env):
+    licensing.save(_passed(age=10000), env.path)
+    env.checks = [_passed()]
+    state = licensing.get(env.path, ttl=3600, grace=7200)
+    assert (state.ok, state.source) == (True, "fresh")
+    assert licensing.load(env.path).age < 60
+
+
+def test_offline_does_not_overwrite_cache(env):
+    licensing.save(_passed(age=10000), env.path)
+    env.checks = [LicenseState(False, source="offline")]
+    state = licensing.get(env.path, ttl=3600, grace=7200)
+    assert (state.ok, state.source, state.machine_id) == (False, "offline", "m1")
+    cached = licensing.load(env.path)
+    assert cached.ok and cached.denied_at == 0.0
+
+
+def test_denial_keeps_last_pass_but_disables_cache(env):
+    licensing.save(_passed(age=10000), env.path)
+    env.checks = [LicenseState(False, "m1", time.time())]
+    assert not licensing.get(env.path, ttl=3600, grace=7200).ok
+
+    cached = licensing.load(env.path)
+    assert cached.ok and not cached.trusted
+    env.checks = [LicenseState(False, "m1", time.time())]
+    assert not licensing.get(env.path, ttl=3600, grace=7200).ok   # 不走緩存，再次同步校驗
+    env.checks = [_passed()]
+    assert licensing.get(env.path, ttl=3600, grace=7200).source == "fresh"
+    assert licensing.load(env.path).trusted
+
+
+def test_future_or_foreign_cache_is_rejected(env, monkeypatch):
+    licensing.save(LicenseState(True, "m1", time.time() + 86400), env.path)
+    assert licensing.load(env.path) is None
+    licensing.save(_passed(), env.path)
+    monkeypatch.setattr(licensing, "_host_id", lambda: "another-host")
+    assert licensing.load(env.path) is None
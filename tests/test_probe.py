@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from magic_core import probe
+
+
+def _parse(raw: bytes, method: str = "GET", limit: int = 1024):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await probe._read_response(reader, method, limit)
+
+    return asyncio.run(run())
+
+
+def test_head_has_no_body():
+    status, headers, body, reusable = _parse(
+        b"HTTP/1.1 200 OK\r\nContent-Length: 5000\r\n\r\n", "HEAD")
+    assert (status, headers["content-length"], body, reusable) == (200, "5000", b"", True)
+
+
+def test_chunked_body_is_reassembled():
+    raw = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n4\r\nWiki\r\n5;x=y\r\npedia\r\n0\r\n\r\n"
+    status, _, body, reusable = _parse(raw)
+    assert (status, body, reusable) == (200, b"Wikipedia", True)
+
+
+def test_chunked_body_over_limit_is_not_reusable():
+    raw = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n8\r\n01234567\r\n0\r\n\r\n"
+    _, _, body, reusable = _parse(raw, limit=4)
+    assert (body, reusable) == (b"0123", False)
+
+
+def test_content_length():
+    raw = b"HTTP/1.1 404 Not Found\r\nContent-Length: 3\r\n\r\nabcHTTP/1.1 200 OK\r\n"
+    status, _, body, reusable = _parse(raw)
+    assert (status, body, reusable) == (404, b"abc", True)
+
+
+def test_connection_close_is_not_reusable():
+    raw = b"HTTP/1.1 200 OK\r\nConnection: close\r\nContent-Length: 0\r\n\r\n"
+    assert _parse(raw)[3] is False
+
+
+def test_no_length_sniffs_and_drops_connection():
+    raw = b"HTTP/1.1 200 OK\r\nContent-Type: video/x-flv\r\n\r\n" + b"F" * 4096
+    _, _, body, reusable = _parse(raw, limit=1024)
+    assert (len(body), reusable) == (1024, False)
+
+
+def test_closed_connection_is_stale():
+    with pytest.raises(probe._StaleConnection):
+        _parse(b"")
+
+
+class _Script(BaseHTTPRequestHandler):
+    """按預設序列回應 HEAD：(狀態碼, Content-Length)，序列用盡後保持最後一項。"""
+
+    protocol_version = "HTTP/1.1"
+    replies = []
+
+    def do_HEAD(self):
+        status, length = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Script)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/live/room.flv"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+class _RecordingBackoff(probe.Backoff):
+    attempts = []
+
+    def next(self):
+        delay = super().next()
+        self.attempts.append(self._attempt)
+        return delay
+
+
+def _wait_live(url, timeout):
+    async def run():
+        engine = probe.ProbeEngine(backoff_base=0.01, backoff_cap=0.05, timeout=2.0)
+        try:
+            return await engine.wait_live(url, timeout=timeout)
+        finally:
+            engine.close()
+
+    return asyncio.run(run())
+
+
+def test_wait_live_backs_off_and_resets(server, monkeypatch):
+    monkeypatch.setattr(probe, "Backoff", _RecordingBackoff)
+    _RecordingBackoff.attempts = []
+    _Script.replies = [
+        (404, 0), (404, 0), (404, 0),   # 離線：退避逐次加長
+        (200, 0),                        # 預熱 (空正文)：重置
+        (503, 0),                        # 離線指紋變化：重置
+        (503, 0),
+        (200, 100),                      # 上線
+    ]
+    assert _wait_live(server, timeout=10) is True
+    assert _RecordingBackoff.attempts == [1, 2, 3, 1, 1, 2]
+
+
+def test_wait_live_gives_up_after_timeout(server):
+    _Script.replies = [(404, 0)]
+    assert _wait_live(server, timeout=0.3) is False
+
+
+def test_backoff_stays_within_ceiling():
+    backoff = probe.Backoff(base=1.0, cap=8.0)
+    delays = [backoff.next() for _ in range(6)]
+    for n, delay in enumerate(delays, 1):
+        assert 1.0 <= delay <= min(8.0, 2.0 ** n)
+    backoff.reset()
+    assert backoff.next() <= 2.0
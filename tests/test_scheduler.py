@@ -0,0 +1,31 @@
+from magic_core.scheduler import FastFailCounter, is_copy_error
+
+
+def test_copy_errors_count_towards_fallback():
+    counter = FastFailCounter(seconds=30, limit=3)
+    assert not counter.record(1, 2.0, True)
+    assert not counter.record(1, 2.0, True)
+    assert counter.record(1, 2.0, True)
+
+
+def test_unrelated_failures_neither_count_nor_reset():
+    counter = FastFailCounter(seconds=30, limit=3)
+    counter.record(1, 2.0, True)
+    counter.record(1, 2.0, True)
+    assert not counter.record(1, 2.0, False)    # 推流被拒等與編碼無關
+    assert not counter.record(0, 2.0, True)     # 正常退出
+    assert counter.count == 2
+    assert counter.record(1, 2.0, True)
+
+
+def test_stable_run_resets():
+    counter = FastFailCounter(seconds=30, limit=2)
+    counter.record(1, 2.0, True)
+    assert not counter.record(1, 45.0, True)
+    assert counter.count == 0
+
+
+def test_is_copy_error():
+    assert is_copy_error("[flv @ 0x55] Non-monotonous DTS in output stream 0:1")
+    assert is_copy_error("Video codec hevc not compatible with flv")
+    assert not is_copy_error("rtmp://a.rtmp.youtube.com/live2: Connection refused")
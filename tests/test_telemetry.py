@@ -0,0 +1,77 @@
+import asyncio
+
+from magic_core.telemetry import MetricsSink, StreamMetrics, collect, read_progress, render_prometheus
+
+# ffmpeg -progress pipe:1 的兩個區塊 (推流 HEVC -> H.264，上行略慢)
+PROGRESS = b"""frame=1500
+fps=29.97
+stream_0_0_q=23.0
+bitrate=4488.3kbits/s
+total_size=28051456
+out_time_us=50000000
+out_time_ms=50000000
+out_time=00:00:50.000000
+dup_frames=2
+drop_frames=7
+speed=0.982x
+progress=continue
+frame=1530
+fps=29.90
+bitrate=N/A
+total_size=28600000
+out_time_us=51000000
+dup_frames=2
+drop_frames=9
+speed=0.95x
+progress=end
+"""
+
+
+def _feed(metrics, sink, data=PROGRESS):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        await read_progress(reader, metrics, sink)
+
+    asyncio.run(run())
+
+
+def test_progress_block_is_parsed():
+    m = StreamMetrics("ms_manual_01")
+    m.begin_attempt()
+    _feed(m, None, PROGRESS.split(b"progress=continue\n")[0] + b"progress=continue\n")
+    assert (m.state, m.out_time, m.bitrate_kbps, m.fps) == ("live", 50.0, 4488.3, 29.97)
+    assert (m.speed, m.drop_frames, m.dup_frames, m.bytes_sent) == (0.982, 7, 2, 28051456)
+    assert m.ttfp is not None and m.ttfp >= 0
+
+    _feed(m, None, PROGRESS.split(b"progress=continue\n")[1])
+    assert (m.bitrate_kbps, m.speed, m.drop_frames) == (0.0, 0.95, 9)   # N/A 記為 0
+
+
+def test_bytes_accumulate_across_reconnects():
+    m = StreamMetrics("ms_manual_01")
+    m.begin_attempt()
+    _feed(m, None)
+    m.end_attempt()
+    assert (m.state, m.speed) == ("down", 0.0)
+    m.begin_attempt()
+    _feed(m, None)
+    assert (m.reconnects, m.bytes_sent) == (1, 2 * 28600000)
+
+
+def test_prometheus_exposition(tmp_path):
+    sink = MetricsSink(tmp_path)
+    m = StreamMetrics('job "a"', kind="relay")
+    m.begin_attempt()
+    _feed(m, sink)
+    sink.publish(m, force=True)
+
+    text = render_prometheus(collect(tmp_path))
+    labels = '{stream="job \\"a\\"",kind="relay"}'
+    assert f"magic_stream_up{labels} 1" in text
+    assert f"magic_stream_speed{labels} 0.95" in text
+    assert f"magic_stream_bytes_sent{labels} 28600000" in text
+    assert f"magic_stream_drop_frames{labels} 9" in text
+    assert "# TYPE magic_stream_reconnects gauge" in text
+    assert text.endswith("\n")
@@ -0,0 +1,59 @@
+import pytest
+
+from magic_core.vod import COPY, NORMALIZE, REMUX, SKIP, ChannelProfile, MediaInfo, plan
+
+
+def _info(**kw):
+    base = dict(path="/v/a.mp4", size=1, mtime=0.0, format="mov,mp4,m4a,3gp,3g2,mj2",
+                duration=60.0, vcodec="h264", profile="High", width=1280, height=720,
+                fps=30.0, pix_fmt="yuv420p", keyint=2.0, acodec="aac",
+                sample_rate=44100, channels=2)
+    base.update(kw)
+    return MediaInfo(**base)
+
+
+def test_profile_takes_most_common_parameters():
+    infos = [
+        _info(width=1920, height=1080, profile="Main", sample_rate=48000),
+        _info(width=1920, height=1080, profile="Main", sample_rate=48000),
+        _info(),
+        _info(width=640, height=360, error="無法解析"),
+        _info(width=640, height=360, error="無法解析"),
+    ]
+    prof = ChannelProfile.from_media(infos)
+    assert (prof.width, prof.height, prof.fps) == (1920, 1080, 30.0)
+    assert (prof.profile, prof.sample_rate, prof.channels) == ("Main", 48000, 2)
+
+
+def test_profile_defaults_without_usable_media():
+    assert ChannelProfile.from_media([_info(error="x")]) == ChannelProfile()
+
+
+def test_profile_ignores_unknown_h264_profiles():
+    prof = ChannelProfile.from_media([_info(profile="High 4:4:4 Predictive")])
+    assert prof.profile == "High"
+
+
+@pytest.mark.parametrize("kw, action", [
+    ({}, COPY),
+    ({"format": "matroska,webm"}, COPY),
+    ({"error": "損壞"}, SKIP),
+    ({"width": 1920, "height": 1080}, NORMALIZE),
+    ({"vcodec": "hevc"}, NORMALIZE),
+    ({"acodec": ""}, NORMALIZE),
+    ({"keyint": 8.0}, COPY),
+    ({"format": "mpegts"}, REMUX),
+    ({"extra_streams": 1}, REMUX),
+])
+def test_plan(kw, action):
+    assert plan(_info(**kw), ChannelProfile())[0] == action
+
+
+def test_plan_keyint_check_is_opt_in():
+    assert plan(_info(keyint=8.0), ChannelProfile(), max_keyint=4.0)[0] == NORMALIZE
+    assert plan(_info(keyint=3.0), ChannelProfile(), max_keyint=4.0)[0] == COPY
+
+
+def test_media_info_from_dict_ignores_unknown_keys():
+    info = MediaInfo.from_dict({"path": "/v/a.mp4", "size": 1, "mtime": 0.0, "bogus": 1})
+    assert info.path == "/v/a.mp4"
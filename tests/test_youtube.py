@@ -0,0 +1,155 @@
+import pytest
+
+from magic_core.youtube import YouTubeClient
+
+
+class _Request:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeYouTube:
+    """最小化的 liveStreams / liveBroadcasts 偽服務，記錄每次調用。"""
+
+    def __init__(self):
+        self.calls = []
+        self.streams = {}
+        self.broadcasts = {}
+        self._seq = 0
+
+    def _next_id(self, prefix):
+        self._seq += 1
+        return f"{prefix}{self._seq}"
+
+    def liveStreams(self):
+        return self
+
+    def liveBroadcasts(self):
+        return self
+
+    def insert(self, part, body):
+        if "cdn" in body:
+            sid = self._next_id("s")
+            self.streams[sid] = True
+            self.calls.append(("stream.insert", sid))
+            return _Request({"id": sid, "cdn": {"ingestionInfo": {
+                "ingestionAddress": "rtmp://a.rtmp.youtube.com/live2", "streamName": f"key-{sid}"}}})
+        bid = self._next_id("b")
+        self.broadcasts[bid] = {"status": {"lifeCycleStatus": "created"}, "contentDetails": {}}
+        self.calls.append(("broadcast.insert", bid))
+        return _Request({"id": bid})
+
+    def bind(self, part, id, streamId):
+        self.calls.append(("bind", id, streamId))
+        if streamId not in self.streams:
+            return _Request(RuntimeError("liveStreamNotFound"))
+        self.broadcasts[id]["contentDetails"]["boundStreamId"] = streamId
+        return _Request({"id": id})
+
+    def list(self, part, id):
+        self.calls.append(("list", id))
+        item = self.broadcasts.get(id)
+        return _Request({"items": [item] if item else []})
+
+    def transition(self, part, id, broadcastStatus):
+        self.calls.append(("transition", id))
+        self.broadcasts[id]["status"]["lifeCycleStatus"] = "complete"
+        return _Request({"id": id})
+
+
+@pytest.fixture
+def client(tmp_path):
+    yt = YouTubeClient(tmp_path, credentials=object())
+    yt._service = FakeYouTube()
+    yield yt
+    yt.close()
+
+
+def _kinds(fake):
+    return [call[0] for call in fake.calls]
+
+
+def test_first_session_creates_stream_and_broadcast(client):
+    session = client.open_session("job1", "Title", "unlisted")
+    assert _kinds(client.service) == ["stream.insert", "broadcast.insert", "bind"]
+    assert session.ingest_url == f"rtmp://a.rtmp.youtube.com/live2/key-{session.stream_id}"
+    assert client.quota_used == 150
+
+
+def test_reopen_rebinds_with_one_list_call(client):
+    first = client.open_session("job1", "Title", "unlisted")
+    client.service.calls.clear()
+    again = client.open_session("job1", "Title", "unlisted")
+    assert again == first
+    assert _kinds(client.service) == ["list"]
+
+
+def test_changed_title_reuses_stream_with_new_broadcast(client):
+    first = client.open_session("job1", "Title", "unlisted")
+    client.service.calls.clear()
+    second = client.open_session("job1", "New title", "unlisted")
+    assert _kinds(client.service) == ["broadcast.insert", "bind"]
+    assert (second.stream_id, second.ingest_url) == (first.stream_id, first.ingest_url)
+    assert second.broadcast_id != first.broadcast_id
+
+
+def test_completed_broadcast_keeps_stream_key(client):
+    first = client.open_session("job1", "Title", "unlisted")
+    client.complete("job1", first.broadcast_id)
+    client.service.calls.clear()
+    second = client.open_session("job1", "Title", "unlisted")
+    assert _kinds(client.service) == ["broadcast.insert", "bind"]
+    assert second.ingest_url == first.ingest_url
+
+
+def test_deleted_stream_is_recreated_once(client):
+    first = client.open_session("job1", "Title", "unlisted")
+    client.complete("job1", first.broadcast_id)
+    client.service.streams.clear()
+    client.service.calls.clear()
+    second = client.open_session("job1", "Title", "unlisted")
+    assert _kinds(client.service) == ["broadcast.insert", "bind", "stream.insert", "bind"]
+    assert second.stream_id != first.stream_id
+
+
+def test_jobs_with_same_source_get_separate_resources(client):
+    a = client.open_session("job1", "Title", "unlisted")
+    b = client.open_session("job2", "Title", "unlisted")
+    assert a.stream_id != b.stream_id
+
+
+def test_cache_and_quota_survive_restart(client, tmp_path):
+    first = client.open_session("job1", "Title", "unlisted")
+    reopened = YouTubeClient(tmp_path, credentials=object())
+    reopened._service = client.service
+    try:
+        assert reopened.quota_used == 150
+        assert reopened.open_session("job1", "Title", "unlisted") == first
+        assert reopened.quota_used == 151
+    finally:
+        reopened.close()
+
+
+def test_resume_keeps_live_broadcast(client):
+    session = client.open_session("job1", "Title", "unlisted")
+    client.service.broadcasts[session.broadcast_id]["status"]["lifeCycleStatus"] = "live"
+    client.service.calls.clear()
+    assert client.resume_session("job1", session, "Title", "unlisted") == session
+    assert _kinds(client.service) == ["list"]
+
+
+def test_resume_reopens_auto_stopped_broadcast(client):
+    session = client.open_session("job1", "Title", "unlisted")
+    # 斷流超過一分鐘，enableAutoStop 已把直播結束
+    client.service.broadcasts[session.broadcast_id]["status"]["lifeCycleStatus"] = "complete"
+    client.service.calls.clear()
+    resumed = client.resume_session("job1", session, "Title", "unlisted")
+    assert _kinds(client.service) == ["list", "broadcast.insert", "bind"]
+    assert resumed.broadcast_id != session.broadcast_id
+    assert (resumed.stream_id, resumed.ingest_url) == (session.stream_id, session.ingest_url)
+    assert client.cache.get("job1")["broadcast_id"] == resumed.broadcast_id